@@ -1,12 +1,16 @@
+import glob
 import multiprocessing
 import os
+import tempfile
+from typing import Any
 
 import gunicorn.app.base  # type: ignore
 import uvicorn
+from prometheus_client import multiprocess
 
 
 class StandaloneApplication(gunicorn.app.base.BaseApplication):  # type: ignore
-    def __init__(self, app: str, options: dict[str, str | int] | None = None):
+    def __init__(self, app: str, options: dict[str, Any] | None = None):
         self.options = options or {}
         self.application = app
         super().__init__()
@@ -24,6 +28,21 @@ class StandaloneApplication(gunicorn.app.base.BaseApplication):  # type: ignore
         return self.application
 
 
+def _prepare_metrics_dir() -> None:
+    # metrics of the forked workers are aggregated through files (see workerfacing_api.metrics)
+    metrics_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if metrics_dir is None:
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="metrics_")
+    else:
+        os.makedirs(metrics_dir, exist_ok=True)
+        for path in glob.glob(os.path.join(metrics_dir, "*.db")):
+            os.remove(path)  # from a previous run
+
+
+def _child_exit(server: Any, worker: Any) -> None:
+    multiprocess.mark_process_dead(worker.pid)  # type: ignore[no-untyped-call]
+
+
 def main() -> None:
     app = "workerfacing_api.main:workerfacing_app"
     port = int(os.environ.get("PORT", "8001"))
@@ -33,11 +52,13 @@ def main() -> None:
     if not prod:
         uvicorn.run(app, host=host, port=port, reload=True)
     else:
+        _prepare_metrics_dir()
         StandaloneApplication(
             app="app:app",
             options={
                 "bind": f"{host}:{port}",
                 "workers": (multiprocessing.cpu_count() * 2) + 1,
                 "worker_class": "uvicorn.workers.UvicornWorker",
+                "child_exit": _child_exit,
             },
         ).run()
@@ -15,6 +15,7 @@ from workerfacing_api.crud import job_tracking
 
 TEST_BUCKET_PREFIX = "decode-cloud-worker-api-tests-"
 REGION_NAME: BucketLocationConstraintType = "eu-central-1"
+_update_job = job_tracking.update_job
 
 
 @pytest.fixture(scope="session")
@@ -30,6 +31,12 @@ def patch_update_job(monkeypatch_module: pytest.MonkeyPatch) -> MagicMock:
     return mock_update_job
 
 
+@pytest.fixture
+def real_update_job(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Send the job status updates to the user-facing API at $USERFACING_API_URL."""
+    monkeypatch.setattr(job_tracking, "update_job", _update_job)
+
+
 class RDSTestingInstance:
     def __init__(self, db_name: str):
         self.db_name = db_name
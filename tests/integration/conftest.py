@@ -9,13 +9,13 @@ from workerfacing_api.core.filesystem import FileSystem, LocalFilesystem, S3File
 from workerfacing_api.core.queue import RDSJobQueue
 from workerfacing_api.dependencies import (
     APIKeyDependency,
-    GroupClaims,
     authorizer,
     current_user_dep,
     filesystem_dep,
     queue_dep,
 )
 from workerfacing_api.main import workerfacing_app
+from workerfacing_api.schemas.auth import GroupClaims
 
 
 @pytest.fixture(scope="session")
@@ -132,8 +132,8 @@ def override_auth(monkeypatch_module: pytest.MonkeyPatch, test_username: str) ->
     monkeypatch_module.setitem(
         workerfacing_app.dependency_overrides,  # type: ignore
         current_user_dep,
-        lambda: GroupClaims(
-            **{
+        lambda: GroupClaims.model_validate(
+            {
                 "cognito:username": test_username,
                 "cognito:email": "test@example.com",
                 "cognito:groups": ["workers"],
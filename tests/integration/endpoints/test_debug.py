@@ -0,0 +1,102 @@
+import os
+import secrets
+from typing import Iterator
+
+import pytest
+from fastapi.testclient import TestClient
+
+from workerfacing_api import profiling, settings
+from workerfacing_api.core.queue import RDSJobQueue
+from workerfacing_api.dependencies import queue_dep
+from workerfacing_api.main import workerfacing_app
+from workerfacing_api.query_log import query_log
+
+client = TestClient(workerfacing_app)
+endpoint = "/_debug"
+
+
+@pytest.fixture
+def restore_query_log() -> Iterator[None]:
+    config = query_log.config
+    yield
+    query_log.configure(config)
+
+
+def test_query_log(
+    queue: RDSJobQueue,
+    monkeypatch: pytest.MonkeyPatch,
+    internal_api_key_secret: str,
+    restore_query_log: None,
+) -> None:
+    monkeypatch.setitem(
+        workerfacing_app.dependency_overrides,  # type: ignore
+        queue_dep,
+        lambda: queue,
+    )
+    headers = {"x-api-key": internal_api_key_secret}
+    resp = client.put(
+        f"{endpoint}/queries",
+        json={"enabled": True, "statement_budget": 100},
+        headers=headers,
+    )
+    assert resp.status_code == 200
+    assert resp.json()["enabled"]
+    assert client.get(f"{endpoint}/queries", headers=headers).json() == resp.json()
+    resp = client.get("/_stats/queue", headers=headers)
+    assert "db;dur=" in resp.headers["server-timing"]
+
+    client.put(f"{endpoint}/queries", json={"enabled": False}, headers=headers)
+    resp = client.get("/_stats/queue", headers=headers)
+    assert "db;dur=" not in resp.headers["server-timing"]
+
+
+def test_query_log_unauthorized() -> None:
+    resp = client.put(
+        f"{endpoint}/queries", json={"enabled": True}, headers={"x-api-key": "wrong"}
+    )
+    assert resp.status_code == 401
+    assert not query_log.config.enabled
+
+
+def test_profile(internal_api_key_secret: str) -> None:
+    resp = client.get(
+        f"{endpoint}/profile",
+        params={"seconds": 0.1, "interval": 0.001, "include_idle": True},
+        headers={"x-api-key": internal_api_key_secret},
+    )
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    stack, count = resp.text.splitlines()[0].rsplit(" ", 1)
+    assert int(count) > 0
+
+
+def test_get_request_profile(internal_api_key_secret: str) -> None:
+    profile_id = secrets.token_hex(8)
+    os.makedirs(settings.profile_dir, exist_ok=True)
+    path = profiling.profile_path(settings.profile_dir, profile_id)
+    with open(path, "w") as f:
+        f.write("MainThread;module:function 1\n")
+    try:
+        resp = client.get(
+            f"{endpoint}/profiles/{profile_id}",
+            headers={"x-api-key": internal_api_key_secret},
+        )
+    finally:
+        os.remove(path)
+    assert resp.status_code == 200
+    assert resp.text == "MainThread;module:function 1\n"
+    resp = client.get(
+        f"{endpoint}/profiles/{profile_id}",
+        headers={"x-api-key": internal_api_key_secret},
+    )
+    assert resp.status_code == 404
+    resp = client.get(
+        f"{endpoint}/profiles/..%2Fsecret",
+        headers={"x-api-key": internal_api_key_secret},
+    )
+    assert resp.status_code in (404, 422)
+
+
+def test_profile_unauthorized() -> None:
+    resp = client.get(f"{endpoint}/profile", headers={"x-api-key": "wrong"})
+    assert resp.status_code == 401
@@ -1,4 +1,5 @@
 import os
+import tarfile
 from io import BytesIO
 from typing import cast
 
@@ -72,6 +73,26 @@ class TestFiles(_TestEndpoint):
             file_resp = client.get(f"{self.endpoint}/{data_file1_path}/download")
             assert file_resp.status_code == 403
 
+    def test_get_file_etag(
+        self, env: str, data_file1_path: str, client: TestClient
+    ) -> None:
+        if env == "aws":
+            pytest.skip("files are downloaded from S3 directly")
+        file_resp = client.get(f"{self.endpoint}/{data_file1_path}/download")
+        etag = file_resp.headers["etag"]
+        cached_resp = client.get(
+            f"{self.endpoint}/{data_file1_path}/download",
+            headers={"if-none-match": f'"outdated", {etag}'},
+        )
+        assert cached_resp.status_code == 304
+        assert cached_resp.headers["etag"] == etag
+        assert not cached_resp.content
+        outdated_resp = client.get(
+            f"{self.endpoint}/{data_file1_path}/download",
+            headers={"if-none-match": '"outdated"'},
+        )
+        assert outdated_resp.status_code == 200
+
     def test_get_file_not_exists(
         self, data_file1_path: str, client: TestClient
     ) -> None:
@@ -82,6 +103,32 @@ class TestFiles(_TestEndpoint):
         file_resp = client.get(f"{self.endpoint}/wrong_dir/download")
         assert file_resp.status_code == 403
 
+    def test_get_archive(
+        self,
+        env: str,
+        data_file1_path: str,
+        data_file1_contents: str,
+        client: TestClient,
+    ) -> None:
+        dir_path = os.path.dirname(data_file1_path)
+        archive_resp = client.get(
+            f"{self.endpoint}/{dir_path}/archive", params={"include": ["*.txt"]}
+        )
+        if env == "local":
+            assert archive_resp.status_code == 200
+            with tarfile.open(fileobj=BytesIO(archive_resp.content)) as tar:
+                file = tar.extractfile(os.path.basename(data_file1_path))
+                assert file is not None
+                assert file.read().decode("utf-8") == data_file1_contents
+        else:
+            assert archive_resp.status_code == 403
+
+    def test_get_archive_not_exists(
+        self, env: str, data_file1_path: str, client: TestClient
+    ) -> None:
+        archive_resp = client.get(f"{self.endpoint}/{data_file1_path}_fake/archive")
+        assert archive_resp.status_code == (404 if env == "local" else 403)
+
     def test_get_file_url(
         self,
         env: str,
@@ -92,11 +139,13 @@ class TestFiles(_TestEndpoint):
         req = f"{self.endpoint}/{data_file1_path}/url"
         url_resp = client.get(req)
         assert url_resp.status_code == 200
+        file_request = url_resp.json()
+        assert file_request.pop("etag") == url_resp.headers["etag"]
         if env == "local":
             assert req.replace("/url", "/download") in url_resp.text
         else:
             assert (
-                requests.request(**url_resp.json()).content.decode("utf-8")
+                requests.request(**file_request).content.decode("utf-8")
                 == data_file1_contents
             )
 
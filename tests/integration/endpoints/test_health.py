@@ -0,0 +1,68 @@
+import threading
+import time
+from typing import Any, Callable
+
+import pytest
+from fastapi.testclient import TestClient
+
+from workerfacing_api import dependencies, main
+from workerfacing_api.main import workerfacing_app
+
+endpoint = "/ready"
+
+
+@pytest.fixture
+def lifespan_client(monkeypatch: pytest.MonkeyPatch) -> Callable[..., TestClient]:
+    """Client running the lifespan of the app, with the given setup steps."""
+    monkeypatch.setattr(workerfacing_app.state, "startup", None, raising=False)
+
+    async def no_background_tasks(*args: Any) -> None:
+        pass
+
+    monkeypatch.setattr(main, "start_background_tasks", no_background_tasks)
+
+    def client(steps: dict[str, Callable[[], Any]]) -> TestClient:
+        monkeypatch.setattr(dependencies, "setup_steps", lambda: steps)
+        return TestClient(workerfacing_app)
+
+    return client
+
+
+def test_ready_without_lifespan() -> None:
+    resp = TestClient(workerfacing_app).get(endpoint)
+    assert resp.status_code == 200
+    assert resp.json() == {"ready": True, "steps": []}
+
+
+def test_ready_after_setup(lifespan_client: Callable[..., TestClient]) -> None:
+    connected = threading.Event()
+    steps = {"queue": lambda: connected.wait(10), "auth": lambda: None}
+    with lifespan_client(steps) as client:
+        # served meanwhile
+        assert client.get("/").status_code == 200
+        resp = client.get(endpoint)
+        assert resp.status_code == 503
+        assert resp.json()["ready"] is False
+        assert not resp.json()["steps"][0]["done"]
+        connected.set()
+        for _ in range(100):
+            resp = client.get(endpoint)
+            if resp.status_code == 200:
+                break
+            time.sleep(0.01)
+        assert resp.status_code == 200
+        assert [step["done"] for step in resp.json()["steps"]] == [True, True]
+
+
+def test_not_ready_after_failure(lifespan_client: Callable[..., TestClient]) -> None:
+    def fail() -> None:
+        raise ConnectionError("no keys")
+
+    with lifespan_client({"auth": fail}) as client:
+        for _ in range(100):
+            resp = client.get(endpoint)
+            if resp.json()["steps"][0]["seconds"] is not None:
+                break
+            time.sleep(0.01)
+        assert resp.status_code == 503
+        assert resp.json()["steps"][0]["error"] == "no keys"
@@ -1,5 +1,8 @@
 import datetime
+import gzip
+import json
 import os
+import tarfile
 import time
 from io import BytesIO
 from typing import Any, cast
@@ -28,6 +31,12 @@ from workerfacing_api.schemas.queue_jobs import (
 from workerfacing_api.schemas.rds_models import JobStates
 
 
+def _without_lease(jobs: dict[str, Any]) -> dict[str, Any]:
+    for job in jobs.values():
+        assert set(job.pop("lease")) == {"token", "expires_at"}
+    return jobs
+
+
 @pytest.fixture(scope="session")
 def app() -> AppSpecs:
     return AppSpecs(cmd=["cmd"], env={"env": "var"})
@@ -104,9 +113,105 @@ class TestJobs(_TestEndpoint):
         queue.enqueue(base_job)
         resp = client.get(self.endpoint, params={"memory": 1})
         assert resp.status_code == 200, resp.json()
-        assert resp.json() == {"1": base_job.job.model_dump()}
+        assert _without_lease(resp.json()) == {"1": base_job.job.model_dump()}
         patch_update_job.assert_called_with(1, JobStates.pulled, None)
 
+    def test_get_jobs_packed(
+        self,
+        queue: RDSJobQueue,
+        base_job: SubmittedJob,
+        client: TestClient,
+    ) -> None:
+        for i, gpu_mem in enumerate([60, 30, 20]):
+            job = base_job.model_copy(deep=True)
+            job.job.meta.job_id = i
+            job.job.hardware = HardwareSpecs(gpu_mem=gpu_mem)
+            queue.enqueue(job)
+        params = {"memory": 1, "cpu_cores": 8, "gpu_mem": 80, "limit": 3}
+        # each job fits individually
+        res = client.get(self.endpoint, params=params | {"limit": 1, "pack": False})
+        assert list(res.json()) == ["1"]
+        # jobs 2 and 3 do not fit together in the free gpu memory
+        res = client.get(self.endpoint, params=params | {"gpu_mem": 45, "pack": True})
+        assert list(res.json()) == ["2"]
+        res = client.get(self.endpoint, params=params | {"pack": True})
+        assert list(res.json()) == ["3"]
+
+    def test_get_jobs_images(
+        self,
+        queue: RDSJobQueue,
+        base_job: SubmittedJob,
+        client: TestClient,
+    ) -> None:
+        for i, image_url in enumerate(["a", "b"]):
+            job = base_job.model_copy(deep=True)
+            job.job.meta.job_id = i
+            job.job.handler.image_url = image_url
+            queue.enqueue(job)
+        res = client.get(self.endpoint, params={"memory": 1, "images": ["c", "b"]})
+        assert list(res.json()) == ["2"]
+
+    def test_get_jobs_urls(
+        self,
+        env: str,
+        queue: RDSJobQueue,
+        base_filesystem: FileSystem,
+        base_job: SubmittedJob,
+        test_username: str,
+        client: TestClient,
+    ) -> None:
+        name = f"{test_username}/test_in/input.txt"
+        if env == "local":
+            base_filesystem = cast(LocalFilesystem, base_filesystem)
+            path = f"{base_filesystem.base_get_path}/{name}"
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write("input")
+            req_base = client
+        else:
+            base_filesystem = cast(S3Filesystem, base_filesystem)
+            base_filesystem.s3_client.put_object(
+                Bucket=base_filesystem.bucket, Key=name, Body=BytesIO(b"input")
+            )
+            path = f"s3://{base_filesystem.bucket}/{name}"
+            req_base = requests  # type: ignore
+        base_job.job.handler.files_down = {"input": path, "missing": path + "_fake"}
+        queue.enqueue(base_job)
+
+        resp = client.get(self.endpoint, params={"memory": 1, "urls": True})
+        assert resp.status_code == 200
+        job = resp.json()["1"]
+        # files not accessible are left out
+        assert list(job["files_down_urls"]) == ["input"]
+        file_request = job["files_down_urls"]["input"]
+        etag = file_request.pop("etag")
+        file_resp = req_base.request(**file_request)
+        assert file_resp.text == "input"
+        assert file_resp.headers["etag"] == etag
+        assert set(job["upload_urls"]) == {"output", "log", "artifact"}
+        res = req_base.request(
+            **job["upload_urls"]["output"],
+            files={"file": ("file.txt", BytesIO(b"content"), "text/plain")},
+        )
+        res.raise_for_status()
+
+    def test_get_jobs_compressed(
+        self,
+        queue: RDSJobQueue,
+        base_job: SubmittedJob,
+        client: TestClient,
+    ) -> None:
+        base_job.job.handler.files_down = {
+            f"file{i}": f"data/test/file{i}.txt" for i in range(1000)
+        }
+        queue.enqueue(base_job)
+        resp = client.get(
+            self.endpoint, params={"memory": 1}, headers={"accept-encoding": "gzip"}
+        )
+        assert resp.status_code == 200
+        assert resp.headers["content-encoding"] == "gzip"
+        assert _without_lease(resp.json()) == {"1": base_job.job.model_dump()}
+
     def test_get_jobs_required_params(self, client: TestClient) -> None:
         required = ["memory"]
         base_query_params = {"memory": 1}
@@ -137,7 +242,7 @@ class TestJobs(_TestEndpoint):
             self.endpoint,
             params={"memory": 1, "cpu_cores": 2},
         )
-        assert res.json() == {"1": base_job.job.model_dump()}
+        assert _without_lease(res.json()) == {"1": base_job.job.model_dump()}
 
     def test_get_jobs_filtering_memory(
         self, queue: RDSJobQueue, base_job: SubmittedJob, client: TestClient
@@ -153,7 +258,7 @@ class TestJobs(_TestEndpoint):
             self.endpoint,
             params={"memory": 2},
         )
-        assert res.json() == {"1": base_job.job.model_dump()}
+        assert _without_lease(res.json()) == {"1": base_job.job.model_dump()}
 
     def test_get_jobs_filtering_gpu_model(
         self, queue: RDSJobQueue, base_job: SubmittedJob, client: TestClient
@@ -173,7 +278,7 @@ class TestJobs(_TestEndpoint):
             self.endpoint,
             params={"memory": 1, "gpu_model": "gpu_model"},
         )
-        assert res.json() == {"1": base_job.job.model_dump()}
+        assert _without_lease(res.json()) == {"1": base_job.job.model_dump()}
 
     def test_get_jobs_filtering_gpu_archi(
         self, queue: RDSJobQueue, base_job: SubmittedJob, client: TestClient
@@ -193,7 +298,7 @@ class TestJobs(_TestEndpoint):
             self.endpoint,
             params={"memory": 1, "gpu_archi": "gpu_archi"},
         )
-        assert res.json() == {"1": base_job.job.model_dump()}
+        assert _without_lease(res.json()) == {"1": base_job.job.model_dump()}
 
     def test_get_jobs_filtering_gpu_mem(
         self, queue: RDSJobQueue, base_job: SubmittedJob, client: TestClient
@@ -214,7 +319,7 @@ class TestJobs(_TestEndpoint):
             self.endpoint,
             params={"memory": 1, "gpu_mem": 2},
         )
-        assert res.json() == {"1": base_job.job.model_dump()}
+        assert _without_lease(res.json()) == {"1": base_job.job.model_dump()}
 
     def test_get_jobs_priorities(
         self, queue: RDSJobQueue, base_job: SubmittedJob, client: TestClient
@@ -229,12 +334,12 @@ class TestJobs(_TestEndpoint):
             self.endpoint,
             params={"groups": ["group"], "memory": 1, "limit": 1},
         )
-        assert res.json() == {"2": job_own_group.job.model_dump()}
+        assert _without_lease(res.json()) == {"2": job_own_group.job.model_dump()}
         res = client.get(
             self.endpoint,
             params={"groups": ["group"], "memory": 1, "limit": 1},
         )
-        assert res.json() == {"3": job_higher_priority.job.model_dump()}
+        assert _without_lease(res.json()) == {"3": job_higher_priority.job.model_dump()}
 
     def test_get_jobs_dequeue_old(
         self, queue: RDSJobQueue, base_job: SubmittedJob, client: TestClient
@@ -276,6 +381,43 @@ class TestJobs(_TestEndpoint):
         res = client.get(f"{self.endpoint}/1/status")
         assert res.json() == "running"
 
+    def test_put_job_status_lease(
+        self, queue: RDSJobQueue, base_job: SubmittedJob, client: TestClient
+    ) -> None:
+        queue.enqueue(base_job)
+        lease = client.get(self.endpoint, params={"memory": 1}).json()["1"]["lease"]
+        res = client.put(
+            f"{self.endpoint}/1/status",
+            params={"status": "running", "lease_token": "outdated"},
+        )
+        assert res.status_code == 404
+        res = client.put(
+            f"{self.endpoint}/1/status",
+            params={"status": "running", "lease_token": lease["token"]},
+        )
+        assert res.status_code == 204
+
+    def test_put_job_status_compressed_details(
+        self,
+        queue: RDSJobQueue,
+        base_job: SubmittedJob,
+        patch_update_job: MagicMock,
+        client: TestClient,
+    ) -> None:
+        queue.enqueue(base_job)
+        client.get(self.endpoint, params={"memory": 1})
+        runtime_details = "epoch 1: loss 0.1\n" * 1000
+        res = client.put(
+            f"{self.endpoint}/1/status",
+            params={"status": "running"},
+            content=gzip.compress(
+                json.dumps({"runtime_details": runtime_details}).encode()
+            ),
+            headers={"content-encoding": "gzip", "content-type": "application/json"},
+        )
+        assert res.status_code == 204
+        patch_update_job.assert_called_with(1, JobStates.running, runtime_details)
+
     def test_put_job_status_canceled(
         self,
         queue: RDSJobQueue,
@@ -340,3 +482,144 @@ class TestJobs(_TestEndpoint):
                 .decode("utf-8")
                 == "content"
             )
+
+    def test_job_files_upload_several(
+        self,
+        env: str,
+        queue: RDSJobQueue,
+        base_filesystem: FileSystem,
+        base_job: SubmittedJob,
+        test_username: str,
+        client: TestClient,
+    ) -> None:
+        queue.enqueue(base_job)
+        client.get(self.endpoint, params={"memory": 1})
+        res = client.post(
+            f"{self.endpoint}/1/files/upload",
+            params={"type": "log", "base_path": "logs"},
+            files=[
+                ("file", (f"file{i}.txt", BytesIO(b"content"), "text/plain"))
+                for i in range(3)
+            ],
+        )
+        if env == "local":
+            assert res.status_code == 201
+            base_filesystem = cast(LocalFilesystem, base_filesystem)
+            for i in range(3):
+                assert os.path.exists(
+                    f"{base_filesystem.base_post_path}/{test_username}/test_log/1/logs/file{i}.txt"
+                )
+        else:
+            assert res.status_code == 403
+
+    def test_job_files_upload_compressed(
+        self,
+        env: str,
+        queue: RDSJobQueue,
+        base_filesystem: FileSystem,
+        base_job: SubmittedJob,
+        test_username: str,
+        client: TestClient,
+    ) -> None:
+        queue.enqueue(base_job)
+        client.get(self.endpoint, params={"memory": 1})
+        request = client.build_request(
+            "post",
+            f"{self.endpoint}/1/files/upload",
+            params={"type": "log", "base_path": "logs"},
+            files={"file": ("log.txt", BytesIO(b"log line\n" * 1000), "text/plain")},
+        )
+        res = client.post(
+            f"{self.endpoint}/1/files/upload",
+            params={"type": "log", "base_path": "logs"},
+            content=gzip.compress(request.read()),
+            headers={
+                "content-type": request.headers["content-type"],
+                "content-encoding": "gzip",
+            },
+        )
+        if env == "local":
+            assert res.status_code == 201
+            base_filesystem = cast(LocalFilesystem, base_filesystem)
+            path = f"{base_filesystem.base_post_path}/{test_username}/test_log/1/logs/log.txt"
+            with open(path, "rb") as f:
+                assert f.read() == b"log line\n" * 1000  # stored uncompressed
+        else:
+            assert res.status_code == 403
+
+    def test_job_files_upload_archive(
+        self,
+        env: str,
+        queue: RDSJobQueue,
+        base_filesystem: FileSystem,
+        base_job: SubmittedJob,
+        test_username: str,
+        client: TestClient,
+    ) -> None:
+        queue.enqueue(base_job)
+        client.get(self.endpoint, params={"memory": 1})
+        archive = BytesIO()
+        with tarfile.open(fileobj=archive, mode="w") as tar:
+            for name in ["a.txt", "sub/b.txt"]:
+                info = tarfile.TarInfo(name)
+                info.size = len(b"content")
+                tar.addfile(info, BytesIO(b"content"))
+        res = client.post(
+            f"{self.endpoint}/1/files/upload/archive",
+            params={"type": "artifact"},
+            files={"archive": ("archive.tar", archive.getvalue(), "application/x-tar")},
+        )
+        if env == "local":
+            assert res.status_code == 201
+            assert res.json() == 2
+            base_filesystem = cast(LocalFilesystem, base_filesystem)
+            assert os.path.exists(
+                f"{base_filesystem.base_post_path}/{test_username}/test_arti/1/sub/b.txt"
+            )
+        else:
+            assert res.status_code == 403
+
+    def test_job_files_multipart(
+        self,
+        env: str,
+        queue: RDSJobQueue,
+        base_filesystem: FileSystem,
+        base_job: SubmittedJob,
+        test_username: str,
+        client: TestClient,
+    ) -> None:
+        queue.enqueue(base_job)
+        client.get(self.endpoint, params={"memory": 1})
+        params = {"type": "output", "base_path": "test/large.bin"}
+        res = client.post(
+            f"{self.endpoint}/1/files/multipart", params={**params, "n_parts": 1}
+        )
+        if env == "local":
+            assert res.status_code == 403
+            return
+        assert res.status_code == 201
+        upload_id = res.json()["upload_id"]
+        part = res.json()["parts"][0]
+        part_resp = requests.request(
+            method=part["method"], url=part["url"], data=b"content"
+        )
+        part_resp.raise_for_status()
+        res = client.post(
+            f"{self.endpoint}/1/files/multipart/{upload_id}/complete",
+            params=params,
+            json=[{"part_number": 1, "etag": part_resp.headers["ETag"]}],
+        )
+        assert res.status_code == 204
+        base_filesystem = cast(S3Filesystem, base_filesystem)
+        assert (
+            base_filesystem.s3_client.get_object(
+                Bucket=base_filesystem.bucket,
+                Key=f"{test_username}/test_out/1/test/large.bin",
+            )["Body"].read()
+            == b"content"
+        )
+        # upload does not exist anymore
+        res = client.delete(
+            f"{self.endpoint}/1/files/multipart/{upload_id}", params=params
+        )
+        assert res.status_code == 404
@@ -50,3 +50,17 @@ def test_post_job(
     )
     assert resp.json()["job"]["meta"]["job_id"] == 1
     queue_enqueue.assert_called_once()
+
+
+def test_post_job_input_sizes(
+    queue_enqueue: MagicMock,
+    queue_job: dict[str, Any],
+    internal_api_key_secret: str,
+) -> None:
+    queue_job["job"]["handler"]["files_down"] = {"data": "not/found"}
+    resp = client.post(
+        endpoint, headers={"x-api-key": internal_api_key_secret}, json=queue_job
+    )
+    assert resp.status_code == 201
+    # unknown sizes do not prevent enqueueing
+    assert queue_enqueue.call_args.args[1] == {"not/found": 0}
@@ -0,0 +1,37 @@
+from fastapi.testclient import TestClient
+
+from workerfacing_api.main import workerfacing_app
+
+client = TestClient(workerfacing_app)
+endpoint = "/metrics"
+
+
+def test_get_metrics(internal_api_key_secret: str) -> None:
+    client.get("/")
+    resp = client.get(endpoint, headers={"x-api-key": internal_api_key_secret})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    assert (
+        'http_request_duration_seconds_count{method="GET",route="/",status_code="200"}'
+        in resp.text
+    )
+    for metric in [
+        "queue_claim_duration_seconds",
+        "queue_db_connections",
+        "s3_operation_duration_seconds",
+        "job_tracking_update_duration_seconds",
+        "timeout_sweep_duration_seconds",
+    ]:
+        assert f"# TYPE {metric}" in resp.text
+
+
+def test_get_metrics_unmatched_route(internal_api_key_secret: str) -> None:
+    client.get("/not/a/route/1")
+    resp = client.get(endpoint, headers={"x-api-key": internal_api_key_secret})
+    assert 'route="unmatched",status_code="404"' in resp.text
+    assert "/not/a/route/1" not in resp.text
+
+
+def test_get_metrics_unauthorized() -> None:
+    resp = client.get(endpoint, headers={"x-api-key": "wrong"})
+    assert resp.status_code == 401
@@ -0,0 +1,74 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from workerfacing_api.core.file_cache import FileCache
+from workerfacing_api.core.queue import RDSJobQueue
+from workerfacing_api.dependencies import file_cache_dep, queue_dep
+from workerfacing_api.main import workerfacing_app
+
+client = TestClient(workerfacing_app)
+endpoint = "/_stats"
+
+
+@pytest.fixture(scope="function")
+def file_cache(monkeypatch: pytest.MonkeyPatch) -> FileCache:
+    file_cache = FileCache(max_size=1024, max_file_size=1024)
+    monkeypatch.setitem(
+        workerfacing_app.dependency_overrides,  # type: ignore
+        file_cache_dep,
+        lambda: file_cache,
+    )
+    return file_cache
+
+
+def test_get_file_cache_stats(
+    file_cache: FileCache, internal_api_key_secret: str
+) -> None:
+    resp = client.get(
+        f"{endpoint}/files/cache", headers={"x-api-key": internal_api_key_secret}
+    )
+    assert resp.status_code == 200
+    assert resp.json()["max_size"] == 1024
+    assert resp.json()["hit_rate"] == 0.0
+
+
+def test_get_file_cache_stats_disabled(
+    monkeypatch: pytest.MonkeyPatch, internal_api_key_secret: str
+) -> None:
+    monkeypatch.setitem(
+        workerfacing_app.dependency_overrides,  # type: ignore
+        file_cache_dep,
+        lambda: None,
+    )
+    resp = client.get(
+        f"{endpoint}/files/cache", headers={"x-api-key": internal_api_key_secret}
+    )
+    assert resp.status_code == 404
+
+
+def test_get_file_cache_stats_unauthorized(file_cache: FileCache) -> None:
+    resp = client.get(f"{endpoint}/files/cache", headers={"x-api-key": "wrong"})
+    assert resp.status_code == 401
+
+
+def test_get_queue_stats(
+    queue: RDSJobQueue, monkeypatch: pytest.MonkeyPatch, internal_api_key_secret: str
+) -> None:
+    monkeypatch.setitem(
+        workerfacing_app.dependency_overrides,  # type: ignore
+        queue_dep,
+        lambda: queue,
+    )
+    resp = client.get(
+        f"{endpoint}/queue", headers={"x-api-key": internal_api_key_secret}
+    )
+    assert resp.status_code == 200
+    assert set(resp.json()) == {
+        "by_status",
+        "oldest_queued_at",
+        "oldest_queued_age",
+        "refreshed_at",
+    }
+    server_timing = resp.headers["server-timing"]
+    assert "queue.get_stats;dur=" in server_timing
+    assert "total;dur=" in server_timing
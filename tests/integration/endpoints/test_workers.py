@@ -0,0 +1,47 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from workerfacing_api.core.queue import RDSJobQueue
+from workerfacing_api.dependencies import queue_dep
+from workerfacing_api.main import workerfacing_app
+
+client = TestClient(workerfacing_app)
+endpoint = "/_workers"
+
+
+@pytest.fixture(scope="function", autouse=True)
+def cleanup_queue(queue: RDSJobQueue, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setitem(
+        workerfacing_app.dependency_overrides,  # type: ignore
+        queue_dep,
+        lambda: queue,
+    )
+    queue.delete()
+    queue.create()
+
+
+def test_get_workers(internal_api_key_secret: str, test_username: str) -> None:
+    client.get(
+        "/jobs",
+        params={"memory": 10, "cpu_cores": 2, "instance_id": "i", "slots": 2},
+    )
+    resp = client.get(endpoint, headers={"x-api-key": internal_api_key_secret})
+    assert resp.status_code == 200
+    # sightings buffered by other tests are flushed too
+    (worker,) = [worker for worker in resp.json() if worker["instance_id"] == "i"]
+    assert worker["hostname"] == test_username
+    assert worker["slots"] == 2
+    assert worker["hardware"]["memory"] == 10
+
+
+def test_get_unschedulable_jobs(internal_api_key_secret: str) -> None:
+    resp = client.get(
+        f"{endpoint}/unschedulable", headers={"x-api-key": internal_api_key_secret}
+    )
+    assert resp.status_code == 200
+    assert resp.json() == []
+
+
+def test_get_workers_unauthorized() -> None:
+    resp = client.get(endpoint, headers={"x-api-key": "wrong"})
+    assert resp.status_code == 401
@@ -0,0 +1,137 @@
+import datetime
+import json
+import os
+from typing import Any, Callable, Generator
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from tests.performance.upstream import FakeUserfacingAPI
+from workerfacing_api import settings
+from workerfacing_api.core.filesystem import LocalFilesystem
+from workerfacing_api.core.queue import RDSJobQueue
+from workerfacing_api.dependencies import (
+    authorizer,
+    current_user_dep,
+    filesystem_dep,
+    queue_dep,
+)
+from workerfacing_api.main import workerfacing_app
+from workerfacing_api.schemas.auth import GroupClaims
+from workerfacing_api.schemas.queue_jobs import (
+    AppSpecs,
+    EnvironmentTypes,
+    HandlerSpecs,
+    HardwareSpecs,
+    JobSpecs,
+    MetaSpecs,
+    PathsUploadSpecs,
+    SubmittedJob,
+)
+
+# simulated workers identify themselves with this header instead of a Cognito token
+WORKER_HEADER = "x-perf-worker"
+
+
+def submitted_job(
+    job_id: int,
+    base_path: str,
+    hw_specs: HardwareSpecs | None = None,
+    group: str | None = None,
+    priority: int = 5,
+) -> SubmittedJob:
+    time_now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    return SubmittedJob(
+        job=JobSpecs(
+            app=AppSpecs(cmd=["cmd"], env={"env": "var"}),
+            handler=HandlerSpecs(image_url="u", files_up={"output": "out"}),
+            hardware=hw_specs or HardwareSpecs(),
+            meta=MetaSpecs(job_id=job_id, date_created=time_now),
+        ),
+        environment=EnvironmentTypes.local,
+        group=group,
+        priority=priority,
+        paths_upload=PathsUploadSpecs(
+            output=f"{base_path}/out/{job_id}",
+            log=f"{base_path}/log/{job_id}",
+            artifact=f"{base_path}/artifact/{job_id}",
+        ),
+    )
+
+
+@pytest.fixture
+def report(request: pytest.FixtureRequest) -> Callable[[dict[str, Any]], None]:
+    """Print the benchmark results and write them as JSON to $PERF_REPORT_DIR."""
+
+    def _report(results: dict[str, Any]) -> None:
+        report_dir = os.environ.get("PERF_REPORT_DIR", "perf_reports")
+        os.makedirs(report_dir, exist_ok=True)
+        with open(os.path.join(report_dir, f"{request.node.name}.json"), "w") as f:
+            json.dump(results, f, indent=2)
+        print(json.dumps(results, indent=2))
+
+    return _report
+
+
+@pytest.fixture
+def queue(tmp_path: Any) -> Generator[RDSJobQueue, Any, None]:
+    """Queue on SQLite, or on the (e.g. local PostgreSQL) database at $PERF_QUEUE_DB_URL."""
+    db_url = os.environ.get("PERF_QUEUE_DB_URL")
+    queue = RDSJobQueue(db_url or f"sqlite:///{tmp_path}/perf.db", max_retries=0)
+    if db_url:
+        queue.delete()
+    queue.create(err_on_exists=True)
+    yield queue
+    if db_url:
+        queue.delete()
+    queue.engine.dispose()
+
+
+@pytest.fixture
+def filesystem(tmp_path: Any) -> LocalFilesystem:
+    return LocalFilesystem(str(tmp_path / "data"), str(tmp_path / "data"))
+
+
+@pytest.fixture
+def app(
+    queue: RDSJobQueue, filesystem: LocalFilesystem, monkeypatch: pytest.MonkeyPatch
+) -> FastAPI:
+    """The app, using `queue` and `filesystem`, without authentication."""
+
+    def current_user(request: Request) -> GroupClaims:
+        return GroupClaims.model_validate(
+            {
+                "cognito:username": request.headers.get(WORKER_HEADER, "perf_worker"),
+                "cognito:email": "perf@example.com",
+                "cognito:groups": ["workers"],
+            }
+        )
+
+    for dep, override in [
+        (queue_dep, lambda: queue),
+        (filesystem_dep, lambda: filesystem),
+        (current_user_dep, current_user),
+        (authorizer, lambda: None),
+    ]:
+        monkeypatch.setitem(
+            workerfacing_app.dependency_overrides,  # type: ignore
+            dep,
+            override,
+        )
+    return workerfacing_app
+
+
+@pytest.fixture
+def userfacing_api(
+    real_update_job: None, monkeypatch: pytest.MonkeyPatch
+) -> Generator[FakeUserfacingAPI, Any, None]:
+    """Stand-in of the user-facing API, receiving the job status updates."""
+    with FakeUserfacingAPI(settings.internal_api_key_secret) as server:
+        monkeypatch.setenv("USERFACING_API_URL", server.url)
+        yield server
+
+
+@pytest.fixture
+def client(app: FastAPI) -> TestClient:
+    return TestClient(app)
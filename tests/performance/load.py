@@ -0,0 +1,329 @@
+"""Load generation against the app running in process: simulated workers and job producer.
+
+The requests are sent through an ASGI transport, so that the app serves the simulated workers
+concurrently on a single event loop (and its thread pool), as a worker process would.
+"""
+
+import asyncio
+import collections
+import os
+import random
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+import httpx
+from fastapi import FastAPI
+
+from tests.performance.conftest import WORKER_HEADER, submitted_job
+from workerfacing_api.core.filesystem import LocalFilesystem
+from workerfacing_api.schemas.queue_jobs import HardwareSpecs
+from workerfacing_api.schemas.rds_models import JobStates
+
+_DB_TIMING = re.compile(r'db;dur=[0-9.]+;desc="(\d+) statements"')
+
+
+@dataclass
+class WorkerProfile:
+    name: str
+    cpu_cores: int
+    memory: int
+    gpu_mem: int = 0
+
+    @property
+    def params(self) -> dict[str, int]:
+        return {
+            "cpu_cores": self.cpu_cores,
+            "memory": self.memory,
+            "gpu_mem": self.gpu_mem,
+        }
+
+
+# mixed fleet: profile and share of the workers
+FLEET = [
+    (WorkerProfile("gpu_large", cpu_cores=32, memory=256, gpu_mem=80), 0.2),
+    (WorkerProfile("gpu_small", cpu_cores=8, memory=64, gpu_mem=16), 0.5),
+    (WorkerProfile("cpu", cpu_cores=4, memory=16), 0.3),
+]
+# job requirements and their share of the jobs
+JOB_HARDWARE = [
+    (HardwareSpecs(cpu_cores=2, memory=8), 0.3),
+    (HardwareSpecs(cpu_cores=4, memory=32, gpu_mem=8), 0.5),
+    (HardwareSpecs(cpu_cores=16, memory=128, gpu_mem=40), 0.2),
+]
+
+
+def fleet(n_workers: int) -> list[tuple[str, WorkerProfile]]:
+    """Hostnames and profiles of `n_workers` workers, in the proportions of `FLEET`."""
+    workers = []
+    for profile, share in FLEET:
+        n = max(1, round(n_workers * share))
+        workers += [(f"{profile.name}_{i}", profile) for i in range(n)]
+    return workers[:n_workers]
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    values = sorted(values)
+    if not values:
+        return {}
+
+    def at(q: float) -> float:
+        return values[min(int(q * len(values)), len(values) - 1)]
+
+    return {
+        "count": len(values),
+        "p50_ms": at(0.5) * 1000,
+        "p90_ms": at(0.9) * 1000,
+        "p99_ms": at(0.99) * 1000,
+        "max_ms": values[-1] * 1000,
+    }
+
+
+@dataclass
+class Recorder:
+    """Latencies per request type, database statements (from the `Server-Timing` header) and errors."""
+
+    latencies: dict[str, list[float]] = field(
+        default_factory=lambda: collections.defaultdict(list)
+    )
+    db_statements: int = 0
+    errors: collections.Counter[str] = field(default_factory=collections.Counter)
+
+    async def request(
+        self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs: Any
+    ) -> httpx.Response:
+        start = time.perf_counter()
+        resp = await client.request(method, url, **kwargs)
+        self.latencies[name].append(time.perf_counter() - start)
+        match = _DB_TIMING.search(resp.headers.get("server-timing", ""))
+        if match:
+            self.db_statements += int(match.group(1))
+        if resp.is_error:
+            self.errors[f"{name} {resp.status_code}"] += 1
+        return resp
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        return {name: percentiles(values) for name, values in self.latencies.items()}
+
+
+@dataclass
+class Crash:
+    """A worker that stopped sending keepalive signals for a job."""
+
+    job_id: int
+    hostname: str
+    renewed: float  # Unix time of the last renewal of the lease
+    time: float
+
+
+@dataclass
+class Assignments:
+    """Jobs pulled (per worker, in order), completed and abandoned, as seen by the workers."""
+
+    pulled: dict[int, list[str]] = field(
+        default_factory=lambda: collections.defaultdict(list)
+    )
+    finished: dict[int, list[str]] = field(
+        default_factory=lambda: collections.defaultdict(list)
+    )
+    crashes: list[Crash] = field(default_factory=list)
+    # jobs finished by workers coming back after their crash (accepted if still leased to them)
+    stale_finished: list[int] = field(default_factory=list)
+
+    def duplicates(self) -> int:
+        """Number of extra assignments of jobs pulled by several workers."""
+        return sum(len(workers) - 1 for workers in self.pulled.values())
+
+
+async def produce(
+    client: httpx.AsyncClient,
+    recorder: Recorder,
+    n_jobs: int,
+    base_path: str,
+    input_path: str,
+    rate: float,
+    seed: int = 0,
+    lease_duration: int | None = None,
+) -> None:
+    """Submit `n_jobs` jobs of mixed requirements at `rate` jobs per second (0 for a burst)."""
+    rng = random.Random(seed)
+    hardware, weights = zip(*JOB_HARDWARE)
+    start = time.perf_counter()
+    for i in range(n_jobs):
+        job = submitted_job(i, base_path, hw_specs=rng.choices(hardware, weights)[0])
+        job.job.handler.files_down = {"input": input_path}
+        job.lease_duration = lease_duration
+        resp = await recorder.request(
+            client, "POST /_jobs", "POST", "/_jobs", json=job.model_dump(mode="json")
+        )
+        resp.raise_for_status()
+        if rate:
+            await asyncio.sleep(max(start + (i + 1) / rate - time.perf_counter(), 0))
+
+
+@dataclass
+class SimulatedWorker:
+    """
+    Pulls one job at a time, starts it, requests the URL of its input, sends `n_heartbeats`
+    keepalive signals while "running" it for `work_time` seconds, uploads its output and finishes it.
+    With `crash_rate`, it stops sending keepalive signals in the middle of that share of its jobs,
+    and comes back after `stall` seconds, trying to finish the job before pulling again.
+    """
+
+    hostname: str
+    profile: WorkerProfile
+    work_time: float = 0.05
+    n_heartbeats: int = 2
+    poll_interval: float = 0.05
+    token: str | None = None  # Cognito ID token, if the app authenticates the workers
+    crash_rate: float = 0
+    stall: float = 0
+    _rng: random.Random = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self._rng = random.Random(self.hostname)
+
+    @property
+    def headers(self) -> dict[str, str]:
+        if self.token is not None:
+            return {"authorization": f"Bearer {self.token}"}
+        return {WORKER_HEADER: self.hostname}
+
+    async def run(
+        self,
+        client: httpx.AsyncClient,
+        recorder: Recorder,
+        assignments: Assignments,
+        stop: asyncio.Event,
+    ) -> None:
+        headers = self.headers
+        while not stop.is_set():
+            resp = await recorder.request(
+                client,
+                "GET /jobs",
+                "GET",
+                "/jobs",
+                params=self.profile.params,
+                headers=headers,
+            )
+            jobs = resp.json() if resp.status_code == 200 else {}
+            if not jobs:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            for job_id_str, job in jobs.items():
+                job_id = int(job_id_str)
+                assignments.pulled[job_id].append(self.hostname)
+                if await self._run_job(
+                    client, recorder, assignments, job_id, job, headers
+                ):
+                    assignments.finished[job_id].append(self.hostname)
+
+    async def _run_job(
+        self,
+        client: httpx.AsyncClient,
+        recorder: Recorder,
+        assignments: Assignments,
+        job_id: int,
+        job: dict[str, Any],
+        headers: dict[str, str],
+    ) -> bool:
+        params = {"lease_token": job["lease"]["token"]}
+        renewed = time.time()
+
+        async def put_status(status: JobStates) -> bool:
+            nonlocal renewed
+            resp = await recorder.request(
+                client,
+                "PUT /jobs/{job_id}/status",
+                "PUT",
+                f"/jobs/{job_id}/status",
+                params={**params, "status": status.value},
+                headers=headers,
+            )
+            if resp.status_code != 204:  # 404 if the lease was lost
+                return False
+            renewed = time.time()
+            return True
+
+        if not await put_status(JobStates.running):
+            return False
+        for path in job["handler"].get("files_down", {}).values():
+            await recorder.request(
+                client,
+                "GET /files/{file_id}/url",
+                "GET",
+                f"/files/{path}/url",
+                headers=headers,
+            )
+        crash_at = None
+        if self._rng.random() < self.crash_rate:
+            crash_at = self._rng.randrange(self.n_heartbeats + 1)
+        for i in range(self.n_heartbeats + 1):
+            await asyncio.sleep(self.work_time / (self.n_heartbeats + 1))
+            if i == crash_at:
+                assignments.crashes.append(
+                    Crash(job_id, self.hostname, renewed, time.time())
+                )
+                await asyncio.sleep(self.stall)
+                if await put_status(JobStates.finished):
+                    assignments.stale_finished.append(job_id)
+                return False
+            if i < self.n_heartbeats and not await put_status(JobStates.running):
+                return False
+        await recorder.request(
+            client,
+            "POST /jobs/{job_id}/files/upload",
+            "POST",
+            f"/jobs/{job_id}/files/upload",
+            params={"type": "output", "base_path": ""},
+            files={"file": ("result.txt", f"result of {job_id}".encode())},
+            headers=headers,
+        )
+        return await put_status(JobStates.finished)
+
+
+def write_input(filesystem: LocalFilesystem) -> str:
+    """Write the input file of the jobs, returning its path."""
+    input_path = f"{filesystem.base_get_path}/inputs/input.bin"
+    os.makedirs(os.path.dirname(input_path), exist_ok=True)
+    with open(input_path, "wb") as f:
+        f.write(os.urandom(1024))
+    return input_path
+
+
+async def run_load(
+    app: FastAPI,
+    filesystem: LocalFilesystem,
+    workers: list[SimulatedWorker],
+    n_jobs: int,
+    submit_rate: float,
+    timeout: float,
+) -> tuple[Recorder, Assignments, float]:
+    """Run the producer and the workers until all jobs are finished (or `timeout` seconds)."""
+    input_path = write_input(filesystem)
+    recorder, assignments, stop = Recorder(), Assignments(), asyncio.Event()
+    # unhandled errors as 500 responses, as served
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        start = time.perf_counter()
+        tasks = [
+            asyncio.create_task(worker.run(client, recorder, assignments, stop))
+            for worker in workers
+        ]
+        await produce(
+            client,
+            recorder,
+            n_jobs,
+            filesystem.base_post_path,
+            input_path,
+            submit_rate,
+        )
+        while len(assignments.finished) < n_jobs:
+            if time.perf_counter() - start > timeout:
+                break
+            await asyncio.sleep(0.01)
+        duration = time.perf_counter() - start
+        stop.set()
+        await asyncio.gather(*tasks)
+    return recorder, assignments, duration
@@ -0,0 +1,80 @@
+"""The worker authentication of the API, verifying the tokens with the keys of a Cognito stand-in.
+
+The API fetches the keys of its user pool from Cognito: the benchmarks use the keys served by
+`upstream.FakeCognito` instead, the tokens being verified as by the API otherwise.
+Light to import, as the app started by the cold-start benchmark imports it.
+`PERF_COGNITO_JWKS_URL=... python -m tests.performance.stand_in_auth` serves the API with the keys of
+`python -m tests.performance.upstream`.
+"""
+
+import functools
+import os
+from typing import TYPE_CHECKING
+
+from workerfacing_api import dependencies, settings
+from workerfacing_api.dependencies import LazyResource, WorkerAuthDependency
+
+if TYPE_CHECKING:
+    from workerfacing_api.cognito import WorkerGroupCognitoCurrentUser
+
+
+class StandInAuthDependency(WorkerAuthDependency):
+    """`WorkerAuthDependency` fetching the keys from `jwks_url` instead of the user pool."""
+
+    def __init__(
+        self,
+        region: str,
+        user_pool_id: str | None,
+        client_id: str | None,
+        jwks_url: str,
+    ):
+        super().__init__(region, user_pool_id, client_id)
+        self.verifier = LazyResource(
+            functools.partial(
+                self._create_stand_in_verifier,
+                region,
+                user_pool_id,
+                client_id,
+                jwks_url,
+            )
+        )
+
+    @staticmethod
+    def _create_stand_in_verifier(
+        region: str,
+        user_pool_id: str | None,
+        client_id: str | None,
+        jwks_url: str,
+    ) -> "WorkerGroupCognitoCurrentUser":
+        from unittest import mock
+
+        from fastapi_cloudauth import cognito  # type: ignore
+
+        jwks = cognito.JWKS
+        with mock.patch.object(cognito, "JWKS", lambda url: jwks(url=jwks_url)):
+            return WorkerAuthDependency._create_verifier(
+                region, user_pool_id, client_id
+            )
+
+
+def use_stand_in(jwks_url: str) -> None:
+    """Make the app (e.g. started in another process) verify the tokens with the keys at `jwks_url`."""
+    dependencies.current_user_dep.verifier = StandInAuthDependency(
+        settings.cognito_region,
+        settings.cognito_user_pool_id,
+        settings.cognito_client_id,
+        jwks_url,
+    ).verifier
+
+
+def main() -> None:
+    import uvicorn
+
+    from workerfacing_api.main import workerfacing_app
+
+    use_stand_in(os.environ["PERF_COGNITO_JWKS_URL"])
+    uvicorn.run(workerfacing_app, port=int(os.environ.get("PORT", 8001)))
+
+
+if __name__ == "__main__":
+    main()
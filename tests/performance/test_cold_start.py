@@ -0,0 +1,160 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Callable, Generator
+
+import pytest
+
+from tests.performance.upstream import FakeCognito, Faults
+
+pytestmark = pytest.mark.performance
+
+N_RUNS = int(os.environ.get("PERF_STARTUP_N_RUNS", 5))
+# latency of the JWKS endpoint of Cognito, in seconds
+COGNITO_LATENCY = float(os.environ.get("PERF_STARTUP_COGNITO_LATENCY", 0.5))
+TIMEOUT = float(os.environ.get("PERF_STARTUP_TIMEOUT", 60))
+ROOT = str(Path(__file__).parents[2])
+# not to be imported before the dependencies are set up
+DEFERRED_PACKAGES = {
+    "boto3",
+    "fastapi_cloudauth",
+    "jose",
+    "mypy_boto3_s3",
+    "mypy_boto3_sqs",
+}
+
+# run in a fresh (isolated) interpreter, printing its timings as JSON
+STARTUP_SCRIPT = f"""
+import json, os, sys, time
+
+start = time.perf_counter()
+sys.path.insert(0, {ROOT!r})
+from workerfacing_api.main import workerfacing_app
+
+imported = time.perf_counter()
+modules = sorted({{name.split(".")[0] for name in sys.modules}})
+from fastapi.testclient import TestClient
+from tests.performance.stand_in_auth import use_stand_in
+
+use_stand_in(os.environ["PERF_COGNITO_JWKS_URL"])
+
+with TestClient(workerfacing_app) as client:
+    started = time.perf_counter()
+    client.get("/")
+    first_response = time.perf_counter()
+    while client.get("/ready").status_code != 200:
+        if time.perf_counter() - start > {TIMEOUT}:
+            break
+        time.sleep(0.005)
+    ready = time.perf_counter()
+    readiness = client.get("/ready").json()
+print(json.dumps({{
+    "import_seconds": imported - start,
+    "first_response_seconds": first_response - start,
+    "ready_seconds": ready - start,
+    "setup_seconds": ready - started,
+    "readiness": readiness,
+    "modules": modules,
+}}))
+"""
+IMPORT_SCRIPT = (
+    f"import sys; sys.path.insert(0, {ROOT!r}); import workerfacing_api.main"
+)
+
+
+@pytest.fixture
+def cognito() -> Generator[FakeCognito, Any, None]:
+    with FakeCognito(faults=Faults(COGNITO_LATENCY)) as server:
+        yield server
+
+
+@pytest.fixture
+def env(cognito: FakeCognito, tmp_path: Path) -> dict[str, str]:
+    """Environment of the app, on SQLite (or $PERF_QUEUE_DB_URL), authenticating with `cognito`."""
+    env = {
+        name: value
+        for name, value in os.environ.items()
+        if not name.startswith(("PYTHON", "QUEUE_", "COGNITO_", "S3_", "FILESYSTEM"))
+    }
+    env.update(
+        {
+            "QUEUE_DB_URL": os.environ.get(
+                "PERF_QUEUE_DB_URL", f"sqlite:///{tmp_path}/startup.db"
+            ),
+            "FILESYSTEM": "local",
+            "USER_DATA_ROOT_PATH": str(tmp_path / "data"),
+            "COGNITO_REGION": cognito.region,
+            "COGNITO_USER_POOL_ID": cognito.user_pool_id,
+            "COGNITO_CLIENT_ID": cognito.client_id,
+            "PERF_COGNITO_JWKS_URL": cognito.jwks_url,
+        }
+    )
+    return env
+
+
+def run_python(
+    args: list[str], env: dict[str, str]
+) -> subprocess.CompletedProcess[str]:
+    return subprocess.run(
+        [sys.executable, "-I", *args],
+        env=env,
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        timeout=TIMEOUT,
+        check=True,
+    )
+
+
+def top_imports(importtime: str, n: int = 15) -> dict[str, float]:
+    """Cumulative import times (in ms) of the `n` slowest top-level imports of `-X importtime`."""
+    times = {}
+    for line in importtime.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        # nested imports are indented by two more spaces per level
+        if len(name) - len(name.lstrip()) <= 3:
+            times[name.strip()] = int(cumulative) / 1000
+    return dict(sorted(times.items(), key=lambda item: -item[1])[:n])
+
+
+def test_cold_start(
+    env: dict[str, str], report: Callable[[dict[str, Any]], None]
+) -> None:
+    """Import time, time to the first response and time until ready of a cold start."""
+    runs = [
+        json.loads(run_python(["-c", STARTUP_SCRIPT], env).stdout.splitlines()[-1])
+        for _ in range(N_RUNS)
+    ]
+    importtime = run_python(["-X", "importtime", "-c", IMPORT_SCRIPT], env).stderr
+    steps: dict[str, list[float]] = {}
+    for run in runs:
+        for step in run["readiness"]["steps"]:
+            steps.setdefault(step["name"], []).append(step["seconds"])
+
+    def median(name: str) -> float:
+        return float(statistics.median(run[name] for run in runs))
+
+    results: dict[str, Any] = {
+        "n_runs": N_RUNS,
+        "cognito_latency": COGNITO_LATENCY,
+        "import_seconds": median("import_seconds"),
+        "first_response_seconds": median("first_response_seconds"),
+        "ready_seconds": median("ready_seconds"),
+        "setup_seconds": median("setup_seconds"),
+        "step_seconds": {name: statistics.median(s) for name, s in steps.items()},
+        "top_imports_ms": top_imports(importtime),
+        "deferred_imported": sorted(DEFERRED_PACKAGES.intersection(runs[0]["modules"])),
+    }
+    report(results)
+    assert not results["deferred_imported"]
+    for run in runs:
+        assert run["readiness"]["ready"], run["readiness"]
+        # served while setting up
+        assert run["first_response_seconds"] < run["ready_seconds"]
+    # the steps are set up concurrently
+    assert results["setup_seconds"] < sum(results["step_seconds"].values()) + 0.1
@@ -0,0 +1,96 @@
+import gzip
+import os
+import time
+from typing import Any, Callable
+
+import pytest
+import zstandard
+from fastapi.testclient import TestClient
+
+from tests.performance.conftest import submitted_job
+from workerfacing_api.core.filesystem import LocalFilesystem
+from workerfacing_api.core.queue import RDSJobQueue
+
+pytestmark = pytest.mark.performance
+
+N_FILES_DOWN = int(os.environ.get("PERF_COMPRESSION_N_FILES_DOWN", 2000))
+N_JOBS = int(os.environ.get("PERF_COMPRESSION_N_JOBS", 50))
+N_REPEATS = 20
+
+CODECS: dict[str, tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+    # same levels as CompressionMiddleware
+    "gzip": (lambda data: gzip.compress(data, compresslevel=6), gzip.decompress),
+    "zstd": (
+        zstandard.ZstdCompressor(level=3).compress,
+        zstandard.ZstdDecompressor().decompress,
+    ),
+}
+
+
+def _log(n_lines: int) -> bytes:
+    return "".join(
+        f"2024-01-01 00:{i // 60 % 60:02d}:{i % 60:02d} INFO epoch {i}: loss {1 / (i + 1):.6f}\n"
+        for i in range(n_lines)
+    ).encode()
+
+
+def test_compression_cpu(report: Callable[[dict[str, Any]], None]) -> None:
+    """Compression ratio vs. CPU time of the supported codecs on typical payloads."""
+    job = submitted_job(1, "/data").job
+    job.handler.files_down = {
+        f"file{i}": f"/data/user/inputs/{i}/frames.tif" for i in range(N_FILES_DOWN)
+    }
+    job.app.env = {f"VAR_{i}": f"value_{i}" for i in range(N_FILES_DOWN // 10)}
+    payloads = {"job": job.model_dump_json().encode(), "log": _log(20_000)}
+    results: dict[str, Any] = {}
+    for payload_name, payload in payloads.items():
+        results[payload_name] = {"size": len(payload)}
+        for codec_name, (compress, decompress) in CODECS.items():
+            start = time.process_time()
+            for _ in range(N_REPEATS):
+                compressed = compress(payload)
+            compress_time = (time.process_time() - start) / N_REPEATS
+            start = time.process_time()
+            for _ in range(N_REPEATS):
+                assert decompress(compressed) == payload
+            decompress_time = (time.process_time() - start) / N_REPEATS
+            results[payload_name][codec_name] = {
+                "size": len(compressed),
+                "ratio": len(payload) / len(compressed),
+                "compress_cpu_seconds": compress_time,
+                "decompress_cpu_seconds": decompress_time,
+                "compress_mb_per_cpu_second": len(payload) / compress_time / 1e6,
+            }
+    report(results)
+
+
+def test_compression_job_pulls(
+    client: TestClient,
+    queue: RDSJobQueue,
+    filesystem: LocalFilesystem,
+    report: Callable[[dict[str, Any]], None],
+) -> None:
+    """Bytes on the wire and latency of job pulls with large `files_down` maps."""
+    results: dict[str, Any] = {"n_files_down": N_FILES_DOWN, "n_jobs": N_JOBS}
+    for i, encoding in enumerate(["identity", "gzip", "zstd"]):
+        for job_id in range(i * N_JOBS, (i + 1) * N_JOBS):
+            job = submitted_job(job_id, filesystem.base_post_path)
+            job.job.handler.files_down = {
+                f"file{j}": f"data/{job_id}/frames{j}.tif" for j in range(N_FILES_DOWN)
+            }
+            queue.enqueue(job)
+        n_bytes = 0
+        start = time.perf_counter()
+        for _ in range(N_JOBS):
+            resp = client.get(
+                "/jobs", params={"memory": 1}, headers={"accept-encoding": encoding}
+            )
+            resp.raise_for_status()
+            assert len(resp.json()) == 1
+            n_bytes += resp.num_bytes_downloaded
+        duration = time.perf_counter() - start
+        results[encoding] = {
+            "bytes_per_pull": n_bytes / N_JOBS,
+            "seconds_per_pull": duration / N_JOBS,
+        }
+    report(results)
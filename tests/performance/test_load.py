@@ -0,0 +1,85 @@
+import asyncio
+import os
+from typing import Any, Callable
+
+import pytest
+from fastapi import FastAPI
+from sqlalchemy.orm import Session
+
+from tests.performance.load import (
+    SimulatedWorker,
+    fleet,
+    run_load,
+)
+from workerfacing_api.core.filesystem import LocalFilesystem
+from workerfacing_api.core.queue import RDSJobQueue
+from workerfacing_api.query_log import query_log
+from workerfacing_api.schemas.debug import QueryLogConfig
+from workerfacing_api.schemas.rds_models import JobStates, QueuedJob
+
+pytestmark = pytest.mark.performance
+
+N_WORKERS = int(os.environ.get("PERF_LOAD_N_WORKERS", 20))
+N_JOBS = int(os.environ.get("PERF_LOAD_N_JOBS", 200))
+# jobs submitted per second (0 to submit them all at once)
+SUBMIT_RATE = float(os.environ.get("PERF_LOAD_SUBMIT_RATE", 200))
+WORK_TIME = float(os.environ.get("PERF_LOAD_WORK_TIME", 0.05))
+N_HEARTBEATS = int(os.environ.get("PERF_LOAD_N_HEARTBEATS", 2))
+TIMEOUT = float(os.environ.get("PERF_LOAD_TIMEOUT", 300))
+
+
+@pytest.fixture
+def count_statements() -> Any:
+    """Enable the statement log, to count the statements per request."""
+    config = query_log.config
+    query_log.configure(
+        QueryLogConfig(enabled=True, slow_threshold=60, statement_budget=0)
+    )
+    yield
+    query_log.configure(config)
+
+
+def test_load(
+    app: FastAPI,
+    queue: RDSJobQueue,
+    filesystem: LocalFilesystem,
+    count_statements: None,
+    report: Callable[[dict[str, Any]], None],
+) -> None:
+    """Throughput and latencies of a mixed fleet pulling, running and uploading jobs."""
+    workers = [
+        SimulatedWorker(
+            hostname, profile, work_time=WORK_TIME, n_heartbeats=N_HEARTBEATS
+        )
+        for hostname, profile in fleet(N_WORKERS)
+    ]
+    recorder, assignments, duration = asyncio.run(
+        run_load(app, filesystem, workers, N_JOBS, SUBMIT_RATE, TIMEOUT)
+    )
+    with Session(queue.engine) as session:
+        n_finished = (
+            session.query(QueuedJob)
+            .filter(QueuedJob.status == JobStates.finished.value)
+            .count()
+        )
+    n_requests = sum(len(values) for values in recorder.latencies.values())
+    results = {
+        "db": queue.engine.dialect.name,
+        "n_workers": len(workers),
+        "n_jobs": N_JOBS,
+        "submit_rate": SUBMIT_RATE,
+        "work_time": WORK_TIME,
+        "n_heartbeats": N_HEARTBEATS,
+        "seconds": duration,
+        "n_finished": n_finished,
+        "jobs_per_second": n_finished / duration,
+        "requests_per_second": n_requests / duration,
+        "latencies": recorder.summary(),
+        "duplicate_assignments": assignments.duplicates(),
+        "db_statements_per_job": recorder.db_statements / max(n_finished, 1),
+        "errors": dict(recorder.errors),
+    }
+    report(results)
+    assert n_finished == N_JOBS
+    assert results["duplicate_assignments"] == 0
+    assert not recorder.errors
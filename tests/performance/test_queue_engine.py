@@ -0,0 +1,192 @@
+import contextlib
+import datetime
+import os
+import random
+import resource
+import time
+import tracemalloc
+from typing import Any, Callable, Iterator
+
+import pytest
+from sqlalchemy import Engine, event, insert
+from sqlalchemy.orm import Session
+
+from tests.performance.conftest import submitted_job
+from tests.performance.load import FLEET, JOB_HARDWARE, WorkerProfile, percentiles
+from workerfacing_api.core.queue import RDSJobQueue
+from workerfacing_api.schemas.queue_jobs import EnvironmentTypes, JobFilter
+from workerfacing_api.schemas.rds_models import JobStates, QueuedJob
+
+pytestmark = pytest.mark.performance
+
+N_ROWS = int(os.environ.get("PERF_QUEUE_N_ROWS", 10**6))
+# shares of the rows queued and in flight (the others are finished or failed)
+QUEUED_SHARE = float(os.environ.get("PERF_QUEUE_QUEUED_SHARE", 0.05))
+IN_FLIGHT_SHARE = float(os.environ.get("PERF_QUEUE_IN_FLIGHT_SHARE", 0.02))
+# in-flight jobs whose lease expired, handled by the sweep
+N_EXPIRED = int(os.environ.get("PERF_QUEUE_N_EXPIRED", 1000))
+N_CLAIMS = int(os.environ.get("PERF_QUEUE_N_CLAIMS", 200))
+N_GROUPS = 50
+IN_FLIGHT_STATES = [JobStates.pulled, JobStates.running, JobStates.postprocessing]
+# fits no job, so that the claim finds nothing after going through all candidates
+TOO_SMALL = WorkerProfile("too_small", cpu_cores=1, memory=1)
+
+
+def bulk_load(queue: RDSJobQueue, seed: int = 0, chunk_size: int = 10_000) -> None:
+    """Insert `N_ROWS` jobs of mixed statuses, requirements, groups and priorities."""
+    rng = random.Random(seed)
+    hardware, weights = zip(*JOB_HARDWARE)
+    jobs = [submitted_job(0, "/data", hw_specs=hw) for hw in hardware]
+    now = datetime.datetime.now(datetime.timezone.utc)
+    n_queued, n_in_flight = int(N_ROWS * QUEUED_SHARE), int(N_ROWS * IN_FLIGHT_SHARE)
+
+    def row(i: int) -> dict[str, Any]:
+        job = rng.choices(jobs, weights)[0]
+        created = now - datetime.timedelta(seconds=rng.uniform(0, 30 * 24 * 3600))
+        values = {
+            "creation_timestamp": created,
+            "last_updated": created,
+            "job": job.job.model_dump(),
+            "paths_upload": job.paths_upload.model_dump(),
+            "environment": job.environment.value,
+            **job.job.hardware.model_dump(),
+            # long tail of group sizes
+            "group": f"group{int(rng.paretovariate(1)) % N_GROUPS}",
+            "priority": rng.choice([1, 5, 5, 5, 10]),
+            "image": job.job.handler.image,
+            "num_retries": 0,
+            "workers": "",
+        }
+        if i < n_queued:
+            values["status"] = JobStates.queued.value
+        elif i < n_queued + n_in_flight:
+            expired = i < n_queued + min(N_EXPIRED, n_in_flight)
+            values["status"] = rng.choice(IN_FLIGHT_STATES).value
+            values["workers"] = f"worker{rng.randrange(1000)}"
+            values["lease_token"] = f"token{i}"
+            values["lease_expires_at"] = now + datetime.timedelta(
+                seconds=-10 if expired else 300
+            )
+        else:
+            values["status"] = rng.choice([JobStates.finished] * 9 + [JobStates.error])
+            values["status"] = values["status"].value
+        return values
+
+    with Session(queue.engine) as session:
+        for start in range(0, N_ROWS, chunk_size):
+            rows = [row(i) for i in range(start, min(start + chunk_size, N_ROWS))]
+            session.execute(insert(QueuedJob), rows)
+        session.commit()
+
+
+@contextlib.contextmanager
+def capture_statements(engine: Engine) -> Iterator[list[tuple[str, Any]]]:
+    statements: list[tuple[str, Any]] = []
+
+    def before_cursor_execute(
+        conn: Any, cursor: Any, statement: str, parameters: Any, *args: Any
+    ) -> None:
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def explain(engine: Engine, statements: list[tuple[str, Any]]) -> dict[str, list[str]]:
+    """Plans of the statements reading or writing the jobs, by statement."""
+    plans = {}
+    prefix = "EXPLAIN QUERY PLAN" if engine.dialect.name == "sqlite" else "EXPLAIN"
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            key = " ".join(statement.split())
+            if "queued_jobs" not in statement or key in plans:
+                continue
+            rows = conn.exec_driver_sql(f"{prefix} {statement}", parameters).all()
+            plans[key] = [row[-1] for row in rows]
+    return plans
+
+
+def job_filter(profile: WorkerProfile) -> JobFilter:
+    return JobFilter(
+        environment=EnvironmentTypes.local,
+        cpu_cores=profile.cpu_cores,
+        memory=profile.memory,
+        gpu_mem=profile.gpu_mem,
+    )
+
+
+def test_queue_engine(
+    queue: RDSJobQueue, report: Callable[[dict[str, Any]], None]
+) -> None:
+    """Claim latency, sweep time, memory and query plans with a large jobs table."""
+    start = time.perf_counter()
+    bulk_load(queue)
+    load_seconds = time.perf_counter() - start
+    results: dict[str, Any] = {
+        "n_rows": N_ROWS,
+        "n_queued": int(N_ROWS * QUEUED_SHARE),
+        "n_in_flight": int(N_ROWS * IN_FLIGHT_SHARE),
+        "n_expired": N_EXPIRED,
+        "load_rows_per_second": N_ROWS / load_seconds,
+    }
+    profiles = [profile for profile, _ in FLEET]
+
+    tracemalloc.start()
+    latencies: dict[str, list[float]] = {"claim": [], "claim_empty": []}
+    for i in range(N_CLAIMS):
+        profile = profiles[i % len(profiles)]
+        start = time.perf_counter()
+        claimed = queue.dequeue(f"bench{i}", job_filter(profile))
+        latencies["claim"].append(time.perf_counter() - start)
+        assert claimed is not None
+        start = time.perf_counter()
+        assert queue.dequeue(f"bench{i}", job_filter(TOO_SMALL)) is None
+        latencies["claim_empty"].append(time.perf_counter() - start)
+    _, claims_peak = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    results["claim_latency"] = percentiles(latencies["claim"])
+    results["claim_empty_latency"] = percentiles(latencies["claim_empty"])
+
+    sweeps: list[dict[str, Any]] = []
+    sweep_statements = []
+    for _ in range(2):  # with the expired leases, then without
+        start = time.perf_counter()
+        with capture_statements(queue.engine) as statements:
+            n_retry, n_fail = queue.handle_timeouts(max_retries=1)
+        sweep_statements.append(statements)
+        sweeps.append(
+            {
+                "seconds": time.perf_counter() - start,
+                "n_retry": n_retry,
+                "n_fail": n_fail,
+            }
+        )
+    _, sweep_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert sweeps[0]["n_retry"] == min(N_EXPIRED, results["n_in_flight"])
+    assert sweeps[1]["n_retry"] == 0
+    results["sweep"], results["sweep_idle"] = sweeps
+
+    db_path = queue.engine.url.database
+    results["memory"] = {
+        "claims_peak_bytes": claims_peak,
+        "sweep_peak_bytes": sweep_peak,
+        "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        "db_file_bytes": os.path.getsize(db_path) if db_path else None,
+    }
+
+    with capture_statements(queue.engine) as statements:
+        queue.dequeue("explain", job_filter(profiles[0]))
+    results["claim_plans"] = explain(queue.engine, statements)
+    results["sweep_plans"] = explain(queue.engine, sweep_statements[0])
+    report(results)
+
+    if queue.engine.dialect.name == "sqlite":
+        sweep_plan = [line for plan in results["sweep_plans"].values() for line in plan]
+        assert any("ix_queued_jobs_lease_expires_at" in line for line in sweep_plan)
+        for plan in results["claim_plans"].values():
+            # every read of the jobs table goes through an index
+            assert not any(line == "SCAN queued_jobs" for line in plan), plan
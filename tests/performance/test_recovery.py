@@ -0,0 +1,227 @@
+import asyncio
+import collections
+import os
+import time
+from typing import Any, Callable
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy.orm import Session
+
+from tests.performance.load import (
+    Assignments,
+    Recorder,
+    SimulatedWorker,
+    fleet,
+    percentiles,
+    produce,
+    write_input,
+)
+from tests.performance.upstream import FakeUserfacingAPI
+from workerfacing_api import settings
+from workerfacing_api.core.filesystem import LocalFilesystem
+from workerfacing_api.core.queue import RDSJobQueue
+from workerfacing_api.schemas.rds_models import JobStates, QueuedJob
+
+pytestmark = pytest.mark.performance
+
+N_WORKERS = int(os.environ.get("PERF_SOAK_N_WORKERS", 20))
+N_JOBS = int(os.environ.get("PERF_SOAK_N_JOBS", 200))
+SUBMIT_RATE = float(os.environ.get("PERF_SOAK_SUBMIT_RATE", 20))
+WORK_TIME = float(os.environ.get("PERF_SOAK_WORK_TIME", 0.5))
+# share of the workers (of each profile) that crash, and share of their jobs they crash during
+CRASH_SHARE = float(os.environ.get("PERF_SOAK_CRASH_SHARE", 0.3))
+CRASH_RATE = float(os.environ.get("PERF_SOAK_CRASH_RATE", 1))
+# seconds after which the crashed workers come back (trying to finish their job)
+STALL = float(os.environ.get("PERF_SOAK_STALL", 3))
+LEASE_DURATION = int(os.environ.get("PERF_SOAK_LEASE_DURATION", 1))
+MAX_RETRIES = int(os.environ.get("PERF_SOAK_MAX_RETRIES", settings.max_retries))
+TIMEOUT = float(os.environ.get("PERF_SOAK_TIMEOUT", 600))
+SETTLED_STATES = {JobStates.finished.value, JobStates.error.value}
+
+
+def crashing(workers: list[tuple[str, Any]]) -> set[str]:
+    """Hostnames of `CRASH_SHARE` of the workers of each profile."""
+    by_profile = collections.defaultdict(list)
+    for hostname, profile in workers:
+        by_profile[profile.name].append(hostname)
+    return {
+        hostname
+        for hostnames in by_profile.values()
+        for hostname in hostnames[: round(len(hostnames) * CRASH_SHARE)]
+    }
+
+
+async def watch_leases(
+    queue: RDSJobQueue, detections: dict[int, list[float]], stop: asyncio.Event
+) -> None:
+    """The lease watcher of the app, recording when the expired leases are detected."""
+    while not stop.is_set():
+        expired = await queue.deadlines.wait_expired(max_wait=0.1)
+        now = time.time()
+        for job_id in expired:
+            detections[job_id].append(now)
+        queue.handle_timeouts(MAX_RETRIES)
+        queue.load_deadlines(expired)
+
+
+async def run_soak(
+    app: FastAPI,
+    queue: RDSJobQueue,
+    filesystem: LocalFilesystem,
+    userfacing_api: FakeUserfacingAPI,
+    workers: list[SimulatedWorker],
+) -> tuple[Recorder, Assignments, dict[int, list[float]], float]:
+    """Run the producer, the workers and the lease watcher until all jobs are finished or failed."""
+    input_path = write_input(filesystem)
+    recorder, assignments, stop = Recorder(), Assignments(), asyncio.Event()
+    detections: dict[int, list[float]] = collections.defaultdict(list)
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        start = time.perf_counter()
+        watcher = asyncio.create_task(watch_leases(queue, detections, stop))
+        tasks = [
+            asyncio.create_task(worker.run(client, recorder, assignments, stop))
+            for worker in workers
+        ]
+        await produce(
+            client,
+            recorder,
+            N_JOBS,
+            filesystem.base_post_path,
+            input_path,
+            SUBMIT_RATE,
+            lease_duration=LEASE_DURATION,
+        )
+        while time.perf_counter() - start < TIMEOUT:
+            last = {job_id: status for job_id, status, _ in userfacing_api.updates}
+            if sum(status in SETTLED_STATES for status in last.values()) >= N_JOBS:
+                break
+            await asyncio.sleep(0.1)
+        duration = time.perf_counter() - start
+        stop.set()
+        await asyncio.gather(watcher, *tasks)
+    return recorder, assignments, detections, duration
+
+
+@pytest.mark.parametrize("retry_different", [True, False])
+def test_recovery(
+    app: FastAPI,
+    queue: RDSJobQueue,
+    filesystem: LocalFilesystem,
+    userfacing_api: FakeUserfacingAPI,
+    retry_different: bool,
+    monkeypatch: pytest.MonkeyPatch,
+    report: Callable[[dict[str, Any]], None],
+) -> None:
+    """Recovery of the jobs of workers that stop sending keepalive signals mid-job."""
+    monkeypatch.setattr(settings, "retry_different", retry_different)
+    hosts = fleet(N_WORKERS)
+    crashing_hosts = crashing(hosts)
+    workers = [
+        SimulatedWorker(
+            hostname,
+            profile,
+            work_time=WORK_TIME,
+            crash_rate=CRASH_RATE if hostname in crashing_hosts else 0,
+            stall=STALL,
+        )
+        for hostname, profile in hosts
+    ]
+    recorder, assignments, detections, duration = asyncio.run(
+        run_soak(app, queue, filesystem, userfacing_api, workers)
+    )
+
+    with Session(queue.engine) as session:
+        jobs = {
+            job.id: (
+                job.job["meta"]["job_id"],
+                job.status,
+                job.num_retries,
+                job.workers,
+            )
+            for job in session.query(QueuedJob)
+        }
+    # status updates (with their times) sent to the user-facing API, per job
+    updates = collections.defaultdict(list)
+    for meta_id, status, t in userfacing_api.updates:
+        updates[meta_id].append((status, t))
+
+    def first_after(job_id: int, t: float, states: set[str]) -> float | None:
+        meta_id = jobs[job_id][0]
+        return next(
+            (u for s, u in updates[meta_id] if s in states and u >= t),
+            None,
+        )
+
+    recovery: dict[str, list[float]] = collections.defaultdict(list)
+    for crash in assignments.crashes:
+        # approximately (the lease was renewed before the worker got the response)
+        expiry = crash.renewed + LEASE_DURATION
+        detected = next((t for t in detections[crash.job_id] if t >= crash.time), None)
+        if detected is not None:
+            recovery["detection_lag"].append(detected - expiry)
+        requeued = first_after(crash.job_id, crash.time, {JobStates.queued.value})
+        if requeued is not None:
+            recovery["time_to_requeue"].append(requeued - crash.time)
+            repulled = first_after(crash.job_id, requeued, {JobStates.pulled.value})
+            if repulled is not None:
+                recovery["time_to_repull"].append(repulled - crash.time)
+        finished = first_after(crash.job_id, crash.time, {JobStates.finished.value})
+        if finished is not None:
+            recovery["time_to_completion"].append(finished - crash.time)
+
+    timeouts: collections.Counter[int] = collections.Counter()
+    violations = []
+    for job_id, (meta_id, status, num_retries, job_workers) in jobs.items():
+        statuses = [s for s, _ in updates[meta_id]]
+        timeouts[job_id] = statuses.count(JobStates.queued.value) + (
+            status == JobStates.error.value
+        )
+        if num_retries > MAX_RETRIES or (
+            (status == JobStates.error.value) != (timeouts[job_id] > MAX_RETRIES)
+        ):
+            violations.append(job_id)
+    completions = collections.Counter(
+        {job_id: len(hostnames) for job_id, hostnames in assignments.finished.items()}
+    )
+    completions.update(assignments.stale_finished)
+    same_worker_retries = 0
+    for _, _, _, job_workers in jobs.values():
+        hostnames = [hostname for hostname in job_workers.split(";") if hostname]
+        same_worker_retries += len(hostnames) - len(set(hostnames))
+    n_statuses = collections.Counter(status for _, status, _, _ in jobs.values())
+    results = {
+        "db": queue.engine.dialect.name,
+        "retry_different": retry_different,
+        "max_retries": MAX_RETRIES,
+        "lease_duration": LEASE_DURATION,
+        "n_workers": len(workers),
+        "n_crashing_workers": len(crashing_hosts),
+        "n_jobs": N_JOBS,
+        "seconds": duration,
+        "n_crashes": len(assignments.crashes),
+        "n_affected_jobs": len({crash.job_id for crash in assignments.crashes}),
+        "n_timeouts": sum(timeouts.values()),
+        "recovery": {name: percentiles(values) for name, values in recovery.items()},
+        "n_finished": n_statuses[JobStates.finished.value],
+        "n_failed": n_statuses[JobStates.error.value],
+        "n_lost": sum(
+            status not in SETTLED_STATES for _, status, _, _ in jobs.values()
+        ),
+        "n_run_twice": sum(count > 1 for count in completions.values()),
+        "n_stale_finished": len(assignments.stale_finished),
+        "same_worker_retries": same_worker_retries,
+        "retry_violations": violations,
+        "latencies": recorder.summary(),
+        "errors": dict(recorder.errors),
+    }
+    report(results)
+    assert results["n_lost"] == 0
+    assert results["n_run_twice"] == 0
+    assert not violations
+    # the workers coming back after their crash are told that they lost the job
+    assert all(name == "PUT /jobs/{job_id}/status 404" for name in recorder.errors)
+    if retry_different:
+        assert same_worker_retries == 0
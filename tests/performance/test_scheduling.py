@@ -0,0 +1,124 @@
+import heapq
+import os
+import random
+import time
+from typing import Any, Callable
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from tests.performance.conftest import submitted_job
+from workerfacing_api.core.queue import RDSJobQueue
+from workerfacing_api.core.scheduling import OrderingPolicy
+from workerfacing_api.schemas.queue_jobs import (
+    EnvironmentTypes,
+    HardwareSpecs,
+    JobFilter,
+)
+from workerfacing_api.schemas.rds_models import JobStates, QueuedJob
+
+pytestmark = pytest.mark.performance
+
+N_SMALL_JOBS = int(os.environ.get("PERF_SCHEDULING_N_SMALL_JOBS", 300))
+N_BIG_JOBS = int(os.environ.get("PERF_SCHEDULING_N_BIG_JOBS", 20))
+# mixed fleet: (gpu memory, number of workers)
+FLEET = [(80, 2), (16, 8)]
+
+
+def _enqueue_jobs(queue: RDSJobQueue, seed: int = 0) -> dict[int, float]:
+    """Enqueue small (short) and big (long) jobs in random order, return their durations."""
+    rng = random.Random(seed)
+    specs = [(rng.randint(2, 12), rng.uniform(5, 15)) for _ in range(N_SMALL_JOBS)]
+    specs += [(rng.randint(40, 80), rng.uniform(50, 150)) for _ in range(N_BIG_JOBS)]
+    rng.shuffle(specs)
+    durations = {}
+    for job_id, (gpu_mem, duration) in enumerate(specs):
+        job = submitted_job(job_id, "/data", hw_specs=HardwareSpecs(gpu_mem=gpu_mem))
+        queue.enqueue(job)
+        durations[job_id] = duration
+    return durations
+
+
+def _simulate(queue: RDSJobQueue, durations: dict[int, float]) -> dict[str, float]:
+    """Discrete-event simulation of the fleet, each worker pulling one job at a time."""
+    workers = [
+        (f"worker{gpu_mem}_{i}", gpu_mem)
+        for gpu_mem, n_workers in FLEET
+        for i in range(n_workers)
+    ]
+    # (time, retry, worker): at equal times, finishing workers free up before retries
+    free_at = [(0.0, 0, i) for i in range(len(workers))]
+    busy_until: dict[int, float] = {}
+    makespan = busy_time = pull_time = 0.0
+    n_pulls = 0
+    while free_at:
+        now, _, i = heapq.heappop(free_at)
+        busy_until.pop(i, None)
+        hostname, gpu_mem = workers[i]
+        start = time.perf_counter()
+        job = queue.dequeue(
+            hostname,
+            JobFilter(
+                environment=EnvironmentTypes.local,
+                cpu_cores=8,
+                memory=64,
+                gpu_mem=gpu_mem,
+            ),
+        )
+        pull_time += time.perf_counter() - start
+        n_pulls += 1
+        if job is not None:
+            duration = durations[job[1].meta.job_id]
+            busy_until[i] = now + duration
+            busy_time += duration
+            makespan = max(makespan, now + duration)
+            heapq.heappush(free_at, (now + duration, 0, i))
+        elif busy_until:  # retry when the next running job finishes
+            heapq.heappush(free_at, (min(busy_until.values()), 1, i))
+    return {
+        "makespan": makespan,
+        "utilization": busy_time / (len(workers) * makespan),
+        "seconds_per_pull": pull_time / n_pulls,
+    }
+
+
+def test_best_fit_makespan(
+    queue: RDSJobQueue,
+    monkeypatch: pytest.MonkeyPatch,
+    report: Callable[[dict[str, Any]], None],
+) -> None:
+    """Makespan of a mixed job set on a mixed fleet, with and without best-fit ordering."""
+    results: dict[str, Any] = {
+        "n_small_jobs": N_SMALL_JOBS,
+        "n_big_jobs": N_BIG_JOBS,
+        "fleet": FLEET,
+    }
+    for name, ordering in [
+        ("priority", OrderingPolicy()),
+        ("best_fit", OrderingPolicy(best_fit=True)),
+    ]:
+        queue.delete()
+        queue.create()
+        monkeypatch.setattr(queue, "ordering", ordering)
+        durations = _enqueue_jobs(queue)
+        results[name] = _simulate(queue, durations)
+    # the best-fit order should be read from its index instead of sorting
+    with Session(queue.engine) as session:
+        query = queue.ordering.order(
+            session.query(QueuedJob).filter(
+                QueuedJob.status == JobStates.queued.value,
+                (QueuedJob.gpu_mem <= 80) | QueuedJob.gpu_mem.is_(None),
+            )
+        )
+        statement = query.statement.compile(
+            queue.engine, compile_kwargs={"literal_binds": True}
+        )
+        plan = session.execute(text(f"EXPLAIN QUERY PLAN {statement}")).all()
+    results["best_fit"]["query_plan"] = [row[-1] for row in plan]
+    report(results)
+    assert results["best_fit"]["makespan"] < results["priority"]["makespan"]
+    assert any(
+        "ix_queued_jobs_best_fit" in row for row in results["best_fit"]["query_plan"]
+    )
+    assert not any("TEMP B-TREE" in row for row in results["best_fit"]["query_plan"])
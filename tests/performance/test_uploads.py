@@ -0,0 +1,82 @@
+import io
+import os
+import tarfile
+import time
+from typing import Any, Callable
+
+import pytest
+from fastapi.testclient import TestClient
+
+from tests.performance.conftest import submitted_job
+from workerfacing_api.core.filesystem import LocalFilesystem
+from workerfacing_api.core.queue import RDSJobQueue
+
+pytestmark = pytest.mark.performance
+
+N_FILES = int(os.environ.get("PERF_UPLOAD_N_FILES", 200))
+FILE_SIZE = int(os.environ.get("PERF_UPLOAD_FILE_SIZE", 4 * 1024))
+
+
+def test_upload_many_small_files(
+    client: TestClient,
+    queue: RDSJobQueue,
+    filesystem: LocalFilesystem,
+    report: Callable[[dict[str, Any]], None],
+) -> None:
+    """Per-file uploads vs. one multi-file request vs. one tar archive."""
+    queue.enqueue(submitted_job(1, filesystem.base_post_path))
+    client.get("/jobs", params={"memory": 1}).raise_for_status()
+    files = {f"file{i}.log": os.urandom(FILE_SIZE) for i in range(N_FILES)}
+    url = "/jobs/1/files/upload"
+
+    def per_file() -> int:
+        for name, content in files.items():
+            client.post(
+                url,
+                params={"type": "log", "base_path": "per_file"},
+                files={"file": (name, content)},
+            ).raise_for_status()
+        return len(files)
+
+    def multi_file() -> int:
+        client.post(
+            url,
+            params={"type": "log", "base_path": "multi_file"},
+            files=[("file", (name, content)) for name, content in files.items()],
+        ).raise_for_status()
+        return 1
+
+    def archive() -> int:
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w") as tar:
+            for name, content in files.items():
+                info = tarfile.TarInfo(name)
+                info.size = len(content)
+                tar.addfile(info, io.BytesIO(content))
+        client.post(
+            url + "/archive",
+            params={"type": "log", "base_path": "archive"},
+            files={"archive": ("archive.tar", buffer.getvalue())},
+        ).raise_for_status()
+        return 1
+
+    results: dict[str, Any] = {"n_files": N_FILES, "file_size": FILE_SIZE}
+    for name, upload in [
+        ("per_file", per_file),
+        ("multi_file", multi_file),
+        ("archive", archive),
+    ]:
+        start = time.perf_counter()
+        n_requests = upload()
+        duration = time.perf_counter() - start
+        assert len(os.listdir(f"{filesystem.base_post_path}/log/1/{name}")) == N_FILES
+        results[name] = {
+            "seconds": duration,
+            "requests": n_requests,
+            "files_per_second": N_FILES / duration,
+        }
+    for name in ["multi_file", "archive"]:
+        results[name]["speedup"] = (
+            results["per_file"]["seconds"] / results[name]["seconds"]
+        )
+    report(results)
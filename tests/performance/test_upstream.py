@@ -0,0 +1,136 @@
+import asyncio
+import os
+import time
+from typing import Any, Callable, Generator
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from tests.performance.load import SimulatedWorker, fleet, percentiles, run_load
+from tests.performance.upstream import FakeCognito, FakeUserfacingAPI, Faults
+from workerfacing_api.core.filesystem import LocalFilesystem
+from workerfacing_api.dependencies import current_user_dep
+
+pytestmark = pytest.mark.performance
+
+N_WORKERS = int(os.environ.get("PERF_UPSTREAM_N_WORKERS", 10))
+N_JOBS = int(os.environ.get("PERF_UPSTREAM_N_JOBS", 40))
+# median latencies of the user-facing API, in seconds, one run per latency
+LATENCIES = [
+    float(latency)
+    for latency in os.environ.get("PERF_UPSTREAM_LATENCIES", "0,0.02,0.1").split(",")
+]
+# spread of the log-normal latencies
+SIGMA = float(os.environ.get("PERF_UPSTREAM_SIGMA", 0.5))
+# share of failed requests of an additional run, at the median of `LATENCIES`
+ERROR_RATE = float(os.environ.get("PERF_UPSTREAM_ERROR_RATE", 0.05))
+# latency of the JWKS endpoint of Cognito, in seconds
+COGNITO_LATENCY = float(os.environ.get("PERF_UPSTREAM_COGNITO_LATENCY", 0.2))
+TIMEOUT = float(os.environ.get("PERF_UPSTREAM_TIMEOUT", 120))
+
+
+@pytest.fixture
+def cognito() -> Generator[FakeCognito, Any, None]:
+    with FakeCognito(faults=Faults(COGNITO_LATENCY)) as server:
+        yield server
+
+
+@pytest.fixture
+def authenticated_app(
+    app: FastAPI, cognito: FakeCognito, monkeypatch: pytest.MonkeyPatch
+) -> FastAPI:
+    """The app, authenticating the workers with tokens of `cognito`."""
+    monkeypatch.setitem(
+        app.dependency_overrides,  # type: ignore
+        current_user_dep,
+        cognito.current_user(),
+    )
+    return app
+
+
+def test_worker_tokens(authenticated_app: FastAPI, cognito: FakeCognito) -> None:
+    """The tokens issued by the stand-in are verified as Cognito's."""
+    client = TestClient(authenticated_app)
+    params = {"cpu_cores": 1, "memory": 1}
+
+    def get_jobs(token: str) -> int:
+        headers = {"authorization": f"Bearer {token}"}
+        return client.get("/jobs", params=params, headers=headers).status_code
+
+    assert get_jobs(cognito.token("worker")) == 200
+    assert get_jobs(cognito.token("user", groups=["users"])) == 403
+    assert get_jobs(cognito.token("worker", expires_in=-60)) == 401
+    assert get_jobs(FakeCognito().token("worker")) == 401  # signed by another key
+
+
+def test_upstream_latency(
+    authenticated_app: FastAPI,
+    filesystem: LocalFilesystem,
+    userfacing_api: FakeUserfacingAPI,
+    cognito: FakeCognito,
+    report: Callable[[dict[str, Any]], None],
+) -> None:
+    """Worker-facing latencies with a slow, then failing, user-facing API."""
+    start = time.perf_counter()
+    cognito.current_user().setup()  # fetches the keys
+    auth_setup_seconds = time.perf_counter() - start
+    median = sorted(LATENCIES)[len(LATENCIES) // 2]
+    scenarios = [Faults(latency, SIGMA) for latency in LATENCIES]
+    scenarios.append(Faults(median, SIGMA, ERROR_RATE))
+
+    runs: list[dict[str, Any]] = []
+    for faults in scenarios:
+        timeout = TIMEOUT
+        if faults.error_rate:
+            # the workers give up the jobs whose updates fail, which are then not finished
+            timeout = 2 * runs[LATENCIES.index(median)]["seconds"]
+        userfacing_api.faults = faults
+        userfacing_api.latencies.clear()
+        userfacing_api.statuses.clear()
+        workers = [
+            SimulatedWorker(hostname, profile, token=cognito.token(hostname))
+            for hostname, profile in fleet(N_WORKERS)
+        ]
+        recorder, assignments, duration = asyncio.run(
+            run_load(authenticated_app, filesystem, workers, N_JOBS, 0, timeout)
+        )
+        runs.append(
+            {
+                "upstream": {
+                    "latency": faults.latency,
+                    "sigma": faults.sigma,
+                    "error_rate": faults.error_rate,
+                    "statuses": dict(userfacing_api.statuses),
+                    "latency_observed": percentiles(userfacing_api.latencies),
+                },
+                "seconds": duration,
+                "n_finished": len(assignments.finished),
+                "jobs_per_second": len(assignments.finished) / duration,
+                "latencies": recorder.summary(),
+                "errors": dict(recorder.errors),
+                "duplicate_assignments": assignments.duplicates(),
+            }
+        )
+    # latency added to the worker-facing requests, compared to the first run
+    baseline = runs[0]["latencies"]
+    for run in runs[1:]:
+        run["added_p50_ms"] = {
+            name: values["p50_ms"] - baseline[name]["p50_ms"]
+            for name, values in run["latencies"].items()
+            if name in baseline
+        }
+    report(
+        {
+            "n_workers": N_WORKERS,
+            "n_jobs": N_JOBS,
+            "cognito_latency": COGNITO_LATENCY,
+            "auth_setup_seconds": auth_setup_seconds,
+            "runs": runs,
+        }
+    )
+    for run in runs:
+        assert run["duplicate_assignments"] == 0
+        if not run["upstream"]["error_rate"]:
+            assert run["n_finished"] == N_JOBS
+            assert not run["errors"]
@@ -0,0 +1,266 @@
+"""Local stand-ins for the services called by the API: the user-facing API and Cognito.
+
+They are served over HTTP from background threads, as the API calls them with blocking requests,
+and answer after a configurable latency, with a configurable share of errors,
+to measure how the slowness of the upstream services propagates to the workers.
+`python -m tests.performance.upstream` serves them for a locally served API
+(with `python -m tests.performance.stand_in_auth`),
+printing its environment variables and tokens of simulated workers.
+"""
+
+import argparse
+import collections
+import json
+import math
+import random
+import secrets
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Self
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt  # type: ignore
+
+from tests.performance.stand_in_auth import StandInAuthDependency
+
+
+@dataclass
+class Faults:
+    """Latency and errors of the responses of a stand-in."""
+
+    latency: float = 0  # median, in seconds
+    sigma: float = (
+        0  # of the log-normal latency distribution (0 for a constant latency)
+    )
+    error_rate: float = 0
+    error_status: int = 503
+    seed: int | None = 0
+    _rng: random.Random = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self._rng = random.Random(self.seed)
+
+    def delay(self) -> float:
+        if not self.sigma:
+            return self.latency
+        return self.latency * math.exp(self._rng.gauss(0, self.sigma))
+
+    def error(self) -> int | None:
+        return self.error_status if self._rng.random() < self.error_rate else None
+
+
+class FakeServer:
+    """HTTP server answering each request from its own thread, after the latency of `faults`."""
+
+    def __init__(
+        self, faults: Faults | None = None, host: str = "127.0.0.1", port: int = 0
+    ) -> None:
+        self.faults = faults or Faults()
+        self.lock = threading.Lock()
+        self.statuses: collections.Counter[int] = collections.Counter()
+        self.latencies: list[float] = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                server._handle(self)
+
+            def do_PUT(self) -> None:
+                server._handle(self)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> Self:
+        self.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.stop()
+
+    def respond(
+        self, method: str, path: str, headers: dict[str, str], data: Any
+    ) -> tuple[int, Any]:
+        """Status and JSON body of the response to a request."""
+        raise NotImplementedError
+
+    def _handle(self, request: BaseHTTPRequestHandler) -> None:
+        start = time.perf_counter()
+        length = int(request.headers.get("content-length") or 0)
+        data = json.loads(request.rfile.read(length)) if length else None
+        time.sleep(self.faults.delay())
+        status = self.faults.error()
+        if status is None:
+            headers = {k.lower(): v for k, v in request.headers.items()}
+            status, body = self.respond(request.command, request.path, headers, data)
+        else:
+            body = {"detail": "Injected error"}
+        content = json.dumps(body).encode()
+        request.send_response(status)
+        request.send_header("content-type", "application/json")
+        request.send_header("content-length", str(len(content)))
+        request.end_headers()
+        request.wfile.write(content)
+        with self.lock:
+            self.statuses[status] += 1
+            self.latencies.append(time.perf_counter() - start)
+
+
+class FakeUserfacingAPI(FakeServer):
+    """`PUT /_job_status` of the user-facing API, recording the job status updates."""
+
+    def __init__(
+        self,
+        api_key: str | None = None,
+        faults: Faults | None = None,
+        deleted: set[int] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(faults, **kwargs)
+        self.api_key = api_key
+        self.deleted = deleted or set()  # ids of the jobs deleted by their users
+        self.updates: list[tuple[int, str, float]] = []  # job id, status, Unix time
+
+    def respond(
+        self, method: str, path: str, headers: dict[str, str], data: Any
+    ) -> tuple[int, Any]:
+        if (method, path) != ("PUT", "/_job_status"):
+            return 404, {"detail": "Not Found"}
+        if self.api_key is not None and headers.get("x-api-key") != self.api_key:
+            return 401, {"detail": "unauthorized"}
+        if data["job_id"] in self.deleted:
+            return 404, {"detail": "Job not found"}
+        with self.lock:
+            self.updates.append((data["job_id"], data["status"], time.time()))
+        return 200, None
+
+
+class FakeCognito(FakeServer):
+    """JWKS of a Cognito user pool, with the signing key to issue worker (ID) tokens."""
+
+    def __init__(
+        self,
+        region: str = "eu-central-1",
+        user_pool_id: str = "eu-central-1_perf",
+        client_id: str = "perf_client",
+        faults: Faults | None = None,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(faults, **kwargs)
+        self.region = region
+        self.user_pool_id = user_pool_id
+        self.client_id = client_id
+        self.issuer = f"https://cognito-idp.{region}.amazonaws.com/{user_pool_id}"
+        self.kid = secrets.token_hex(8)
+        self._private_key = (
+            rsa.generate_private_key(public_exponent=65537, key_size=2048)
+            .private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.PKCS8,
+                serialization.NoEncryption(),
+            )
+            .decode()
+        )
+
+    @property
+    def jwks_url(self) -> str:
+        return f"{self.url}/{self.user_pool_id}/.well-known/jwks.json"
+
+    def jwks(self) -> dict[str, Any]:
+        public_key = jwk.construct(self._private_key, "RS256").public_key()
+        return {"keys": [{**public_key.to_dict(), "kid": self.kid, "use": "sig"}]}
+
+    def token(
+        self,
+        username: str,
+        groups: list[str] | None = None,
+        expires_in: int = 24 * 60 * 60,
+    ) -> str:
+        """Signed ID token of a user, by default of the "workers" group."""
+        now = int(time.time())
+        claims = {
+            "sub": secrets.token_hex(16),
+            "cognito:username": username,
+            "cognito:groups": ["workers"] if groups is None else groups,
+            "email": f"{username}@example.com",
+            "aud": self.client_id,
+            "iss": self.issuer,
+            "token_use": "id",
+            "auth_time": now,
+            "iat": now,
+            "exp": now + expires_in,
+        }
+        token: str = jwt.encode(
+            claims, self._private_key, algorithm="RS256", headers={"kid": self.kid}
+        )
+        return token
+
+    def current_user(self) -> StandInAuthDependency:
+        """The worker authentication of the API, verifying the tokens with these keys."""
+        return StandInAuthDependency(
+            region=self.region,
+            user_pool_id=self.user_pool_id,
+            client_id=self.client_id,
+            jwks_url=self.jwks_url,
+        )
+
+    def respond(
+        self, method: str, path: str, headers: dict[str, str], data: Any
+    ) -> tuple[int, Any]:
+        if (method, path) != ("GET", f"/{self.user_pool_id}/.well-known/jwks.json"):
+            return 404, {"detail": "Not Found"}
+        return 200, self.jwks()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--api-key", default="super-secret-value")
+    parser.add_argument("--latency", type=float, default=0, help="seconds (median)")
+    parser.add_argument("--sigma", type=float, default=0, help="log-normal spread")
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--cognito-latency", type=float, default=0, help="seconds")
+    parser.add_argument("--workers", type=int, default=1, help="tokens to issue")
+    args = parser.parse_args()
+    faults = Faults(args.latency, args.sigma, args.error_rate, seed=None)
+    with (
+        FakeUserfacingAPI(args.api_key, faults) as userfacing,
+        FakeCognito(faults=Faults(args.cognito_latency)) as cognito,
+    ):
+        print(f"USERFACING_API_URL={userfacing.url}")
+        print(f"INTERNAL_API_KEY_SECRET={args.api_key}")
+        print(f"COGNITO_REGION={cognito.region}")
+        print(f"COGNITO_USER_POOL_ID={cognito.user_pool_id}")
+        print(f"COGNITO_CLIENT_ID={cognito.client_id}")
+        print(f"PERF_COGNITO_JWKS_URL={cognito.jwks_url}")
+        for i in range(args.workers):
+            print(f"worker_{i}: {cognito.token(f'worker_{i}')}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
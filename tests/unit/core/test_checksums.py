@@ -0,0 +1,60 @@
+import hashlib
+import os
+from typing import Any
+
+import pytest
+
+from workerfacing_api.core.checksums import ChecksumIndex
+
+
+@pytest.fixture
+def data_file(tmp_path: Any) -> str:
+    path = str(tmp_path / "data_file.txt")
+    with open(path, "w") as f:
+        f.write("data file contents")
+    return path
+
+
+def test_get(data_file: str) -> None:
+    index = ChecksumIndex()
+    expected = hashlib.sha256(b"data file contents").hexdigest()
+    assert index.get(data_file) == expected
+    assert len(index) == 1
+
+
+def test_get_cached(data_file: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    index = ChecksumIndex()
+    checksum = index.get(data_file)
+
+    def fail(*args: Any, **kwargs: Any) -> None:
+        raise AssertionError("file should not be re-hashed")
+
+    monkeypatch.setattr(hashlib, "sha256", fail)
+    assert index.get(data_file) == checksum
+
+
+def test_get_modified(data_file: str) -> None:
+    index = ChecksumIndex()
+    checksum = index.get(data_file)
+    with open(data_file, "w") as f:
+        f.write("modified data file contents")
+    assert index.get(data_file) != checksum
+    assert (
+        index.get(data_file)
+        == hashlib.sha256(b"modified data file contents").hexdigest()
+    )
+    assert len(index) == 1
+
+
+def test_get_persisted(data_file: str, tmp_path: Any) -> None:
+    db_path = str(tmp_path / "checksums.db")
+    checksum = ChecksumIndex(db_path).get(data_file)
+    assert os.path.exists(db_path)
+    index = ChecksumIndex(db_path)
+    assert len(index) == 1
+    assert index.get(data_file) == checksum
+
+
+def test_get_not_exists(data_file: str) -> None:
+    with pytest.raises(FileNotFoundError):
+        ChecksumIndex().get(data_file + "_wrong")
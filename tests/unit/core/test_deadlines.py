@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import time
+
+from workerfacing_api.core.deadlines import DeadlineHeap
+
+
+def test_pop_expired() -> None:
+    deadlines = DeadlineHeap()
+    deadlines.set(1, 30)
+    deadlines.set(2, 10)
+    deadlines.set(3, 20)
+    assert deadlines.next_deadline() == 10
+    assert deadlines.pop_expired(now=20) == [2, 3]
+    assert deadlines.pop_expired(now=20) == []
+    assert len(deadlines) == 1
+
+
+def test_renew_discard() -> None:
+    deadlines = DeadlineHeap()
+    deadlines.set(1, 10)
+    deadlines.set(2, 20)
+    deadlines.set(1, 40)  # renewed
+    deadlines.discard(2)  # released
+    assert deadlines.next_deadline() == 40
+    assert deadlines.pop_expired(now=30) == []
+    assert deadlines.pop_expired(now=40) == [1]
+    assert deadlines.next_deadline() is None
+
+
+def test_compaction() -> None:
+    deadlines = DeadlineHeap()
+    for i in range(1000):
+        deadlines.set(1, i)
+    assert len(deadlines.heap) < 100
+    assert deadlines.pop_expired(now=1000) == [1]
+
+
+def test_reset() -> None:
+    deadlines = DeadlineHeap()
+    deadlines.set(1, 10)
+    deadlines.reset({2: 20, 3: 5})
+    assert deadlines.pop_expired(now=100) == [3, 2]
+
+
+def test_wait_expired() -> None:
+    deadlines = DeadlineHeap()
+    deadlines.set(1, time.time() + 0.2)
+
+    async def wait() -> tuple[list[int], float]:
+        start = time.time()
+        return await deadlines.wait_expired(), time.time() - start
+
+    expired, waited = asyncio.run(wait())
+    assert expired == [1]
+    assert 0.1 < waited < 1
+
+
+def test_wait_expired_earlier_deadline() -> None:
+    deadlines = DeadlineHeap()
+    deadlines.set(1, time.time() + 60)
+    # set from another thread while waiting
+    timer = threading.Timer(0.1, lambda: deadlines.set(2, time.time() + 0.1))
+    timer.start()
+
+    async def wait() -> tuple[list[int], float]:
+        start = time.time()
+        return await deadlines.wait_expired(), time.time() - start
+
+    expired, waited = asyncio.run(wait())
+    timer.join()
+    assert expired == [2]
+    assert waited < 1
+
+
+def test_wait_expired_max_wait() -> None:
+    deadlines = DeadlineHeap()
+    assert asyncio.run(deadlines.wait_expired(max_wait=0.1)) == []
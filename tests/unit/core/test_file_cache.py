@@ -0,0 +1,80 @@
+import mmap
+import os
+from typing import Any, Callable
+
+import pytest
+
+from workerfacing_api.core.file_cache import FileCache
+
+
+@pytest.fixture
+def data_file(tmp_path: Any) -> Callable[[str, bytes], str]:
+    def _data_file(name: str, content: bytes) -> str:
+        path = str(tmp_path / name)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    return _data_file
+
+
+def test_get(data_file: Callable[[str, bytes], str]) -> None:
+    cache = FileCache(max_size=100, max_file_size=100)
+    path = data_file("file.txt", b"contents")
+    assert cache.get(path) == b"contents"
+    assert cache.get(path) == b"contents"
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.n_files, stats.size) == (1, 1, 1, 8)
+    assert stats.hit_rate == 0.5
+
+
+def test_get_lru_eviction(data_file: Callable[[str, bytes], str]) -> None:
+    cache = FileCache(max_size=20, max_file_size=20)
+    path1 = data_file("file1.txt", b"0" * 8)
+    path2 = data_file("file2.txt", b"1" * 8)
+    path3 = data_file("file3.txt", b"2" * 8)
+    cache.get(path1)
+    cache.get(path2)
+    cache.get(path1)  # path2 is now least recently used
+    cache.get(path3)
+    stats = cache.stats()
+    assert (stats.evictions, stats.n_files, stats.size) == (1, 2, 16)
+    cache.get(path1)
+    assert cache.stats().hits == 2
+    cache.get(path2)
+    assert cache.stats().misses == 4
+
+
+def test_get_invalidated(data_file: Callable[[str, bytes], str]) -> None:
+    cache = FileCache(max_size=100, max_file_size=100)
+    path = data_file("file.txt", b"contents")
+    cache.get(path)
+    stat = os.stat(path)
+    data_file("file.txt", b"new contents")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert cache.get(path) == b"new contents"
+    stats = cache.stats()
+    assert (stats.invalidations, stats.n_files, stats.size) == (1, 1, 12)
+
+
+def test_get_bypassed(data_file: Callable[[str, bytes], str]) -> None:
+    cache = FileCache(max_size=100, max_file_size=4)
+    path = data_file("file.txt", b"contents")
+    assert cache.get(path) is None
+    stats = cache.stats()
+    assert (stats.bypassed, stats.n_files, stats.hit_rate) == (1, 0, 0.0)
+
+
+def test_get_mmap(data_file: Callable[[str, bytes], str]) -> None:
+    cache = FileCache(max_size=100, max_file_size=100, use_mmap=True)
+    content = cache.get(data_file("file.txt", b"contents"))
+    assert isinstance(content, mmap.mmap)
+    assert content[:] == b"contents"
+    assert cache.get(data_file("empty.txt", b"")) == b""
+
+
+def test_clear(data_file: Callable[[str, bytes], str]) -> None:
+    cache = FileCache(max_size=100, max_file_size=100)
+    cache.get(data_file("file.txt", b"contents"))
+    cache.clear()
+    assert (cache.stats().n_files, cache.stats().size) == (0, 0)
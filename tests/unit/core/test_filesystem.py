@@ -1,32 +1,80 @@
+import asyncio
+import hashlib
 import io
 import os
 import shutil
+import tarfile
+import time
 from abc import ABC, abstractmethod
 from contextlib import nullcontext
 from io import BytesIO
+from pathlib import Path
 from types import SimpleNamespace
 from typing import Any, Generator, cast
 
 import pytest
 import requests
+import zstandard
 from fastapi import UploadFile
 from moto import mock_aws
 from starlette.requests import Request
-from starlette.responses import FileResponse
+from starlette.responses import FileResponse, StreamingResponse
 
 from tests.conftest import S3TestingBucket
+from workerfacing_api.core.file_cache import FileCache
 from workerfacing_api.core.filesystem import (
+    CachedFileResponse,
     FileSystem,
     LocalFilesystem,
     S3Filesystem,
 )
-from workerfacing_api.schemas.files import FileHTTPRequest
+from workerfacing_api.schemas.files import (
+    ArchiveCompression,
+    FileHTTPRequest,
+    MultipartUploadPart,
+)
 
 
 def _mock_request(url: str) -> Request:
     return cast(Request, SimpleNamespace(url=SimpleNamespace(_url=url), headers={}))
 
 
+def _tar_archive(files: dict[str, bytes], links: dict[str, str] | None = None) -> bytes:
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode="w:gz") as tar:
+        for name, content in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+        for name, target in (links or {}).items():
+            info = tarfile.TarInfo(name)
+            info.type = tarfile.SYMTYPE
+            info.linkname = target
+            tar.addfile(info)
+    return archive.getvalue()
+
+
+def _read_streaming_response(response: StreamingResponse) -> bytes:
+    async def read() -> bytes:
+        return b"".join([cast(bytes, chunk) async for chunk in response.body_iterator])
+
+    return asyncio.run(read())
+
+
+def _send_response(response: FileResponse, method: str = "GET") -> bytes:
+    messages: list[dict[str, Any]] = []
+
+    async def receive() -> dict[str, Any]:
+        return {"type": "http.request"}
+
+    async def send(message: dict[str, Any]) -> None:
+        messages.append(message)
+
+    scope = {"type": "http", "method": method, "headers": []}
+    asyncio.run(response(scope, receive, send))  # type: ignore
+    return b"".join(m["body"] for m in messages if m["type"] == "http.response.body")
+
+
 @pytest.fixture(scope="class")
 def base_dir() -> str:
     return "fs_test_dir"
@@ -109,6 +157,7 @@ class _TestFilesystem(ABC):
         assert resp_url == FileHTTPRequest(
             method="get",
             url=f"http://example.com/files/{data_file1_path}",
+            etag=f'"{hashlib.sha256(data_file1_contents.encode()).hexdigest()}"',
         )
 
     def test_get_file_url_not_exists(
@@ -136,6 +185,22 @@ class _TestFilesystem(ABC):
                 "files",
             )
 
+    def test_get_size(
+        self,
+        base_filesystem: FileSystem,
+        data_file1_path: str,
+        data_file1_contents: str,
+    ) -> None:
+        size = len(data_file1_contents.encode())
+        assert base_filesystem.get_size(data_file1_path) == size
+        assert base_filesystem.get_size(os.path.dirname(data_file1_path)) >= size
+
+    def test_get_size_not_exists(
+        self, base_filesystem: FileSystem, data_file1_path: str
+    ) -> None:
+        with pytest.raises(FileNotFoundError):
+            base_filesystem.get_size(data_file1_path + "_wrong")
+
     def test_post_file(
         self,
         base_filesystem: FileSystem,
@@ -168,6 +233,94 @@ class _TestFilesystem(ABC):
                 path=os.path.dirname(data_filepost_path).replace(base_dir, "wrong_dir"),
             )
 
+    def test_post_file_traversal_not_permitted(
+        self,
+        base_filesystem: FileSystem,
+        data_filepost_path: str,
+        data_file1_contents: str,
+    ) -> None:
+        with pytest.raises(PermissionError):
+            base_filesystem.post_file(
+                file=UploadFile(
+                    io.BytesIO(data_file1_contents.encode("utf-8")),
+                    filename="../" + os.path.split(data_filepost_path)[-1],
+                ),
+                path=os.path.dirname(data_filepost_path),
+            )
+
+    def test_post_archive(
+        self,
+        base_filesystem: FileSystem,
+        data_filepost_path: str,
+        data_file1_contents: str,
+    ) -> None:
+        archive_path = os.path.dirname(data_filepost_path) + "/archive"
+        n_files = base_filesystem.post_archive(
+            file=UploadFile(
+                io.BytesIO(
+                    _tar_archive(
+                        {"a.txt": b"a", "sub/b.txt": data_file1_contents.encode()},
+                        links={"link": "/etc/passwd"},
+                    )
+                )
+            ),
+            path=archive_path,
+        )
+        assert n_files == 2
+        assert isinstance(
+            base_filesystem.get_file(archive_path + "/sub/b.txt"), FileResponse
+        )
+        with pytest.raises(FileNotFoundError):
+            base_filesystem.get_file(archive_path + "/link")
+
+    def test_post_archive_traversal_not_permitted(
+        self, base_filesystem: FileSystem, data_filepost_path: str
+    ) -> None:
+        with pytest.raises(PermissionError):
+            base_filesystem.post_archive(
+                file=UploadFile(io.BytesIO(_tar_archive({"../../evil.txt": b"a"}))),
+                path=os.path.dirname(data_filepost_path) + "/archive",
+            )
+
+    def test_post_archive_current_directory(
+        self, base_filesystem: FileSystem, data_filepost_path: str, tmp_path: Path
+    ) -> None:
+        (tmp_path / "sub").mkdir()
+        (tmp_path / "sub" / "a.txt").write_bytes(b"a")
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode="w") as tar:
+            tar.add(tmp_path, arcname=".")  # as `tar -C dir -cf - .`
+        archive_path = os.path.dirname(data_filepost_path) + "/archive"
+        n_files = base_filesystem.post_archive(
+            file=UploadFile(io.BytesIO(archive.getvalue())), path=archive_path
+        )
+        assert n_files == 1
+        assert isinstance(
+            base_filesystem.get_file(archive_path + "/sub/a.txt"), FileResponse
+        )
+
+    def test_post_archive_not_partially_extracted(
+        self, base_filesystem: FileSystem, data_filepost_path: str
+    ) -> None:
+        archive_path = os.path.dirname(data_filepost_path) + "/rejected_archive"
+        with pytest.raises(PermissionError):
+            base_filesystem.post_archive(
+                file=UploadFile(
+                    io.BytesIO(_tar_archive({"a.txt": b"a", "../../evil.txt": b"a"}))
+                ),
+                path=archive_path,
+            )
+        assert not os.path.exists(archive_path)
+
+    def test_post_archive_invalid(
+        self, base_filesystem: FileSystem, data_filepost_path: str
+    ) -> None:
+        with pytest.raises(ValueError):
+            base_filesystem.post_archive(
+                file=UploadFile(io.BytesIO(b"not an archive")),
+                path=os.path.dirname(data_filepost_path) + "/archive",
+            )
+
     def test_post_file_url(
         self,
         base_filesystem: FileSystem,
@@ -199,6 +352,20 @@ class _TestFilesystem(ABC):
                 "files",
             )
 
+    def test_multipart_upload(
+        self,
+        base_filesystem: FileSystem,
+        data_filepost_path: str,
+        data_file1_contents: str,
+    ) -> None:
+        with pytest.raises(PermissionError):
+            base_filesystem.create_multipart_upload(data_filepost_path, 2)
+
+    def test_abort_stale_multipart_uploads(
+        self, base_filesystem: FileSystem, data_filepost_path: str
+    ) -> None:
+        assert base_filesystem.abort_stale_multipart_uploads(older_than=0) == 0
+
 
 class TestLocalFilesystem(_TestFilesystem):
     @pytest.fixture(scope="class")
@@ -220,6 +387,149 @@ class TestLocalFilesystem(_TestFilesystem):
         with open(data_file1_name, "w") as f:
             f.write(data_file1_contents)
 
+    @pytest.fixture(scope="class")
+    def archive_dir(self, base_dir: str, data_file1_contents: str) -> str:
+        archive_dir = f"{base_dir}/data/archive"
+        for name in ["frame0.tif", "frame1.tif", "sub/frame2.tif", "notes.txt"]:
+            os.makedirs(os.path.dirname(f"{archive_dir}/{name}"), exist_ok=True)
+            with open(f"{archive_dir}/{name}", "w") as f:
+                f.write(data_file1_contents + name)
+        # long names require extended (pax) headers
+        long_name = f"{archive_dir}/sub/{'x' * 150}.tif"
+        with open(long_name, "w") as f:
+            f.write(data_file1_contents)
+        return archive_dir
+
+    def test_get_file_etag(self, base_dir: str) -> None:
+        base_filesystem = LocalFilesystem(base_dir, base_dir)
+        path = f"{base_dir}/data/etag/model.pt"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"weights")
+        etag = base_filesystem.get_file(path).headers["etag"]
+        assert etag == f'"{hashlib.sha256(b"weights").hexdigest()}"'
+        assert len(base_filesystem.checksum_index) == 1
+        with open(path, "wb") as f:
+            f.write(b"new weights")
+        assert base_filesystem.get_file(path).headers["etag"] != etag
+
+    @pytest.mark.parametrize("use_mmap", [False, True])
+    def test_get_file_cached(
+        self, base_dir: str, data_file1_path: str, use_mmap: bool
+    ) -> None:
+        file_cache = FileCache(max_size=1024, max_file_size=1024, use_mmap=use_mmap)
+        base_filesystem = LocalFilesystem(base_dir, base_dir, file_cache=file_cache)
+        file_resp = base_filesystem.get_file(data_file1_path)
+        assert isinstance(file_resp, CachedFileResponse)
+        uncached_resp = LocalFilesystem(base_dir, base_dir).get_file(data_file1_path)
+        assert _send_response(file_resp) == _send_response(uncached_resp)
+        assert _send_response(file_resp, "HEAD") == b""
+        assert file_resp.headers["etag"] == uncached_resp.headers["etag"]
+        base_filesystem.get_file(data_file1_path)
+        assert file_cache.stats().hits == 1
+
+    def test_get_file_mmap_truncated(self, base_dir: str) -> None:
+        file_cache = FileCache(max_size=2**20, max_file_size=2**20, use_mmap=True)
+        base_filesystem = LocalFilesystem(base_dir, base_dir, file_cache=file_cache)
+        path = f"{base_dir}/data/mmap/model.pt"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"x" * 3 * CachedFileResponse.chunk_size)
+        file_resp = base_filesystem.get_file(path)
+        assert isinstance(file_resp, CachedFileResponse)
+        bodies: list[bytes] = []
+
+        async def receive() -> dict[str, Any]:
+            return {"type": "http.request"}
+
+        async def send(message: dict[str, Any]) -> None:
+            if message["type"] == "http.response.body":
+                bodies.append(message["body"])
+                with open(path, "wb"):  # truncated in place while being sent
+                    pass
+
+        scope = {"type": "http", "method": "GET", "headers": []}
+        # reading the truncated pages would kill the test process
+        asyncio.run(file_resp(scope, receive, send))  # type: ignore
+        assert bodies == [b"x" * CachedFileResponse.chunk_size, b""]
+
+    def test_get_file_cache_bypassed(self, base_dir: str, data_file1_path: str) -> None:
+        file_cache = FileCache(max_size=1024, max_file_size=1)
+        base_filesystem = LocalFilesystem(base_dir, base_dir, file_cache=file_cache)
+        file_resp = base_filesystem.get_file(data_file1_path)
+        assert not isinstance(file_resp, CachedFileResponse)
+        assert file_cache.stats().bypassed == 1
+
+    def test_get_archive(self, archive_dir: str, data_file1_contents: str) -> None:
+        base_filesystem = LocalFilesystem(archive_dir, archive_dir)
+        archive_resp = base_filesystem.get_archive(archive_dir + "/sub")
+        content = _read_streaming_response(archive_resp)
+        assert len(content) == int(archive_resp.headers["content-length"])
+        with tarfile.open(fileobj=io.BytesIO(content)) as tar:
+            assert tar.getnames() == ["frame2.tif", f"{'x' * 150}.tif"]
+            file = tar.extractfile("frame2.tif")
+            assert file is not None
+            assert file.read().decode("utf-8") == data_file1_contents + "sub/frame2.tif"
+
+    def test_get_archive_filtered(self, base_dir: str, archive_dir: str) -> None:
+        base_filesystem = LocalFilesystem(base_dir, base_dir)
+        archive_resp = base_filesystem.get_archive(
+            archive_dir, include=["*.tif"], exclude=["sub/x*"]
+        )
+        with tarfile.open(
+            fileobj=io.BytesIO(_read_streaming_response(archive_resp))
+        ) as tar:
+            assert tar.getnames() == ["frame0.tif", "frame1.tif", "sub/frame2.tif"]
+
+    def test_get_archive_special_files(self, base_dir: str) -> None:
+        base_filesystem = LocalFilesystem(base_dir, base_dir)
+        path = f"{base_dir}/data/archive_special"
+        os.makedirs(f"{path}/sub", exist_ok=True)
+        with open(f"{path}/sub/a.txt", "w") as f:
+            f.write("a")
+        os.mkfifo(f"{path}/fifo")
+        os.symlink(f"{path}/sub/a.txt", f"{path}/link")
+        # with a writer, reading the FIFO would not block (and the test not hang)
+        reader = os.open(f"{path}/fifo", os.O_RDONLY | os.O_NONBLOCK)
+        writer = os.open(f"{path}/fifo", os.O_WRONLY | os.O_NONBLOCK)
+        try:
+            archive_resp = base_filesystem.get_archive(path)
+            with tarfile.open(
+                fileobj=io.BytesIO(_read_streaming_response(archive_resp))
+            ) as tar:
+                assert tar.getnames() == ["sub/a.txt"]
+        finally:
+            os.close(writer)
+            os.close(reader)
+
+    def test_get_archive_zstd(self, base_dir: str, archive_dir: str) -> None:
+        base_filesystem = LocalFilesystem(base_dir, base_dir)
+        uncompressed = _read_streaming_response(
+            base_filesystem.get_archive(archive_dir)
+        )
+        archive_resp = base_filesystem.get_archive(
+            archive_dir, compression=ArchiveCompression.zstd
+        )
+        content = _read_streaming_response(archive_resp)
+        assert "content-length" not in archive_resp.headers
+        assert int(archive_resp.headers["x-uncompressed-content-length"]) == len(
+            uncompressed
+        )
+        with zstandard.ZstdDecompressor().stream_reader(io.BytesIO(content)) as f:
+            assert f.read() == uncompressed
+
+    def test_get_archive_not_exists(self, base_dir: str, archive_dir: str) -> None:
+        base_filesystem = LocalFilesystem(base_dir, base_dir)
+        with pytest.raises(FileNotFoundError):
+            base_filesystem.get_archive(archive_dir + "_wrong")
+        with pytest.raises(FileNotFoundError):
+            base_filesystem.get_archive(archive_dir + "/notes.txt")
+
+    def test_get_archive_not_permitted(self, base_dir: str, archive_dir: str) -> None:
+        base_filesystem = LocalFilesystem(base_dir, base_dir)
+        with pytest.raises(PermissionError):
+            base_filesystem.get_archive(archive_dir.replace(base_dir, "wrong_dir"))
+
 
 class TestS3Filesystem(_TestFilesystem):
     bucket_name = "decode-cloud-filesystem-tests"
@@ -281,6 +591,13 @@ class TestS3Filesystem(_TestFilesystem):
         with pytest.raises(PermissionError):
             base_filesystem.get_file(data_file1_path + "_wrong")
 
+    def test_get_archive(
+        self, base_filesystem: FileSystem, data_file1_path: str
+    ) -> None:
+        # direct get_archive not allowed for S3
+        with pytest.raises(PermissionError):
+            base_filesystem.get_archive(os.path.dirname(data_file1_path))
+
     def test_get_file_url(
         self,
         base_filesystem: FileSystem,
@@ -293,8 +610,9 @@ class TestS3Filesystem(_TestFilesystem):
             "test_url",
             "files",
         )
-        resp = requests.request(**resp_url.model_dump())
+        resp = requests.request(**resp_url.model_dump(exclude={"etag"}))
         assert resp.content.decode("utf-8") == data_file1_contents
+        assert resp_url.etag == resp.headers["etag"]
 
     def test_post_file(
         self,
@@ -309,6 +627,31 @@ class TestS3Filesystem(_TestFilesystem):
                 data_file1_contents,
             )
 
+    def test_post_archive(
+        self,
+        base_filesystem: FileSystem,
+        data_filepost_path: str,
+        data_file1_contents: str,
+    ) -> None:
+        with pytest.raises(PermissionError):
+            super().test_post_archive(
+                base_filesystem, data_filepost_path, data_file1_contents
+            )
+
+    def test_post_archive_current_directory(
+        self, base_filesystem: FileSystem, data_filepost_path: str, tmp_path: Path
+    ) -> None:
+        with pytest.raises(PermissionError):
+            super().test_post_archive_current_directory(
+                base_filesystem, data_filepost_path, tmp_path
+            )
+
+    def test_post_archive_invalid(
+        self, base_filesystem: FileSystem, data_filepost_path: str
+    ) -> None:
+        with pytest.raises(PermissionError):
+            super().test_post_archive_invalid(base_filesystem, data_filepost_path)
+
     def test_post_file_url(
         self,
         base_filesystem: FileSystem,
@@ -322,7 +665,7 @@ class TestS3Filesystem(_TestFilesystem):
             "files",
         )
         file_post_resp = requests.request(
-            **resp.model_dump(),
+            **resp.model_dump(exclude_none=True),
             files={
                 "file": (
                     os.path.split(data_filepost_path)[-1],
@@ -338,6 +681,79 @@ class TestS3Filesystem(_TestFilesystem):
             "files",
         )
         assert (
-            requests.request(**resp.model_dump()).content.decode("utf-8")
+            requests.request(**resp.model_dump(exclude={"etag"})).content.decode(
+                "utf-8"
+            )
             == data_file1_contents
         )
+
+    def test_multipart_upload(
+        self,
+        base_filesystem: FileSystem,
+        data_filepost_path: str,
+        data_file1_contents: str,
+    ) -> None:
+        path = data_filepost_path + "_multipart"
+        upload = base_filesystem.create_multipart_upload(path, 2)
+        assert len(upload.parts) == 2
+        # all parts but the last must be at least 5 MB
+        contents = [b"0" * 5 * 1024**2, data_file1_contents.encode("utf-8")]
+        parts = []
+        for i, (part_request, content) in enumerate(zip(upload.parts, contents)):
+            part_resp = requests.request(
+                method=part_request.method, url=part_request.url, data=content
+            )
+            part_resp.raise_for_status()
+            parts.append(
+                MultipartUploadPart(part_number=i + 1, etag=part_resp.headers["ETag"])
+            )
+        base_filesystem.complete_multipart_upload(path, upload.upload_id, parts)
+        resp = base_filesystem.get_file_url(
+            path,
+            _mock_request(f"http://example.com/test_url/{path}"),
+            "test_url",
+            "files",
+        )
+        assert requests.request(
+            **resp.model_dump(exclude={"etag"})
+        ).content == b"".join(contents)
+
+    def test_multipart_upload_abort(
+        self, base_filesystem: FileSystem, data_filepost_path: str
+    ) -> None:
+        path = data_filepost_path + "_multipart_abort"
+        upload = base_filesystem.create_multipart_upload(path, 1)
+        base_filesystem.abort_multipart_upload(path, upload.upload_id)
+        assert upload.upload_id not in self._multipart_upload_ids(
+            cast(S3Filesystem, base_filesystem)
+        )
+
+    def test_multipart_upload_not_permitted(
+        self, base_filesystem: FileSystem, data_filepost_path: str
+    ) -> None:
+        with pytest.raises(PermissionError):
+            base_filesystem.create_multipart_upload(
+                data_filepost_path.replace("s3://", ""), 1
+            )
+        with pytest.raises(PermissionError):
+            base_filesystem.create_multipart_upload(
+                os.path.dirname(data_filepost_path) + "/", 1
+            )
+
+    def test_abort_stale_multipart_uploads(
+        self, base_filesystem: FileSystem, data_filepost_path: str
+    ) -> None:
+        path = data_filepost_path + "_multipart_stale"
+        upload = base_filesystem.create_multipart_upload(path, 1)
+        time.sleep(1)
+        assert base_filesystem.abort_stale_multipart_uploads(older_than=0) >= 1
+        assert upload.upload_id not in self._multipart_upload_ids(
+            cast(S3Filesystem, base_filesystem)
+        )
+
+    @staticmethod
+    def _multipart_upload_ids(base_filesystem: S3Filesystem) -> list[str]:
+        uploads = base_filesystem.s3_client.list_multipart_uploads(
+            Bucket=base_filesystem.bucket
+        ).get("Uploads", [])
+        return [upload["UploadId"] for upload in uploads]
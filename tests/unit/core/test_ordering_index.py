@@ -0,0 +1,28 @@
+import re
+from typing import Any
+
+import pytest
+from sqlalchemy import create_mock_engine
+
+from workerfacing_api.core.scheduling import OrderingPolicy
+from workerfacing_api.schemas.rds_models import QueuedJob
+
+
+@pytest.mark.parametrize("url", ["postgresql://", "sqlite://"])
+def test_best_fit_index_matches_order(url: str) -> None:
+    """The claims filter on the status and read the best-fit order from the index."""
+    statements: list[str] = []
+
+    def executor(sql: Any, *args: Any, **kwargs: Any) -> None:
+        statements.append(str(sql.compile(dialect=engine.dialect)))
+
+    engine = create_mock_engine(url, executor)
+    QueuedJob.metadata.create_all(engine)
+    (ddl,) = [s for s in statements if "INDEX ix_queued_jobs_best_fit " in s]
+    match = re.search(r"ON queued_jobs \((.*)\)$", ddl.strip())
+    assert match is not None
+    order = OrderingPolicy(best_fit=True)._priority_order()
+    order_terms = ", ".join(str(term.compile(dialect=engine.dialect)) for term in order)
+    assert match.group(1) == "status, " + order_terms.replace(
+        "queued_jobs.", ""
+    ).replace(" ASC", "")
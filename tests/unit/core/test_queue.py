@@ -9,14 +9,19 @@ from typing import Any, Generator, cast
 import boto3
 import pytest
 from moto import mock_aws
+from prometheus_client import REGISTRY
+from sqlalchemy.orm import Session
 
 from tests.conftest import RDSTestingInstance
+from workerfacing_api import settings
 from workerfacing_api.core.queue import (
     JobQueue,
     LocalJobQueue,
     RDSJobQueue,
     SQSJobQueue,
 )
+from workerfacing_api.core.scheduling import FairSharePolicy, OrderingPolicy
+from workerfacing_api.exceptions import JobNotAssignedException
 from workerfacing_api.schemas.queue_jobs import (
     AppSpecs,
     EnvironmentTypes,
@@ -26,9 +31,16 @@ from workerfacing_api.schemas.queue_jobs import (
     JobSpecs,
     MetaSpecs,
     PathsUploadSpecs,
+    PulledJobSpecs,
     SubmittedJob,
 )
-from workerfacing_api.schemas.rds_models import JobStates
+from workerfacing_api.schemas.rds_models import (
+    GroupUsage,
+    JobInput,
+    JobStates,
+    QueuedJob,
+)
+from workerfacing_api.schemas.workers import WorkerInfo
 
 
 def get_job(
@@ -37,12 +49,13 @@ def get_job(
     hw_specs: HardwareSpecs | None = None,
     group: str | None = None,
     priority: int = 5,
+    image_url: str = "u",
 ) -> SubmittedJob:
     time_now = datetime.datetime.now(datetime.timezone.utc).isoformat()
     return SubmittedJob(
         job=JobSpecs(
             app=AppSpecs(cmd=["cmd"], env={"env": "var"}),
-            handler=HandlerSpecs(image_url="u", files_up={"output": "out"}),
+            handler=HandlerSpecs(image_url=image_url, files_up={"output": "out"}),
             hardware=hw_specs or HardwareSpecs(),
             meta=MetaSpecs(job_id=job_id, date_created=time_now),
         ),
@@ -231,6 +244,318 @@ class _TestRDSQueue(_TestJobQueue, abc.ABC):
         assert job is not None
         assert job[1].meta.job_id == 2
 
+    def _set_age(self, queue: RDSJobQueue, job_id: int, age: float) -> None:
+        with Session(queue.engine) as session:
+            job = session.query(QueuedJob).filter(QueuedJob.id == job_id).one()
+            job.creation_timestamp = datetime.datetime.now(
+                datetime.timezone.utc
+            ).replace(tzinfo=None) - datetime.timedelta(seconds=age)
+            session.commit()
+
+    def test_priority_aging(
+        self,
+        queue: RDSJobQueue,
+        job_filter: JobFilter,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        queue.enqueue(get_job(0, priority=1))
+        queue.enqueue(get_job(1, priority=5))
+        self._set_age(queue, 1, 100)  # row ids start at 1
+        self._set_age(queue, 2, 0)
+        job = queue.peek("i", filter=job_filter)
+        assert job is not None and job[1].meta.job_id == 1
+
+        # 1 + 100s / 10s > 5 + 0s / 10s
+        monkeypatch.setattr(queue, "ordering", OrderingPolicy(aging=10))
+        job = queue.peek("i", filter=job_filter)
+        assert job is not None and job[1].meta.job_id == 0
+
+        # 1 + 100s / 50s < 5 + 0s / 50s
+        monkeypatch.setattr(queue, "ordering", OrderingPolicy(aging=50))
+        job = queue.peek("i", filter=job_filter)
+        assert job is not None and job[1].meta.job_id == 1
+
+    def test_best_fit(
+        self,
+        queue: RDSJobQueue,
+        job_filter: JobFilter,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        monkeypatch.setattr(queue, "ordering", OrderingPolicy(best_fit=True))
+        queue.enqueue(get_job(0, hw_specs=HardwareSpecs(gpu_mem=4)))
+        queue.enqueue(get_job(1, hw_specs=HardwareSpecs(gpu_mem=60)))
+        queue.enqueue(get_job(2))
+        queue.enqueue(get_job(3, hw_specs=HardwareSpecs(gpu_mem=8), priority=6))
+        queue.enqueue(get_job(4, hw_specs=HardwareSpecs(gpu_mem=4, memory=10)))
+        small = job_filter.model_copy(update={"gpu_mem": 16, "memory": 100})
+        big = job_filter.model_copy(update={"gpu_mem": 80, "memory": 100})
+        # priority first, then largest fitting requirements, unspecified last
+        job_ids = []
+        while (job := queue.dequeue("big", filter=big)) is not None:
+            job_ids.append(job[1].meta.job_id)
+        assert job_ids == [3, 1, 4, 0, 2]
+
+        for i in range(2):
+            queue.enqueue(get_job(i, hw_specs=HardwareSpecs(gpu_mem=[60, 4][i])))
+        job = queue.dequeue("small", filter=small)
+        assert job is not None and job[1].meta.job_id == 1
+
+    def test_best_fit_gpu_unspecified_memory(
+        self,
+        queue: RDSJobQueue,
+        job_filter: JobFilter,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        monkeypatch.setattr(queue, "ordering", OrderingPolicy(best_fit=True))
+        queue.enqueue(get_job(0, hw_specs=HardwareSpecs(gpu_mem=0, memory=10)))
+        queue.enqueue(get_job(1, hw_specs=HardwareSpecs(gpu_model="m")))
+        queue.enqueue(get_job(2, hw_specs=HardwareSpecs(gpu_mem=8)))
+        gpu = job_filter.model_copy(
+            update={"gpu_model": "m", "gpu_mem": 16, "memory": 100}
+        )
+        # jobs requiring a GPU first, even of unspecified memory
+        job_ids = []
+        while (job := queue.dequeue("gpu", filter=gpu)) is not None:
+            job_ids.append(job[1].meta.job_id)
+        assert job_ids == [2, 1, 0]
+
+    def test_best_fit_aging(
+        self,
+        queue: RDSJobQueue,
+        job_filter: JobFilter,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        monkeypatch.setattr(queue, "ordering", OrderingPolicy(aging=10, best_fit=True))
+        queue.enqueue(get_job(0, hw_specs=HardwareSpecs(gpu_mem=4), priority=4))
+        queue.enqueue(get_job(1, hw_specs=HardwareSpecs(gpu_mem=60), priority=5))
+        queue.enqueue(get_job(2, hw_specs=HardwareSpecs(gpu_mem=8), priority=5))
+        self._set_age(queue, 1, 25)  # 4 + 25s / 10s > 5, in a higher band
+        big = job_filter.model_copy(update={"gpu_mem": 80})
+        job = queue.peek("i", filter=big)
+        assert job is not None and job[1].meta.job_id == 0
+        self._set_age(queue, 1, 5)  # 4 + 5s / 10s < 5, at most in the same band
+        job = queue.peek("i", filter=big)
+        assert job is not None and job[1].meta.job_id == 1
+
+    def test_best_fit_aging_bands(
+        self,
+        queue: RDSJobQueue,
+        job_filter: JobFilter,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        monkeypatch.setattr(queue, "ordering", OrderingPolicy(aging=10, best_fit=True))
+        queue.enqueue(get_job(0, hw_specs=HardwareSpecs(gpu_mem=4)))
+        queue.enqueue(get_job(1, hw_specs=HardwareSpecs(gpu_mem=60)))
+        # aged priorities 5 - 10^8 - 0.2 and 5 - 10^8 - 0.8: same band, would be split by rounding
+        epoch = datetime.datetime(1970, 1, 1)
+        with Session(queue.engine) as session:
+            for row_id, seconds in [(1, 10**9 + 2), (2, 10**9 + 8)]:
+                queued_job = (
+                    session.query(QueuedJob).filter(QueuedJob.id == row_id).one()
+                )
+                queued_job.creation_timestamp = epoch + datetime.timedelta(
+                    seconds=seconds
+                )
+            session.commit()
+        job = queue.peek("i", filter=job_filter.model_copy(update={"gpu_mem": 80}))
+        assert job is not None and job[1].meta.job_id == 1
+
+    def test_image_affinity(
+        self,
+        queue: RDSJobQueue,
+        job_filter: JobFilter,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        monkeypatch.setattr(settings, "image_affinity_wait", 60)
+        queue.enqueue(get_job(0, image_url="a"))
+        queue.enqueue(get_job(1, image_url="b"))
+        queue.enqueue(get_job(2, image_url="c", priority=6))
+        filter_b = job_filter.model_copy(update={"images": ["b"]})
+        # priority first, then cached images
+        job = queue.peek("i", filter=filter_b)
+        assert job is not None and job[1].meta.job_id == 2
+        queue.dequeue("i", filter=filter_b)
+        job = queue.peek("i", filter=filter_b)
+        assert job is not None and job[1].meta.job_id == 1
+        # jobs waiting for longer than the affinity wait are not passed over
+        self._set_age(queue, 1, 120)
+        job = queue.peek("i", filter=filter_b)
+        assert job is not None and job[1].meta.job_id == 0
+
+    def test_image_affinity_version(
+        self, queue: RDSJobQueue, job_filter: JobFilter
+    ) -> None:
+        job = get_job(0, image_url="a")
+        job.job.handler.image_version = "v1"
+        queue.enqueue(job)
+        queue.enqueue(get_job(1, image_url="a"))
+        job_ = queue.peek("i", filter=job_filter.model_copy(update={"images": ["a"]}))
+        assert job_ is not None and job_[1].meta.job_id == 1
+        job_ = queue.peek(
+            "i", filter=job_filter.model_copy(update={"images": ["a:v1"]})
+        )
+        assert job_ is not None and job_[1].meta.job_id == 0
+
+    def test_data_locality(
+        self,
+        queue: RDSJobQueue,
+        job_filter: JobFilter,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        monkeypatch.setattr(settings, "data_locality_wait", 60)
+        for i, files_down in enumerate(
+            [{"a": "small"}, {"a": "small", "b": "large"}, {"a": "large"}, {}]
+        ):
+            submitted_job = get_job(i)
+            submitted_job.job.handler.files_down = files_down
+            queue.enqueue(submitted_job, input_sizes={"small": 10, "large": 1000})
+        with Session(queue.engine) as session:
+            assert session.query(JobInput).count() == 4
+        # most bytes of cached inputs first
+        job = queue.peek(
+            "i", filter=job_filter.model_copy(update={"cached_files": ["large"]})
+        )
+        assert job is not None and job[1].meta.job_id == 1
+        job = queue.peek(
+            "i", filter=job_filter.model_copy(update={"cached_files": ["small"]})
+        )
+        assert job is not None and job[1].meta.job_id == 0
+        queue.dequeue("i", filter=job_filter)
+        queue.dequeue("i", filter=job_filter)
+        job = queue.peek(
+            "i", filter=job_filter.model_copy(update={"cached_files": ["large"]})
+        )
+        assert job is not None and job[1].meta.job_id == 2
+        # jobs waiting for longer than the locality wait are not passed over
+        self._set_age(queue, 4, 120)
+        job = queue.peek(
+            "i", filter=job_filter.model_copy(update={"cached_files": ["large"]})
+        )
+        assert job is not None and job[1].meta.job_id == 3
+
+    def test_fair_share(
+        self,
+        queue: RDSJobQueue,
+        job_filter: JobFilter,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        # one pulled job outweighs the priority difference
+        monkeypatch.setattr(
+            queue, "ordering", FairSharePolicy(half_life=60, usage_weight=10)
+        )
+        for i in range(3):
+            queue.enqueue(get_job(i, group="heavy", priority=10))
+        queue.enqueue(get_job(3, group="light", priority=1))
+        queue.enqueue(get_job(4, priority=1))
+
+        # no consumption yet: priority order
+        job = queue.dequeue("i", filter=job_filter)
+        assert job is not None and job[1].meta.job_id == 0
+        # "heavy" consumed one job, other groups (incl. no group) first
+        job = queue.dequeue("i", filter=job_filter)
+        assert job is not None and job[1].meta.job_id == 3
+        job = queue.dequeue("i", filter=job_filter)
+        assert job is not None and job[1].meta.job_id == 4
+        job = queue.dequeue("i", filter=job_filter)
+        assert job is not None and job[1].meta.job_id == 1
+
+        with Session(queue.engine) as session:
+            usage = {u.group: u.usage for u in session.query(GroupUsage)}
+        assert usage == {"heavy": 2, "light": 1, "": 1}
+        self._set_decayed_at(queue, 0)
+        queue.decay_usage(now=60)
+        with Session(queue.engine) as session:
+            usage = {u.group: u.usage for u in session.query(GroupUsage)}
+        assert usage == {"heavy": 1, "light": 0.5, "": 0.5}
+
+    def test_fair_share_priority(
+        self,
+        queue: RDSJobQueue,
+        job_filter: JobFilter,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        monkeypatch.setattr(queue, "ordering", FairSharePolicy(half_life=60))
+        for i in range(3):
+            queue.enqueue(get_job(i, group="heavy", priority=10))
+        queue.enqueue(get_job(3, group="light", priority=1))
+        queue.dequeue("i", filter=job_filter)
+        queue.dequeue("i", filter=job_filter)
+        # 10 - 2 pulled jobs > 1 - 0: the higher priority outweighs the consumption
+        job = queue.peek("i", filter=job_filter)
+        assert job is not None and job[1].meta.job_id == 2
+        # 10 - 5 * 2 < 1 - 0
+        monkeypatch.setattr(queue.ordering, "usage_weight", 5)
+        job = queue.peek("i", filter=job_filter)
+        assert job is not None and job[1].meta.job_id == 3
+
+    def _set_decayed_at(self, queue: RDSJobQueue, decayed_at: float) -> None:
+        with Session(queue.engine) as session:
+            session.query(GroupUsage).update({GroupUsage.decayed_at: decayed_at})
+            session.commit()
+
+    def test_fair_share_concurrent_decay(
+        self,
+        queue: RDSJobQueue,
+        job_filter: JobFilter,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        monkeypatch.setattr(queue, "ordering", FairSharePolicy(half_life=60))
+        queue.enqueue(get_job(0, group="group"))
+        queue.dequeue("i", filter=job_filter)
+        self._set_decayed_at(queue, 0)
+        # several processes decaying in the same interval decay by the elapsed time once
+        queue.decay_usage(now=30)
+        queue.decay_usage(now=60)
+        queue.decay_usage(now=60)
+        queue.decay_usage(now=45)
+        with Session(queue.engine) as session:
+            usage = session.query(GroupUsage).one()
+        assert usage.usage == pytest.approx(0.5)
+        assert usage.decayed_at == 60
+
+    def test_fair_share_own_groups_first(
+        self,
+        queue: RDSJobQueue,
+        job_filter: JobFilter,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        monkeypatch.setattr(queue, "ordering", FairSharePolicy())
+        queue.enqueue(get_job(0, group="own"))
+        queue.enqueue(get_job(1, group="other"))
+        filter_own = job_filter.model_copy(update={"groups": ["own"]})
+        job = queue.dequeue("i", filter=filter_own)
+        assert job is not None and job[1].meta.job_id == 0
+        job = queue.dequeue("i", filter=filter_own)
+        assert job is not None and job[1].meta.job_id == 1
+
+    def test_dequeue_packed(self, queue: RDSJobQueue, job_filter: JobFilter) -> None:
+        queue.enqueue(get_job(0, hw_specs=HardwareSpecs(cpu_cores=4, gpu_mem=40)))
+        queue.enqueue(get_job(1, hw_specs=HardwareSpecs(cpu_cores=4, gpu_mem=40)))
+        queue.enqueue(get_job(2, hw_specs=HardwareSpecs(cpu_cores=2, gpu_mem=20)))
+        queue.enqueue(get_job(3, hw_specs=HardwareSpecs(cpu_cores=2, memory=10)))
+        queue.enqueue(get_job(4))
+        capacity = job_filter.model_copy(
+            update={"cpu_cores": 8, "gpu_mem": 80, "memory": 100}
+        )
+        # first two jobs use all cpu cores
+        jobs = queue.dequeue_packed("i", filter=capacity, limit=10)
+        assert [job[1].meta.job_id for job in jobs] == [0, 1]
+        # job 3 does not fit in the remaining core, job 4 (unspecified cores) does
+        jobs = queue.dequeue_packed(
+            "j", filter=capacity.model_copy(update={"cpu_cores": 3}), limit=10
+        )
+        assert [job[1].meta.job_id for job in jobs] == [2, 4]
+        jobs = queue.dequeue_packed("k", filter=capacity, limit=10)
+        assert [job[1].meta.job_id for job in jobs] == [3]
+
+    def test_dequeue_packed_limit(
+        self, queue: RDSJobQueue, job_filter: JobFilter
+    ) -> None:
+        for i in range(3):
+            queue.enqueue(get_job(i))
+        capacity = job_filter.model_copy(update={"cpu_cores": 8})
+        assert len(queue.dequeue_packed("i", filter=capacity, limit=2)) == 2
+
     def test_dequeue_old_expanded(
         self, queue: RDSJobQueue, job_filter: JobFilter
     ) -> None:
@@ -255,8 +580,130 @@ class _TestRDSQueue(_TestJobQueue, abc.ABC):
         assert job is not None
         assert job[1].meta.job_id == 0
 
-    def test_failures(self, queue: RDSJobQueue, job_filter: JobFilter) -> None:
+    def test_claim_metrics(self, queue: RDSJobQueue, job_filter: JobFilter) -> None:
+        def n_claims(operation: str, outcome: str) -> float:
+            return (
+                REGISTRY.get_sample_value(
+                    "queue_claim_duration_seconds_count",
+                    {"operation": operation, "outcome": outcome},
+                )
+                or 0
+            )
+
+        before = {
+            (op, out): n_claims(op, out)
+            for op, out in [("peek", "found"), ("peek", "empty"), ("pop", "won")]
+        }
         queue.enqueue(get_job(0))
+        queue.dequeue("w", job_filter)
+        queue.dequeue("w", job_filter)
+        assert n_claims("peek", "found") == before["peek", "found"] + 1
+        assert n_claims("pop", "won") == before["pop", "won"] + 1
+        assert n_claims("peek", "empty") == before["peek", "empty"] + 1
+
+    def test_stats(self, queue: RDSJobQueue, job_filter: JobFilter) -> None:
+        assert queue.get_stats().by_status == {}
+        assert queue.get_stats().oldest_queued_age is None
+        queue.enqueue(get_job(0, group="g"))
+        queue.enqueue(get_job(1, env=EnvironmentTypes.any))
+        queue.enqueue(get_job(2, hw_specs=HardwareSpecs(gpu_mem=1)))
+        queue.dequeue("w", job_filter)
+
+        # cached
+        assert queue.get_stats(max_age=60).by_status == {}
+        stats = queue.get_stats()
+        assert set(stats.by_status) == {"queued", "pulled"}
+        queued = stats.by_status["queued"]
+        assert queued.total == 2
+        assert queued.by_environment == {"any": 1, "local": 1}
+        assert queued.by_group == {"": 2}
+        assert queued.by_hardware == {"cpu": 1, "gpu": 1}
+        assert stats.by_status["pulled"].by_group == {"g": 1}
+        assert stats.oldest_queued_age is not None
+        assert 0 <= stats.oldest_queued_age < 60
+
+    def test_worker_registry(self, queue: RDSJobQueue) -> None:
+        time_now = datetime.datetime.now(datetime.timezone.utc)
+        queue.worker_registry.seen(
+            WorkerInfo(
+                hostname="w",
+                instance_id="1",
+                environment="local",
+                slots=2,
+                hardware=HardwareSpecs(cpu_cores=2, memory=10, gpu_model="m"),
+                last_seen=time_now - datetime.timedelta(seconds=5),
+            )
+        )
+        # packing pull, reporting free capacity only
+        queue.worker_registry.seen(
+            WorkerInfo(
+                hostname="w",
+                instance_id="1",
+                hardware=HardwareSpecs(cpu_cores=1, memory=20),
+                last_seen=time_now,
+            )
+        )
+        queue.worker_registry.seen(
+            WorkerInfo(hostname="w", instance_id="2", last_seen=time_now)
+        )
+        assert queue.flush_workers() == 2
+        assert queue.flush_workers() == 0
+        # keepalive signal
+        queue.worker_registry.seen(
+            WorkerInfo(
+                hostname="w",
+                instance_id="1",
+                hardware=HardwareSpecs(cpu_cores=1),
+                last_seen=time_now + datetime.timedelta(seconds=5),
+            )
+        )
+        queue.flush_workers()
+
+        workers = queue.get_workers(active_within=60)
+        assert [worker.instance_id for worker in workers] == ["1", "2"]
+        assert workers[0].environment == "local"
+        assert workers[0].slots == 2
+        assert workers[0].hardware == HardwareSpecs(
+            cpu_cores=2, memory=20, gpu_model="m"
+        )
+        assert workers[0].last_seen.replace(tzinfo=None) == (
+            time_now + datetime.timedelta(seconds=5)
+        ).replace(tzinfo=None)
+        assert queue.get_workers(active_within=0) == [workers[0]]
+
+    def test_unschedulable_jobs(self, queue: RDSJobQueue) -> None:
+        time_now = datetime.datetime.now(datetime.timezone.utc)
+        queue.worker_registry.seen(
+            WorkerInfo(
+                hostname="w",
+                environment="local",
+                hardware=HardwareSpecs(cpu_cores=2, memory=10, gpu_mem=0),
+                last_seen=time_now,
+            )
+        )
+        queue.worker_registry.seen(
+            WorkerInfo(
+                hostname="old",
+                environment="local",
+                hardware=HardwareSpecs(cpu_cores=8, memory=100, gpu_mem=0),
+                last_seen=time_now - datetime.timedelta(hours=1),
+            )
+        )
+        queue.flush_workers()
+        queue.enqueue(get_job(0, hw_specs=HardwareSpecs(cpu_cores=2)))
+        queue.enqueue(get_job(1, hw_specs=HardwareSpecs(cpu_cores=4)))
+        queue.enqueue(get_job(2, hw_specs=HardwareSpecs(gpu_model="m")))
+        queue.enqueue(get_job(3, env=EnvironmentTypes.cloud))
+        queue.enqueue(get_job(4, env=EnvironmentTypes.any))
+        unschedulable = queue.get_unschedulable_jobs(active_within=60)
+        assert [queue.get_job(i).job["meta"]["job_id"] for i in unschedulable] == [
+            1,
+            2,
+            3,
+        ]
+
+    def test_failures(self, queue: RDSJobQueue, job_filter: JobFilter) -> None:
+        queue.enqueue(get_job(0).model_copy(update={"lease_duration": 5}))
 
         job = queue.dequeue("first", filter=job_filter)
         assert job is not None
@@ -265,7 +712,7 @@ class _TestRDSQueue(_TestJobQueue, abc.ABC):
 
         # fail -> requeue
         time.sleep(6)
-        queue.handle_timeouts(max_retries=1, timeout_failure=5)
+        queue.handle_timeouts(max_retries=1)
         assert queue.get_job(job_id).status == "queued"
 
         # same worker can not repull
@@ -286,9 +733,146 @@ class _TestRDSQueue(_TestJobQueue, abc.ABC):
 
         # fail
         time.sleep(6)
-        queue.handle_timeouts(max_retries=1, timeout_failure=5)
+        queue.handle_timeouts(max_retries=1)
         assert queue.get_job(job_id).status == "error"
 
+    def test_lease(self, queue: RDSJobQueue, job_filter: JobFilter) -> None:
+        queue.enqueue(get_job(0))
+        job = queue.dequeue("first", filter=job_filter)
+        assert job is not None
+        job_id, job_specs = job
+        lease = cast(PulledJobSpecs, job_specs).lease
+        assert lease is not None
+        queued_job = queue.get_job(job_id)
+        assert queued_job.lease_token == lease.token
+        expires_at = queued_job.lease_expires_at
+        assert expires_at >= lease.expires_at.replace(tzinfo=None)
+
+        # keepalive renews the lease
+        time.sleep(1)
+        queue.update_job_status(
+            job_id, JobStates.running, hostname="first", lease_token=lease.token
+        )
+        assert queue.get_job(job_id).lease_expires_at > expires_at
+
+        # outdated lease
+        with pytest.raises(JobNotAssignedException):
+            queue.update_job_status(
+                job_id, JobStates.running, hostname="first", lease_token="outdated"
+            )
+
+        # finishing releases the lease
+        queue.update_job_status(job_id, JobStates.finished, hostname="first")
+        queued_job = queue.get_job(job_id)
+        assert queued_job.lease_token is None
+        assert queued_job.lease_expires_at is None
+
+    def test_lease_deadlines(self, queue: RDSJobQueue, job_filter: JobFilter) -> None:
+        queue.deadlines.reset({})
+        queue.enqueue(get_job(0))
+        queue.enqueue(get_job(1))
+        ids = []
+        for _ in range(2):
+            job = queue.dequeue("first", filter=job_filter)
+            assert job is not None
+            ids.append(job[0])
+        # claimed
+        assert queue.deadlines.pop_expired(time.time()) == []
+        assert set(queue.deadlines.deadlines) == set(ids)
+        deadline = queue.deadlines.deadlines[ids[0]]
+        # renewed
+        time.sleep(1)
+        queue.update_job_status(ids[0], JobStates.running, hostname="first")
+        assert queue.deadlines.deadlines[ids[0]] > deadline
+        # released
+        queue.update_job_status(ids[1], JobStates.finished, hostname="first")
+        assert set(queue.deadlines.deadlines) == {ids[0]}
+
+        # rebuilt from the database
+        queue.deadlines.reset({})
+        queue.load_deadlines()
+        assert queue.deadlines.deadlines == {
+            ids[0]: pytest.approx(
+                queue.get_job(ids[0])
+                .lease_expires_at.replace(tzinfo=datetime.timezone.utc)
+                .timestamp()
+            )
+        }
+        # refreshed for some jobs only
+        queue.deadlines.set(ids[0], 0)
+        queue.deadlines.set(ids[1], 0)
+        queue.load_deadlines(ids)
+        assert set(queue.deadlines.deadlines) == {ids[0]}
+        assert queue.deadlines.pop_expired(time.time()) == []
+
+    def test_lease_duration(self, queue: RDSJobQueue, job_filter: JobFilter) -> None:
+        queue.enqueue(get_job(0).model_copy(update={"lease_duration": 2}))
+        queue.enqueue(get_job(1))
+        ids = []
+        for _ in range(2):
+            job = queue.dequeue("first", filter=job_filter)
+            assert job is not None
+            ids.append(job[0])
+
+        # only the expired lease is handled
+        time.sleep(3)
+        assert queue.handle_timeouts(max_retries=1) == (1, 0)
+        assert queue.get_job(ids[0]).status == "queued"
+        assert queue.get_job(ids[1]).status == "pulled"
+
+    def _expire(self, queue: RDSJobQueue, job_id: int) -> None:
+        with Session(queue.engine) as session:
+            job = session.query(QueuedJob).filter(QueuedJob.id == job_id).one()
+            job.lease_expires_at = datetime.datetime.now(datetime.timezone.utc).replace(
+                tzinfo=None
+            ) - datetime.timedelta(seconds=1)
+            session.commit()
+
+    def test_concurrent_timeouts(
+        self, queue: RDSJobQueue, job_filter: JobFilter
+    ) -> None:
+        queue.enqueue(get_job(0))
+        job = queue.dequeue("first", filter=job_filter)
+        assert job is not None
+        self._expire(queue, job[0])
+        # several processes sweeping the same expired lease at once
+        barrier = threading.Barrier(4)
+        results = []
+
+        def sweep() -> None:
+            barrier.wait()
+            results.append(queue.handle_timeouts(max_retries=1))
+
+        threads = [threading.Thread(target=sweep) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sorted(results) == [(0, 0)] * 3 + [(1, 0)]
+        queued_job = queue.get_job(job[0])
+        assert queued_job.status == "queued"
+        assert queued_job.num_retries == 1
+
+    def test_timeout_after_repull(
+        self, queue: RDSJobQueue, job_filter: JobFilter
+    ) -> None:
+        queue.enqueue(get_job(0))
+        job = queue.dequeue("first", filter=job_filter)
+        assert job is not None
+        job_id = job[0]
+        expired_token = queue.get_job(job_id).lease_token
+        self._expire(queue, job_id)
+        time_now = datetime.datetime.now(datetime.timezone.utc)
+        assert queue.handle_timeouts(max_retries=2) == (1, 0)
+        repulled = queue.dequeue("second", filter=job_filter)
+        assert repulled is not None
+        # a sweep that saw the expired lease before the re-pull leaves the new lease
+        assert queue._expire_lease(job_id, expired_token, time_now, 2) is None
+        queued_job = queue.get_job(job_id)
+        assert queued_job.status == "pulled"
+        assert queued_job.num_retries == 1
+        assert queued_job.lease_token != expired_token
+
 
 class TestRDSLocalQueue(_TestRDSQueue):
     @pytest.fixture(scope="class")
@@ -0,0 +1,163 @@
+import gzip
+import json
+import zlib
+from typing import Callable
+
+import pytest
+import zstandard
+from fastapi import Body, FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from workerfacing_api.middleware import CompressionMiddleware, negotiate_encoding
+
+payload = {"files_down": {f"file{i}": f"s3://bucket/path/file{i}" for i in range(100)}}
+
+
+@pytest.fixture(scope="module")
+def client() -> TestClient:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=100, max_body_size=100_000)
+
+    @app.get("/json")
+    async def get_json(small: bool = False) -> dict[str, dict[str, str]]:
+        return {"files_down": {}} if small else payload
+
+    @app.get("/text")
+    async def get_text() -> PlainTextResponse:
+        return PlainTextResponse("x" * 1000)
+
+    @app.get("/stream")
+    async def get_stream() -> StreamingResponse:
+        chunks = iter([json.dumps(payload).encode()])
+        return StreamingResponse(chunks, media_type="application/json")
+
+    @app.post("/echo")
+    async def echo(data: str = Body(..., embed=True)) -> dict[str, int]:
+        return {"length": len(data)}
+
+    return TestClient(app)
+
+
+@pytest.mark.parametrize(
+    "accept_encoding,expected",
+    [
+        ("", None),
+        ("gzip", "gzip"),
+        ("gzip, zstd", "zstd"),
+        ("zstd;q=0.5, gzip", "gzip"),
+        ("zstd;q=0, gzip;q=0", None),
+        ("*", "zstd"),
+        ("br", None),
+    ],
+)
+def test_negotiate_encoding(accept_encoding: str, expected: str | None) -> None:
+    assert negotiate_encoding(accept_encoding) == expected
+
+
+def test_response_gzip(client: TestClient) -> None:
+    resp = client.get("/json", headers={"accept-encoding": "gzip"})
+    assert resp.headers["content-encoding"] == "gzip"
+    assert resp.headers["vary"] == "Accept-Encoding"
+    assert int(resp.headers["content-length"]) < len(json.dumps(payload))
+    assert resp.json() == payload  # decoded by the client
+
+
+def test_response_zstd(client: TestClient) -> None:
+    resp = client.get("/json", headers={"accept-encoding": "zstd"})
+    assert resp.headers["content-encoding"] == "zstd"
+    assert resp.num_bytes_downloaded < len(json.dumps(payload))
+    assert resp.json() == payload  # decoded by the client
+
+
+def test_response_stream(client: TestClient) -> None:
+    resp = client.get("/stream", headers={"accept-encoding": "gzip"})
+    assert resp.headers["content-encoding"] == "gzip"
+    assert "content-length" not in resp.headers
+    assert resp.json() == payload
+
+
+def test_response_not_compressed(client: TestClient) -> None:
+    for path, headers in [
+        ("/json", {"accept-encoding": "identity"}),
+        ("/json?small=true", {"accept-encoding": "gzip"}),
+        ("/text", {"accept-encoding": "gzip"}),  # only JSON is compressed
+    ]:
+        resp = client.get(path, headers=headers)
+        assert resp.status_code == 200
+        assert "content-encoding" not in resp.headers
+
+
+@pytest.mark.parametrize(
+    "encoding,compress",
+    [
+        ("gzip", gzip.compress),
+        ("zstd", zstandard.ZstdCompressor().compress),
+    ],
+)
+def test_request_compressed(
+    client: TestClient, encoding: str, compress: Callable[[bytes], bytes]
+) -> None:
+    body = json.dumps({"data": "x" * 10_000}).encode()
+    resp = client.post(
+        "/echo",
+        content=compress(body),
+        headers={"content-encoding": encoding, "content-type": "application/json"},
+    )
+    assert resp.status_code == 200
+    assert resp.json() == {"length": 10_000}
+
+
+def test_request_invalid(client: TestClient) -> None:
+    resp = client.post(
+        "/echo",
+        content=b"not gzip",
+        headers={"content-encoding": "gzip", "content-type": "application/json"},
+    )
+    assert resp.status_code == 400
+    resp = client.post(
+        "/echo",
+        content=zlib.compress(b"{}"),
+        headers={"content-encoding": "br", "content-type": "application/json"},
+    )
+    assert resp.status_code == 415
+
+
+@pytest.mark.parametrize(
+    "encoding,compress",
+    [
+        ("gzip", gzip.compress),
+        ("zstd", zstandard.ZstdCompressor().compress),
+    ],
+)
+def test_request_too_large(
+    client: TestClient, encoding: str, compress: Callable[[bytes], bytes]
+) -> None:
+    body = json.dumps({"data": "x" * 1_000_000}).encode()
+    content = compress(body)
+    assert len(content) < 10_000
+    resp = client.post(
+        "/echo",
+        content=content,
+        headers={"content-encoding": encoding, "content-type": "application/json"},
+    )
+    assert resp.status_code == 413
+
+
+@pytest.mark.parametrize(
+    "encoding,compress",
+    [
+        ("gzip", gzip.compress),
+        ("zstd", zstandard.ZstdCompressor().compress),
+    ],
+)
+def test_request_truncated(
+    client: TestClient, encoding: str, compress: Callable[[bytes], bytes]
+) -> None:
+    body = json.dumps({"data": "x" * 10_000}).encode()
+    resp = client.post(
+        "/echo",
+        content=compress(body)[:-8],
+        headers={"content-encoding": encoding, "content-type": "application/json"},
+    )
+    assert resp.status_code == 400
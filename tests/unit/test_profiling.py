@@ -0,0 +1,79 @@
+import asyncio
+import threading
+import time
+from pathlib import Path
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from workerfacing_api.profiling import (
+    ProfilingMiddleware,
+    StackSampler,
+    profile,
+    profile_path,
+)
+
+
+def busy(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_sampler() -> None:
+    thread = threading.Thread(target=busy, args=(0.3,), name="busy-thread")
+    sampler = StackSampler(interval=0.005)
+    sampler.start()
+    thread.start()
+    thread.join()
+    collapsed = sampler.stop()
+    assert sampler.n_samples > 0
+    lines = [line for line in collapsed.splitlines() if "busy-thread" in line]
+    assert lines
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0
+    assert stack.startswith("busy-thread;threading:Thread._bootstrap;")
+    assert f"{__name__}:busy" in stack
+
+
+def test_sampler_idle() -> None:
+    event = threading.Event()
+    thread = threading.Thread(target=event.wait, name="idle-thread")
+    thread.start()
+    sampler = StackSampler(interval=0.005)
+    sampler.sample()
+    idle_sampler = StackSampler(interval=0.005, include_idle=True)
+    idle_sampler.sample()
+    event.set()
+    thread.join()
+    assert "idle-thread" not in sampler.collapsed()
+    assert "idle-thread" in idle_sampler.collapsed()
+
+
+def test_profile() -> None:
+    async def run() -> str:
+        task = asyncio.create_task(profile(0.3, 0.005))
+        await asyncio.sleep(0.05)
+        await asyncio.to_thread(busy, 0.1)
+        return await task
+
+    assert f"{__name__}:busy" in asyncio.run(run())
+
+
+def test_middleware(tmp_path: Path) -> None:
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware, key="key", directory=str(tmp_path))
+
+    @app.get("/busy")
+    def get_busy() -> None:
+        busy(0.1)
+
+    client = TestClient(app)
+    assert "x-profile-id" not in client.get("/busy").headers
+    assert (
+        "x-profile-id"
+        not in client.get("/busy", headers={"x-profile": "wrong"}).headers
+    )
+    resp = client.get("/busy", headers={"x-profile": "key"})
+    with open(profile_path(str(tmp_path), resp.headers["x-profile-id"])) as f:
+        assert f"{__name__}:test_middleware.<locals>.get_busy;" in f.read()
@@ -0,0 +1,84 @@
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine, create_engine, event, text
+
+from workerfacing_api.query_log import QueryLog, QueryLogMiddleware
+from workerfacing_api.schemas.debug import QueryLogConfig
+
+
+@pytest.fixture
+def engine(tmp_path: Path) -> Iterator[Engine]:
+    engine = create_engine(
+        f"sqlite:///{tmp_path}/test.db", connect_args={"check_same_thread": False}
+    )
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY)"))
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def query_log(engine: Engine) -> QueryLog:
+    query_log = QueryLog(QueryLogConfig(enabled=True, slow_threshold=60))
+    query_log.instrument(engine)
+    return query_log
+
+
+@pytest.fixture
+def client(engine: Engine, query_log: QueryLog) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(QueryLogMiddleware, query_log=query_log)
+
+    @app.get("/items")
+    def get_items(n: int = 1) -> None:
+        with engine.connect() as conn:
+            for _ in range(n):
+                conn.execute(text("SELECT * FROM items"))
+
+    return TestClient(app)
+
+
+def test_count(client: TestClient) -> None:
+    resp = client.get("/items", params={"n": 3})
+    assert 'desc="3 statements"' in resp.headers["server-timing"]
+    assert resp.headers["server-timing"].startswith("db;dur=")
+
+
+def test_budget(
+    client: TestClient, query_log: QueryLog, capsys: pytest.CaptureFixture[str]
+) -> None:
+    query_log.configure(QueryLogConfig(enabled=True, statement_budget=2))
+    client.get("/items", params={"n": 2})
+    assert "Query budget" not in capsys.readouterr().out
+    client.get("/items", params={"n": 3})
+    assert "Query budget: GET /items issued 3 statements" in capsys.readouterr().out
+
+
+def test_slow_query(
+    engine: Engine, query_log: QueryLog, capsys: pytest.CaptureFixture[str]
+) -> None:
+    query_log.configure(QueryLogConfig(enabled=True, slow_threshold=0))
+    with engine.connect() as conn:
+        conn.execute(text("SELECT * FROM items WHERE id = :id"), {"id": 1})
+        conn.execute(text("SELECT * FROM items WHERE id = :id"), {"id": 2})
+    query_log._explainer.shutdown(wait=True)
+    out = capsys.readouterr().out
+    assert "Slow query: " in out
+    assert "SELECT * FROM items WHERE id = ? with (1,)" in out
+    # explained once
+    assert out.count("Slow query plan: SELECT * FROM items WHERE id = ?") == 1
+    assert "SEARCH items USING INTEGER PRIMARY KEY" in out
+
+
+def test_disable(client: TestClient, engine: Engine, query_log: QueryLog) -> None:
+    query_log.configure(QueryLogConfig(enabled=False))
+    assert not event.contains(
+        engine, "before_cursor_execute", query_log._before_cursor_execute
+    )
+    assert "server-timing" not in client.get("/items").headers
+    query_log.configure(QueryLogConfig(enabled=True))
+    assert 'desc="1 statements"' in client.get("/items").headers["server-timing"]
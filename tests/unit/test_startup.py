@@ -0,0 +1,108 @@
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from workerfacing_api.dependencies import LazyResource
+from workerfacing_api.startup import Startup
+
+
+def test_steps_run_concurrently() -> None:
+    async def run() -> tuple[Startup, float]:
+        startup = Startup({"a": lambda: time.sleep(0.2), "b": lambda: time.sleep(0.2)})
+        start = time.perf_counter()
+        startup.start()
+        assert not startup.ready
+        assert await startup.wait("a") and await startup.wait("b")
+        return startup, time.perf_counter() - start
+
+    startup, duration = asyncio.run(run())
+    assert duration < 0.35
+    assert startup.ready
+    readiness = startup.readiness()
+    assert readiness.ready
+    assert [step.name for step in readiness.steps] == ["a", "b"]
+    assert all(step.done and step.seconds for step in readiness.steps)
+
+
+def test_failed_step() -> None:
+    def fail() -> None:
+        raise RuntimeError("no database")
+
+    async def run() -> tuple[Startup, bool, bool]:
+        startup = Startup({"queue": fail, "auth": lambda: None})
+        startup.start()
+        return startup, await startup.wait("queue"), await startup.wait("auth")
+
+    startup, queue_done, auth_done = asyncio.run(run())
+    assert not queue_done and auth_done
+    assert not startup.ready
+    assert startup.status["queue"].error == "no database"
+    assert startup.status["queue"].seconds is not None
+
+
+def test_wait_step_not_run() -> None:
+    async def run() -> bool:
+        startup = Startup({})
+        startup.start()
+        return await startup.wait("s3")
+
+    assert asyncio.run(run())
+
+
+def test_lazy_resource_created_once() -> None:
+    calls = []
+    barrier = threading.Barrier(8)
+
+    def create() -> object:
+        calls.append(1)
+        time.sleep(0.05)
+        return object()
+
+    resource = LazyResource(create)
+    assert not resource.ready
+
+    def get() -> object:
+        barrier.wait()
+        return resource.get()
+
+    with ThreadPoolExecutor(8) as executor:
+        values = list(executor.map(lambda _: get(), range(8)))
+    assert len(calls) == 1
+    assert all(value is values[0] for value in values)
+    assert resource.ready
+
+
+def test_lazy_resource_retried_after_failure() -> None:
+    attempts = []
+
+    def create() -> str:
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError()
+        return "queue"
+
+    resource = LazyResource(create)
+    try:
+        resource.get()
+    except ConnectionError:
+        pass
+    assert not resource.ready
+    assert resource.get() == "queue"
+
+
+def test_import_dependencies_no_files(tmp_path: Path) -> None:
+    # e.g. the checksum index, created in the working directory by default
+    env = {**os.environ, "PYTHONPATH": os.getcwd(), "FILESYSTEM": "local"}
+    env.pop("CHECKSUM_INDEX_PATH", None)
+    subprocess.run(
+        [sys.executable, "-c", "import workerfacing_api.dependencies"],
+        cwd=tmp_path,
+        env=env,
+        check=True,
+    )
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,132 @@
+import json
+from pathlib import Path
+from typing import Any
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from workerfacing_api import tracing
+from workerfacing_api.tracing import (
+    FileSpanExporter,
+    Span,
+    SpanExporter,
+    TracingMiddleware,
+    traced_methods,
+)
+
+
+@traced_methods("store")
+class Store:
+    def get(self, key: str) -> str:
+        return self.load(key)
+
+    def load(self, key: str) -> str:
+        return key
+
+    def fail(self) -> None:
+        raise ValueError("failed")
+
+    @staticmethod
+    def helper() -> int:
+        return 1
+
+
+class MemoryExporter(SpanExporter):
+    def __init__(self) -> None:
+        super().__init__()
+        self.spans: list[Span] = []
+
+    def export(self, spans: list[Span]) -> None:
+        self.spans.extend(spans)
+
+    def write(self, spans: list[Span]) -> None:
+        raise NotImplementedError()
+
+
+@pytest.fixture
+def exporter() -> MemoryExporter:
+    return MemoryExporter()
+
+
+@pytest.fixture
+def client(exporter: MemoryExporter) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(TracingMiddleware, exporter=exporter)
+    store = Store()
+
+    @app.get("/items/{key}")
+    def get_item(key: str) -> dict[str, Any]:
+        with tracing.span("auth"):
+            pass
+        return {"key": store.get(key), "static": store.helper()}
+
+    @app.get("/fail")
+    def fail() -> None:
+        store.fail()
+
+    return TestClient(app, raise_server_exceptions=False)
+
+
+def test_spans(client: TestClient, exporter: MemoryExporter) -> None:
+    resp = client.get("/items/a")
+    assert resp.json() == {"key": "a", "static": 1}
+    spans = {s.name: s for s in exporter.spans}
+    assert set(spans) == {"GET /items/{key}", "auth", "store.get", "store.load"}
+    root = spans["GET /items/{key}"]
+    assert root.kind == "server"
+    assert root.parent_id is None
+    assert root.attributes["http.status_code"] == 200
+    assert spans["auth"].parent_id == root.span_id
+    assert spans["store.get"].parent_id == root.span_id
+    assert spans["store.load"].parent_id == spans["store.get"].span_id
+    assert len({s.trace_id for s in exporter.spans}) == 1
+
+
+def test_server_timing(client: TestClient) -> None:
+    resp = client.get("/items/a")
+    metrics = [m.split(";")[0] for m in resp.headers["server-timing"].split(", ")]
+    # only the top-level steps
+    assert metrics == ["auth", "store.get", "total"]
+
+
+def test_traceparent(client: TestClient, exporter: MemoryExporter) -> None:
+    trace_id, parent_id = "0af7651916cd43dd8448eb211c80319c", "b7ad6b7169203331"
+    client.get("/items/a", headers={"traceparent": f"00-{trace_id}-{parent_id}-01"})
+    assert {s.trace_id for s in exporter.spans} == {trace_id}
+    root = next(s for s in exporter.spans if s.kind == "server")
+    assert root.parent_id == parent_id
+
+
+def test_error(client: TestClient, exporter: MemoryExporter) -> None:
+    assert client.get("/fail").status_code == 500
+    spans = {s.name: s for s in exporter.spans}
+    assert spans["store.fail"].error
+
+
+def test_no_trace() -> None:
+    with tracing.span("noop") as span:
+        assert span is None
+    assert Store().get("a") == "a"
+
+
+def test_file_exporter(tmp_path: Path) -> None:
+    path = tmp_path / "traces.jsonl"
+    exporter = FileSpanExporter(str(path), interval=0.01)
+    root = Span(name="root", trace_id="0" * 32, kind="server")
+    child = root.child("child", attribute=1)
+    child.end()
+    root.end()
+    exporter.export(root.finished)
+    exporter.shutdown()
+    (batch,) = [json.loads(line) for line in path.read_text().splitlines()]
+    resource_spans = batch["resourceSpans"][0]
+    assert resource_spans["resource"]["attributes"] == [
+        {"key": "service.name", "value": {"stringValue": "workerfacing-api"}}
+    ]
+    spans = resource_spans["scopeSpans"][0]["spans"]
+    assert [s["name"] for s in spans] == ["child", "root"]
+    assert spans[0]["parentSpanId"] == root.span_id
+    assert spans[0]["attributes"] == [{"key": "attribute", "value": {"intValue": "1"}}]
+    assert "parentSpanId" not in spans[1]
+    assert spans[1]["kind"] == 2
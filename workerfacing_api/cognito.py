@@ -0,0 +1,27 @@
+"""Verification of the Cognito ID tokens of the workers, with fastapi_cloudauth.
+
+Slow to import and fetching the keys of the user pool on creation,
+so only imported by `dependencies.WorkerAuthDependency` when it is set up.
+"""
+
+from typing import Any
+
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from fastapi_cloudauth.cognito import CognitoCurrentUser  # type: ignore
+
+from workerfacing_api import tracing
+from workerfacing_api.schemas.auth import GroupClaims
+
+
+class WorkerGroupCognitoCurrentUser(CognitoCurrentUser):  # type: ignore
+    user_info = GroupClaims
+
+    async def call(self, http_auth: HTTPAuthorizationCredentials) -> Any:
+        with tracing.span("auth"):
+            user_info = await super().call(http_auth)
+        if "workers" not in (getattr(user_info, "cognito_groups") or []):
+            raise HTTPException(
+                status_code=403, detail="Not a member of the 'workers' group"
+            )
+        return user_info
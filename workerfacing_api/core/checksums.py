@@ -0,0 +1,57 @@
+import hashlib
+import os
+import sqlite3
+import threading
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class ChecksumIndex:
+    """
+    Content hashes (sha256) of local files.
+    Cached in a SQLite sidecar keyed by path + mtime + size, so that files are only re-hashed when they change.
+    """
+
+    def __init__(self, db_path: str = ":memory:"):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS checksums ("
+                "path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, sha256 TEXT)"
+            )
+
+    def get(self, path: str, stat_result: os.stat_result | None = None) -> str:
+        """Get the sha256 hex digest of a file, hashing it only if not indexed yet."""
+        path = os.path.abspath(path)
+        stat_result = stat_result or os.stat(path)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT sha256 FROM checksums WHERE path = ? AND mtime_ns = ? AND size = ?",
+                (path, stat_result.st_mtime_ns, stat_result.st_size),
+            ).fetchone()
+        if row is not None:
+            return str(row[0])
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(HASH_CHUNK_SIZE):
+                digest.update(chunk)
+        checksum = digest.hexdigest()
+        new_stat = os.stat(path)
+        if (new_stat.st_mtime_ns, new_stat.st_size) == (
+            stat_result.st_mtime_ns,
+            stat_result.st_size,
+        ):  # file not modified while hashing
+            with self.lock, self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO checksums VALUES (?, ?, ?, ?)",
+                    (path, stat_result.st_mtime_ns, stat_result.st_size, checksum),
+                )
+        return checksum
+
+    def __len__(self) -> int:
+        with self.lock:
+            return int(
+                self.conn.execute("SELECT COUNT(*) FROM checksums").fetchone()[0]
+            )
@@ -0,0 +1,102 @@
+import asyncio
+import heapq
+import threading
+import time
+
+
+class DeadlineHeap:
+    """
+    In-process min-heap of the lease expiries (Unix times) of the jobs in flight,
+    to wake the timeout sweeper when the next lease expires instead of polling the database.
+    Only a hint: the leases stored in the database stay authoritative.
+    Outdated entries (renewed or released leases) are skipped lazily.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.heap: list[tuple[float, int]] = []
+        self.deadlines: dict[int, float] = {}  # job id -> current deadline
+        self._wakeup: tuple[asyncio.AbstractEventLoop, asyncio.Event] | None = None
+
+    def __len__(self) -> int:
+        return len(self.deadlines)
+
+    def set(self, job_id: int, deadline: float) -> None:
+        with self.lock:
+            self.deadlines[job_id] = deadline
+            heapq.heappush(self.heap, (deadline, job_id))
+            if len(self.heap) > 2 * len(self.deadlines) + 64:
+                self._compact()
+            earliest = self.heap[0][0] == deadline
+        if earliest:
+            self._notify()
+
+    def discard(self, job_id: int) -> None:
+        with self.lock:
+            self.deadlines.pop(job_id, None)
+
+    def reset(self, deadlines: dict[int, float]) -> None:
+        """Replace all deadlines, e.g. with the ones loaded from the database."""
+        with self.lock:
+            self.deadlines = dict(deadlines)
+            self._compact()
+        self._notify()
+
+    def next_deadline(self) -> float | None:
+        with self.lock:
+            self._skip_outdated()
+            return self.heap[0][0] if self.heap else None
+
+    def pop_expired(self, now: float) -> list[int]:
+        """Remove and return the jobs whose deadline is not after `now`."""
+        expired = []
+        with self.lock:
+            self._skip_outdated()
+            while self.heap and self.heap[0][0] <= now:
+                _, job_id = heapq.heappop(self.heap)
+                del self.deadlines[job_id]
+                expired.append(job_id)
+                self._skip_outdated()
+        return expired
+
+    async def wait_expired(self, max_wait: float | None = None) -> list[int]:
+        """Sleep until the next deadline (or an earlier one is set) and pop the expired jobs.
+
+        Returns early (maybe with no jobs) after `max_wait` seconds.
+        Only one coroutine can wait at a time.
+        """
+        wait_until = None if max_wait is None else time.time() + max_wait
+        while True:
+            event = asyncio.Event()
+            with self.lock:
+                self._wakeup = (asyncio.get_running_loop(), event)
+            next_deadline = self.next_deadline()
+            wakeup = min(
+                (t for t in (next_deadline, wait_until) if t is not None),
+                default=None,
+            )
+            try:
+                await asyncio.wait_for(
+                    event.wait(),
+                    None if wakeup is None else max(wakeup - time.time(), 0),
+                )
+            except asyncio.TimeoutError:
+                pass
+            expired = self.pop_expired(time.time())
+            if expired or (wait_until is not None and time.time() >= wait_until):
+                return expired
+
+    def _notify(self) -> None:
+        with self.lock:
+            wakeup = self._wakeup
+        if wakeup is not None and not wakeup[0].is_closed():
+            loop, event = wakeup
+            loop.call_soon_threadsafe(event.set)
+
+    def _skip_outdated(self) -> None:
+        while self.heap and self.deadlines.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+
+    def _compact(self) -> None:
+        self.heap = [(deadline, job_id) for job_id, deadline in self.deadlines.items()]
+        heapq.heapify(self.heap)
@@ -0,0 +1,107 @@
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from workerfacing_api.schemas.files import FileCacheStats
+
+
+@dataclass
+class _Entry:
+    mtime_ns: int
+    size: int
+    content: bytes | mmap.mmap
+
+
+class FileCache:
+    """
+    In-process LRU cache of the contents of hot (frequently downloaded, small) local files.
+    Bounded by the total number of cached bytes; entries are invalidated when the file mtime or size changes.
+    """
+
+    def __init__(self, max_size: int, max_file_size: int, use_mmap: bool = False):
+        self.max_size = max_size
+        self.max_file_size = max_file_size
+        self.use_mmap = use_mmap
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[str, _Entry] = OrderedDict()
+        self.size = 0
+        self.hits = self.misses = self.bypassed = 0
+        self.evictions = self.invalidations = 0
+
+    def get(
+        self, path: str, stat_result: os.stat_result | None = None
+    ) -> bytes | mmap.mmap | None:
+        """Get the contents of a file, loading them into the cache if needed.
+
+        Returns None if the file is too large to be cached.
+        """
+        path = os.path.abspath(path)
+        stat_result = stat_result or os.stat(path)
+        if stat_result.st_size > min(self.max_file_size, self.max_size):
+            with self.lock:
+                self.bypassed += 1
+            return None
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None:
+                if (entry.mtime_ns, entry.size) == (
+                    stat_result.st_mtime_ns,
+                    stat_result.st_size,
+                ):
+                    self.entries.move_to_end(path)
+                    self.hits += 1
+                    return entry.content
+                self._remove(path)
+                self.invalidations += 1
+            self.misses += 1
+        entry = _Entry(
+            stat_result.st_mtime_ns,
+            stat_result.st_size,
+            self._load(path, stat_result.st_size),
+        )
+        if len(entry.content) != entry.size:  # file modified while loading
+            return entry.content
+        with self.lock:
+            if path in self.entries:  # loaded concurrently
+                self._remove(path)
+            self.entries[path] = entry
+            self.size += entry.size
+            while self.size > self.max_size:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+        return entry.content
+
+    def _load(self, path: str, size: int) -> bytes | mmap.mmap:
+        with open(path, "rb") as f:
+            if self.use_mmap and size > 0 and os.fstat(f.fileno()).st_size == size:
+                # pages are shared with the OS page cache instead of copied to the heap,
+                # mapped up to the size the entry is validated with (see `CachedFileResponse`)
+                return mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+            return f.read()
+
+    def _remove(self, path: str) -> None:
+        entry = self.entries.pop(path)
+        self.size -= entry.size
+        # mmaps are not closed explicitly since they might still be being sent
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self) -> FileCacheStats:
+        with self.lock:
+            n_requests = self.hits + self.misses + self.bypassed
+            return FileCacheStats(
+                hits=self.hits,
+                misses=self.misses,
+                bypassed=self.bypassed,
+                evictions=self.evictions,
+                invalidations=self.invalidations,
+                n_files=len(self.entries),
+                size=self.size,
+                max_size=self.max_size,
+                hit_rate=self.hits / n_requests if n_requests else 0.0,
+            )
@@ -1,51 +1,298 @@
 import abc
+import datetime
+import fnmatch
+import mmap
 import os
 import re
 import shutil
+import tarfile
 from pathlib import Path
+from stat import S_ISREG
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, TypeVar
 
+import botocore.exceptions
+import zstandard
 from fastapi import Request, UploadFile
-from fastapi.responses import FileResponse
-from mypy_boto3_s3 import S3Client
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.datastructures import Headers
+from starlette.types import Receive, Scope, Send
 
-from workerfacing_api.schemas.files import FileHTTPRequest
+from workerfacing_api.core.checksums import ChecksumIndex
+from workerfacing_api.core.file_cache import FileCache
+from workerfacing_api.metrics import S3_DURATION
+from workerfacing_api.schemas.files import (
+    ArchiveCompression,
+    FileHTTPRequest,
+    MultipartUpload,
+    MultipartUploadPart,
+)
+from workerfacing_api.tracing import traced_methods
+
+if TYPE_CHECKING:
+    from mypy_boto3_s3 import S3Client
+
+ARCHIVE_CHUNK_SIZE = 1024 * 1024
+
+T = TypeVar("T")
 
 
 class FileSystem(abc.ABC):
     def get_file(self, path: str) -> FileResponse:
-        """Donwload a file from the filesystem."""
+        """Donwload a file from the filesystem (with a strong ETag header)."""
+        raise NotImplementedError()
+
+    def get_archive(
+        self,
+        path: str,
+        include: list[str] | None = None,
+        exclude: list[str] | None = None,
+        compression: ArchiveCompression = ArchiveCompression.none,
+    ) -> StreamingResponse:
+        """Download a directory from the filesystem as a tar archive streamed on the fly.
+
+        `include`/`exclude` are glob patterns matched against the file paths
+        relative to the directory.
+        """
         raise NotImplementedError()
 
     def get_file_url(
         self, path: str, request: Request, url_endpoint: str, files_endpoint: str
     ) -> FileHTTPRequest:
-        """Get a url + parameters to request a file from the filesystem."""
+        """Get a url + parameters (+ ETag) to request a file from the filesystem."""
+        raise NotImplementedError()
+
+    def get_size(self, path: str) -> int:
+        """Get the number of bytes of a file, or of all files in a directory."""
         raise NotImplementedError()
 
     def post_file(self, file: UploadFile, path: str) -> None:
         """Upload a file to the filesystem."""
         raise NotImplementedError
 
+    def post_archive(self, file: UploadFile, path: str) -> int:
+        """Upload a tar archive to the filesystem, extracting its files to `path`.
+
+        Returns the number of extracted files.
+        """
+        raise NotImplementedError
+
     def post_file_url(
         self, path: str, request: Request, url_endpoint: str, files_endpoint: str
     ) -> FileHTTPRequest:
         """Get a url + parameters to upload a file to the filesystem."""
         raise NotImplementedError()
 
+    def create_multipart_upload(self, path: str, n_parts: int) -> MultipartUpload:
+        """Start a multipart upload and get urls + parameters to upload its parts."""
+        raise NotImplementedError()
+
+    def complete_multipart_upload(
+        self, path: str, upload_id: str, parts: list[MultipartUploadPart]
+    ) -> None:
+        """Assemble the uploaded parts into the final file."""
+        raise NotImplementedError()
+
+    def abort_multipart_upload(self, path: str, upload_id: str) -> None:
+        """Abort a multipart upload and delete its uploaded parts."""
+        raise NotImplementedError()
+
+    def abort_stale_multipart_uploads(self, older_than: int) -> int:
+        """Abort multipart uploads started more than `older_than` seconds ago.
+
+        Returns the number of aborted uploads.
+        """
+        raise NotImplementedError()
+
+
+def _path_in_directory(directory: str, name: str) -> str:
+    """Join a (user-provided) file name to a directory, without escaping it."""
+    path = os.path.normpath(os.path.join(directory, name))
+    if Path(os.path.normpath(directory)) not in Path(path).parents:
+        raise PermissionError("Path is not in upload directory")
+    return path
+
 
+def _tar_padded(size: int, block_size: int = tarfile.BLOCKSIZE) -> int:
+    return -(-size // block_size) * block_size
+
+
+def _archive_response(
+    content: Iterator[bytes],
+    name: str,
+    size: int,
+    compression: ArchiveCompression,
+) -> StreamingResponse:
+    if compression == ArchiveCompression.zstd:
+        compressor = zstandard.ZstdCompressor().compressobj()
+
+        def iter_compressed() -> Iterator[bytes]:
+            for chunk in content:
+                if compressed := compressor.compress(chunk):
+                    yield compressed
+            yield compressor.flush()
+
+        return StreamingResponse(
+            iter_compressed(),
+            media_type="application/zstd",
+            headers={
+                "content-disposition": f'attachment; filename="{name}.tar.zst"',
+                # compressed size only known at the end
+                "x-uncompressed-content-length": str(size),
+            },
+        )
+    return StreamingResponse(
+        content,
+        media_type="application/x-tar",
+        headers={
+            "content-disposition": f'attachment; filename="{name}.tar"',
+            "content-length": str(size),
+        },
+    )
+
+
+class CachedFileResponse(FileResponse):
+    """File response sending an in-memory copy of the file (range requests are still read from disk)."""
+
+    def __init__(self, path: str, content: bytes | mmap.mmap, **kwargs: Any):
+        super().__init__(path, **kwargs)
+        self.content = content
+
+    def _truncated(self, size: int) -> bool:
+        """Whether the file was truncated in place below `size` bytes (deleted or replaced files live on while mapped)."""
+        try:
+            stat_result = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        if self.stat_result is not None and (
+            stat_result.st_dev,
+            stat_result.st_ino,
+        ) != (self.stat_result.st_dev, self.stat_result.st_ino):
+            return False
+        return stat_result.st_size < size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if Headers(scope=scope).get("range") is not None:
+            return await super().__call__(scope, receive, send)
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b""})
+        elif isinstance(self.content, bytes):
+            await send({"type": "http.response.body", "body": self.content})
+        else:  # mmap (never empty), sent in chunks to avoid copying it at once
+            view = memoryview(self.content)
+            for start in range(0, len(view), self.chunk_size):
+                if self._truncated(len(view)):
+                    # reading the pages past the end of a file truncated in place kills
+                    # the process (SIGBUS): end early, as `FileResponse` for shrunk files
+                    await send({"type": "http.response.body", "body": b""})
+                    break
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": bytes(view[start : start + self.chunk_size]),
+                        "more_body": start + self.chunk_size < len(view),
+                    }
+                )
+        if self.background is not None:
+            await self.background()
+
+
+@traced_methods("filesystem")
 class LocalFilesystem(FileSystem):
     """Filesystem on local disk."""
 
-    def __init__(self, base_get_path: str, base_post_path: str):
+    def __init__(
+        self,
+        base_get_path: str,
+        base_post_path: str,
+        checksum_index: ChecksumIndex | None = None,
+        file_cache: FileCache | None = None,
+    ):
         self.base_get_path = base_get_path
         self.base_post_path = base_post_path
+        self.checksum_index = checksum_index or ChecksumIndex()
+        self.file_cache = file_cache
+
+    def _etag(self, path: str, stat_result: os.stat_result | None = None) -> str:
+        return f'"{self.checksum_index.get(path, stat_result)}"'
 
     def get_file(self, path: str) -> FileResponse:
         if Path(self.base_get_path) not in Path(path).parents:
             raise PermissionError("Path is not in base directory")
-        if not os.path.exists(path):
+        if not os.path.isfile(path):
             raise FileNotFoundError()
-        return FileResponse(path)
+        stat_result = os.stat(path)
+        headers = {"etag": self._etag(path, stat_result)}
+        if self.file_cache is not None:
+            content = self.file_cache.get(path, stat_result)
+            if content is not None:
+                return CachedFileResponse(
+                    path, content, headers=headers, stat_result=stat_result
+                )
+        return FileResponse(path, headers=headers, stat_result=stat_result)
+
+    def get_archive(
+        self,
+        path: str,
+        include: list[str] | None = None,
+        exclude: list[str] | None = None,
+        compression: ArchiveCompression = ArchiveCompression.none,
+    ) -> StreamingResponse:
+        if Path(self.base_get_path) not in Path(path).parents:
+            raise PermissionError("Path is not in base directory")
+        if not os.path.isdir(path):
+            raise FileNotFoundError()
+        members = []
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                rel_path = Path(os.path.relpath(file_path, path)).as_posix()
+                stat = os.lstat(file_path)
+                if not S_ISREG(stat.st_mode):
+                    # links might point outside of the base directory,
+                    # and FIFOs, sockets and devices would block or never end when read
+                    continue
+                if include and not any(fnmatch.fnmatch(rel_path, p) for p in include):
+                    continue
+                if exclude and any(fnmatch.fnmatch(rel_path, p) for p in exclude):
+                    continue
+                info = tarfile.TarInfo(rel_path)
+                info.size = stat.st_size
+                info.mtime = int(stat.st_mtime)
+                info.mode = 0o644
+                members.append((file_path, info))
+        # the archive is built by hand to know its exact size before streaming it
+        headers = [info.tobuf(tarfile.PAX_FORMAT) for _, info in members]
+        members_size = sum(
+            len(header) + _tar_padded(info.size)
+            for header, (_, info) in zip(headers, members)
+        )
+        size = _tar_padded(members_size + 2 * tarfile.BLOCKSIZE, tarfile.RECORDSIZE)
+
+        def iter_archive() -> Iterator[bytes]:
+            for header, (file_path, info) in zip(headers, members):
+                yield header
+                remaining = info.size
+                with open(file_path, "rb") as f:
+                    while remaining > 0:
+                        chunk = f.read(min(ARCHIVE_CHUNK_SIZE, remaining))
+                        if not chunk:  # file shrunk since listed, keep size
+                            chunk = tarfile.NUL * min(ARCHIVE_CHUNK_SIZE, remaining)
+                        remaining -= len(chunk)
+                        yield chunk
+                yield tarfile.NUL * (_tar_padded(info.size) - info.size)
+            yield tarfile.NUL * (size - members_size)  # end-of-archive marker
+
+        return _archive_response(
+            iter_archive(), os.path.basename(os.path.normpath(path)), size, compression
+        )
 
     def get_file_url(
         self, path: str, request: Request, url_endpoint: str, files_endpoint: str
@@ -62,18 +309,74 @@ class LocalFilesystem(FileSystem):
                 if "authorization" in request.headers
                 else {}
             ),
+            etag=self._etag(path) if os.path.isfile(path) else None,
         )
 
+    def get_size(self, path: str) -> int:
+        if Path(self.base_get_path) not in Path(path).parents:
+            raise PermissionError("Path is not in base directory")
+        if os.path.isfile(path):
+            return os.path.getsize(path)
+        if not os.path.isdir(path):
+            raise FileNotFoundError()
+        size = 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                file_path = os.path.join(root, name)
+                if not os.path.islink(file_path):
+                    size += os.path.getsize(file_path)
+        return size
+
     def post_file(self, file: UploadFile, path: str) -> None:
         if Path(self.base_post_path) not in Path(path).parents:
             raise PermissionError("Path is not in base directory")
         try:
+            file_path = _path_in_directory(path, file.filename or "unnamed")
             os.makedirs(path, exist_ok=True)
-            with open(os.path.join(path, file.filename or "unnamed"), "wb") as f:
+            with open(file_path, "wb") as f:
                 shutil.copyfileobj(file.file, f)
         finally:
             file.file.close()
 
+    def post_archive(self, file: UploadFile, path: str) -> int:
+        if Path(self.base_post_path) not in Path(path).parents:
+            raise PermissionError("Path is not in base directory")
+
+        def member_paths(tar: tarfile.TarFile) -> Iterator[tuple[tarfile.TarInfo, str]]:
+            for member in tar:
+                if os.path.normpath(
+                    os.path.join(path, member.name)
+                ) == os.path.normpath(path):
+                    continue  # e.g. "./" in archives created with `tar -C dir .`
+                yield member, _path_in_directory(path, member.name)
+
+        n_files = 0
+        try:
+            # streaming mode: the archive is read twice (the upload is spooled to disk),
+            # first to validate all member names, so that rejected archives are not partially extracted
+            with tarfile.open(fileobj=file.file, mode="r|*") as tar:
+                for _ in member_paths(tar):
+                    pass
+            file.file.seek(0)
+            with tarfile.open(fileobj=file.file, mode="r|*") as tar:
+                for member, member_path in member_paths(tar):
+                    if member.isdir():
+                        os.makedirs(member_path, exist_ok=True)
+                        continue
+                    if not member.isfile():
+                        continue  # links and special files are not extracted
+                    member_file = tar.extractfile(member)
+                    assert member_file is not None
+                    os.makedirs(os.path.dirname(member_path), exist_ok=True)
+                    with open(member_path, "wb") as f:
+                        shutil.copyfileobj(member_file, f)
+                    n_files += 1
+        except tarfile.TarError as e:
+            raise ValueError(f"Invalid archive: {e}")
+        finally:
+            file.file.close()
+        return n_files
+
     def post_file_url(
         self, path: str, request: Request, url_endpoint: str, files_endpoint: str
     ) -> FileHTTPRequest:
@@ -89,17 +392,41 @@ class LocalFilesystem(FileSystem):
             ),
         )
 
+    def create_multipart_upload(self, path: str, n_parts: int) -> MultipartUpload:
+        raise PermissionError("Multipart uploads are only supported on S3.")
+
+    def complete_multipart_upload(
+        self, path: str, upload_id: str, parts: list[MultipartUploadPart]
+    ) -> None:
+        raise PermissionError("Multipart uploads are only supported on S3.")
+
+    def abort_multipart_upload(self, path: str, upload_id: str) -> None:
+        raise PermissionError("Multipart uploads are only supported on S3.")
+
+    def abort_stale_multipart_uploads(self, older_than: int) -> int:
+        return 0  # files are written directly, nothing to clean up
 
+
+@traced_methods("filesystem")
 class S3Filesystem(FileSystem):
     """Filesystem on S3."""
 
-    def __init__(self, s3_client: S3Client, bucket: str):
+    def __init__(self, s3_client: "S3Client", bucket: str):
         self.s3_client = s3_client
         self.bucket = bucket
 
     def get_file(self, path: str) -> FileResponse:
         raise PermissionError("Please get a pre-signed url instead.")
 
+    def get_archive(
+        self,
+        path: str,
+        include: list[str] | None = None,
+        exclude: list[str] | None = None,
+        compression: ArchiveCompression = ArchiveCompression.none,
+    ) -> StreamingResponse:
+        raise PermissionError("Please get pre-signed urls instead.")
+
     def _get_bucket_path(self, path: str) -> tuple[str, str]:
         if not path.startswith("s3://"):
             raise PermissionError("Path should start with s3://")
@@ -113,39 +440,161 @@ class S3Filesystem(FileSystem):
     ) -> FileHTTPRequest:
         bucket, path = self._get_bucket_path(path)
 
-        response = self.s3_client.list_objects_v2(Bucket=bucket, Prefix=path)
+        with S3_DURATION.labels(operation="list_objects_v2").time():
+            response = self.s3_client.list_objects_v2(Bucket=bucket, Prefix=path)
         if "Contents" not in response:
             raise FileNotFoundError()
+        # S3 ETags change whenever the object content changes
+        etag = next(
+            (obj["ETag"] for obj in response["Contents"] if obj["Key"] == path), None
+        )
 
-        return FileHTTPRequest(
-            url=self.s3_client.generate_presigned_url(
+        with S3_DURATION.labels(operation="presign_get_object").time():
+            url = self.s3_client.generate_presigned_url(
                 "get_object",
                 Params={"Bucket": bucket, "Key": path},
                 ExpiresIn=60 * 10,
-            ),
-            method="get",
-        )
+            )
+        return FileHTTPRequest(url=url, method="get", etag=etag)
+
+    def get_size(self, path: str) -> int:
+        bucket, path = self._get_bucket_path(path)
+        prefix = path.rstrip("/") + "/"
+        size, found = 0, False
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        for page in _timed_pages(
+            paginator.paginate(Bucket=bucket, Prefix=path), "list_objects_v2"
+        ):
+            for obj in page.get("Contents", []):
+                # the file itself, or the files in the directory (not e.g. "path_2")
+                if obj["Key"] == path or obj["Key"].startswith(prefix):
+                    size += obj["Size"]
+                    found = True
+        if not found:
+            raise FileNotFoundError()
+        return size
 
     def post_file(self, file: UploadFile, path: str) -> None:
         raise PermissionError("Please get a pre-signed url instead.")
 
+    def post_archive(self, file: UploadFile, path: str) -> int:
+        raise PermissionError("Please get a pre-signed url instead.")
+
     def post_file_url(
         self, path: str, request: Request, url_endpoint: str, files_endpoint: str
     ) -> FileHTTPRequest:
         bucket, path = self._get_bucket_path(path)
         if path[-1] != "/":
             path = path + "/"
-        ret = self.s3_client.generate_presigned_post(
-            Bucket=bucket,
-            Key=path + "${filename}",
-            Fields=None,
-            Conditions=[
-                ["starts-with", "$key", path]
-            ],  # can be used for multiple uploads to folder
-            ExpiresIn=60 * 10,
-        )
+        with S3_DURATION.labels(operation="presign_post_object").time():
+            ret = self.s3_client.generate_presigned_post(
+                Bucket=bucket,
+                Key=path + "${filename}",
+                Fields=None,
+                Conditions=[
+                    ["starts-with", "$key", path]
+                ],  # can be used for multiple uploads to folder
+                ExpiresIn=60 * 10,
+            )
         return FileHTTPRequest(
             url=ret["url"],
             method="post",
             data=ret["fields"],
         )
+
+    def _get_bucket_file_path(self, path: str) -> tuple[str, str]:
+        bucket, path = self._get_bucket_path(path)
+        if not path or path[-1] == "/":
+            raise PermissionError("Path should point to a file, not a directory")
+        return bucket, path
+
+    def create_multipart_upload(self, path: str, n_parts: int) -> MultipartUpload:
+        bucket, path = self._get_bucket_file_path(path)
+        with S3_DURATION.labels(operation="create_multipart_upload").time():
+            upload_id = self.s3_client.create_multipart_upload(Bucket=bucket, Key=path)[
+                "UploadId"
+            ]
+        with S3_DURATION.labels(operation="presign_upload_parts").time():
+            parts = [
+                FileHTTPRequest(
+                    url=self.s3_client.generate_presigned_url(
+                        "upload_part",
+                        Params={
+                            "Bucket": bucket,
+                            "Key": path,
+                            "UploadId": upload_id,
+                            "PartNumber": part_number,
+                        },
+                        ExpiresIn=60 * 60,  # parts of large files take a while
+                    ),
+                    method="put",
+                )
+                for part_number in range(1, n_parts + 1)
+            ]
+        return MultipartUpload(upload_id=upload_id, parts=parts)
+
+    def complete_multipart_upload(
+        self, path: str, upload_id: str, parts: list[MultipartUploadPart]
+    ) -> None:
+        bucket, path = self._get_bucket_file_path(path)
+        try:
+            self.s3_client.complete_multipart_upload(
+                Bucket=bucket,
+                Key=path,
+                UploadId=upload_id,
+                MultipartUpload={
+                    "Parts": [
+                        {"PartNumber": part.part_number, "ETag": part.etag}
+                        for part in sorted(parts, key=lambda part: part.part_number)
+                    ]
+                },
+            )
+        except botocore.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] == "NoSuchUpload":
+                raise FileNotFoundError()
+            raise ValueError(f"Could not complete multipart upload: {e}")
+
+    def abort_multipart_upload(self, path: str, upload_id: str) -> None:
+        bucket, path = self._get_bucket_file_path(path)
+        try:
+            self.s3_client.abort_multipart_upload(
+                Bucket=bucket, Key=path, UploadId=upload_id
+            )
+        except botocore.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] == "NoSuchUpload":
+                raise FileNotFoundError()
+            raise e
+
+    def abort_stale_multipart_uploads(self, older_than: int) -> int:
+        n_aborted = 0
+        time_limit = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(
+            seconds=older_than
+        )
+        paginator = self.s3_client.get_paginator("list_multipart_uploads")
+        for page in _timed_pages(
+            paginator.paginate(Bucket=self.bucket), "list_multipart_uploads"
+        ):
+            for upload in page.get("Uploads", []):
+                if upload["Initiated"] >= time_limit:
+                    continue
+                try:
+                    self.s3_client.abort_multipart_upload(
+                        Bucket=self.bucket,
+                        Key=upload["Key"],
+                        UploadId=upload["UploadId"],
+                    )
+                    n_aborted += 1
+                except botocore.exceptions.ClientError:
+                    pass  # completed or aborted in the meantime
+        return n_aborted
+
+
+def _timed_pages(pages: Iterable[T], operation: str) -> Iterator[T]:
+    """Measure the request of each page (not the processing of the previous one)."""
+    iterator = iter(pages)
+    while True:
+        with S3_DURATION.labels(operation=operation).time():
+            page = next(iterator, None)
+        if page is None:
+            return
+        yield page
@@ -2,30 +2,73 @@ import datetime
 import json
 import os
 import pickle
+import secrets
 import threading
 import time
 from abc import ABC, abstractmethod
 from types import TracebackType
-from typing import Any, Type
+from typing import TYPE_CHECKING, Any, Collection, Type
 
 import botocore.exceptions
 from deprecated import deprecated
 from dict_hash import sha256
-from mypy_boto3_sqs import SQSClient
-from sqlalchemy import create_engine, inspect, not_
+from sqlalchemy import (
+    case,
+    create_engine,
+    exists,
+    func,
+    inspect,
+    not_,
+    select,
+    update,
+)
 from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Query, Session
+from sqlalchemy.sql.elements import ColumnElement
 
 from workerfacing_api import settings
+from workerfacing_api.core.deadlines import DeadlineHeap
+from workerfacing_api.core.scheduling import OrderingPolicy
+from workerfacing_api.core.workers import WorkerRegistry
 from workerfacing_api.crud import job_tracking
 from workerfacing_api.exceptions import JobDeletedException, JobNotAssignedException
+from workerfacing_api.metrics import (
+    JOBS_TIMED_OUT,
+    QUEUE_CLAIM_DURATION,
+    TIMEOUT_SWEEP_DURATION,
+    instrument_engine,
+)
+from workerfacing_api.query_log import query_log
 from workerfacing_api.schemas.queue_jobs import (
     EnvironmentTypes,
+    HardwareSpecs,
     JobFilter,
     JobSpecs,
+    Lease,
+    PulledJobSpecs,
+    QueueCounts,
+    QueueStats,
     SubmittedJob,
 )
-from workerfacing_api.schemas.rds_models import Base, JobStates, QueuedJob
+from workerfacing_api.schemas.rds_models import (
+    Base,
+    JobInput,
+    JobStates,
+    QueuedJob,
+    RegisteredWorker,
+)
+from workerfacing_api.schemas.workers import WorkerInfo
+from workerfacing_api.tracing import traced_methods
+
+if TYPE_CHECKING:
+    from mypy_boto3_sqs import SQSClient
+
+IN_FLIGHT_STATES = (
+    JobStates.pulled,
+    JobStates.preprocessing,
+    JobStates.running,
+    JobStates.postprocessing,
+)
 
 
 class UpdateLock:
@@ -108,10 +151,15 @@ class JobQueue(ABC):
     def dequeue(self, hostname: str, filter: JobFilter) -> tuple[int, JobSpecs] | None:
         """Peek last element and remove it from the queue if it is older than `older_than'."""
         # get last element
+        start = time.perf_counter()
         res = self.peek(hostname=hostname, filter=filter)
+        QUEUE_CLAIM_DURATION.labels(
+            operation="peek", outcome="found" if res else "empty"
+        ).observe(time.perf_counter() - start)
         # if element found
         if res:
             id_, item, receipt_handle = res
+            start = time.perf_counter()
             successful = self.pop(
                 environment=filter.environment, receipt_handle=receipt_handle or ""
             )
@@ -121,6 +169,9 @@ class JobQueue(ABC):
                     environment=EnvironmentTypes.any,
                     receipt_handle=receipt_handle or "",
                 )
+            QUEUE_CLAIM_DURATION.labels(
+                operation="pop", outcome="won" if successful else "lost"
+            ).observe(time.perf_counter() - start)
             if successful:
                 return id_, item
             else:  # job pulled by other worker first, get another one
@@ -217,7 +268,7 @@ class LocalJobQueue(JobQueue):
 class SQSJobQueue(JobQueue):
     """SQS job queue. Not used anymore since it lacks filtering and prioritization."""
 
-    def __init__(self, sqs_client: SQSClient):
+    def __init__(self, sqs_client: "SQSClient"):
         self.sqs_client = sqs_client
         self.queue_names = {}
         for environment in EnvironmentTypes:
@@ -326,19 +377,36 @@ class SQSJobQueue(JobQueue):
         return True
 
 
+@traced_methods("queue")
 class RDSJobQueue(JobQueue):
     """Relational Database System job queue.
     Allows enhanced filtering and prioritization by not being a pure queue.
     Allows job tracking.
+    Pulled jobs are leased to their worker for `lease_duration` seconds (unless the job specifies its own),
+    and each status update (keepalive signal) renews the lease.
+    The lease expiries are mirrored in `deadlines`, for the timeout sweeper to wake when one expires.
+    The workers are tracked in `worker_registry`.
     """
 
-    def __init__(self, db_url: str, max_retries: int = 10, retry_wait: int = 60):
+    def __init__(
+        self,
+        db_url: str,
+        max_retries: int = 10,
+        retry_wait: int = 60,
+        ordering: OrderingPolicy | None = None,
+        lease_duration: int = 300,
+    ):
         self.db_url = db_url
         self.update_lock = (
             UpdateLock() if self.db_url.startswith("sqlite") else MockUpdateLock()
         )
         self.engine = self._get_engine(self.db_url, max_retries, retry_wait)
         self.table_name = QueuedJob.__tablename__
+        self.ordering = ordering or OrderingPolicy()
+        self.lease_duration = lease_duration
+        self.deadlines = DeadlineHeap()
+        self.worker_registry = WorkerRegistry()
+        self._stats: QueueStats | None = None
 
     def _get_engine(self, db_url: str, max_retries: int, retry_wait: int) -> Engine:
         retries = 0
@@ -352,6 +420,8 @@ class RDSJobQueue(JobQueue):
                         else {}
                     ),
                 )
+                instrument_engine(engine)
+                query_log.instrument(engine)
                 # Attempt to create a connection or perform any necessary operations
                 engine.connect()
                 return engine  # Connection successful
@@ -370,24 +440,38 @@ class RDSJobQueue(JobQueue):
     def delete(self) -> None:
         Base.metadata.drop_all(self.engine)
 
-    def enqueue(self, job: SubmittedJob) -> None:
+    def enqueue(
+        self, job: SubmittedJob, input_sizes: dict[str, int] | None = None
+    ) -> None:
+        """Enqueue a job, indexing its input files with their `input_sizes` (bytes) for data locality."""
+        input_sizes = input_sizes or {}
         with Session(self.engine) as session:
-            session.add(
-                QueuedJob(
-                    job=job.job.model_dump(),
-                    paths_upload=job.paths_upload.model_dump(),
-                    environment=job.environment.value,
-                    # None values in the resource requirements will make any puller match
-                    cpu_cores=job.job.hardware.cpu_cores,
-                    memory=job.job.hardware.memory,
-                    gpu_model=job.job.hardware.gpu_model,
-                    gpu_archi=job.job.hardware.gpu_archi,
-                    gpu_mem=job.job.hardware.gpu_mem,
-                    group=job.group,  # TODO: still to add to job model
-                    priority=job.priority,
-                    status=JobStates.queued.value,
-                )
+            queued_job = QueuedJob(
+                job=job.job.model_dump(),
+                paths_upload=job.paths_upload.model_dump(),
+                environment=job.environment.value,
+                # None values in the resource requirements will make any puller match
+                cpu_cores=job.job.hardware.cpu_cores,
+                memory=job.job.hardware.memory,
+                gpu_model=job.job.hardware.gpu_model,
+                gpu_archi=job.job.hardware.gpu_archi,
+                gpu_mem=job.job.hardware.gpu_mem,
+                group=job.group,  # TODO: still to add to job model
+                priority=job.priority,
+                image=job.job.handler.image,
+                lease_duration=job.lease_duration,
+                status=JobStates.queued.value,
             )
+            session.add(queued_job)
+            session.flush()  # get the job id
+            for path in set((job.job.handler.files_down or {}).values()):
+                session.add(
+                    JobInput(
+                        job_id=queued_job.id,
+                        path=path,
+                        size=input_sizes.get(path, 0),
+                    )
+                )
             session.commit()
 
     def peek(
@@ -429,10 +513,7 @@ class RDSJobQueue(JobQueue):
                 if settings.retry_different:
                     # only if worker did not already try running this job
                     query = query.filter(not_(QueuedJob.workers.contains(hostname)))
-                query = query.order_by(QueuedJob.priority.desc()).order_by(
-                    QueuedJob.creation_timestamp.asc()
-                )
-                ret = query.first()
+                ret = self.ordering.order(query, self._affinity(filter)).first()
                 if ret is not None:
                     assert isinstance(ret, QueuedJob)
                 return ret
@@ -442,12 +523,89 @@ class RDSJobQueue(JobQueue):
             if job is None:
                 job = filter_sort_query(query)
             if job:
-                return job.id, JobSpecs(**job.job), json.dumps((job.id, hostname))
+                # the lease only starts when popping, so it is returned with an earlier expiry
+                lease = Lease(
+                    token=secrets.token_urlsafe(16),
+                    expires_at=datetime.datetime.now(datetime.timezone.utc)
+                    + datetime.timedelta(seconds=self._lease_duration(job)),
+                )
+                specs = PulledJobSpecs(**job.job, lease=lease)
+                specs._paths_upload = job.paths_upload
+                return (
+                    job.id,
+                    specs,
+                    json.dumps((job.id, hostname, lease.token)),
+                )
         return None
 
+    def _lease_duration(self, job: QueuedJob) -> int:
+        return job.lease_duration or self.lease_duration
+
+    def _affinity(self, filter: JobFilter) -> list[ColumnElement[Any]]:
+        """Worker-specific ordering within a priority.
+
+        Jobs with the most bytes of input files cached by the worker come first,
+        unless the other jobs have been waiting for longer than `settings.data_locality_wait`.
+        Then, jobs whose image is cached by the worker come first,
+        unless the other jobs have been waiting for longer than `settings.image_affinity_wait`.
+        """
+        time_now = datetime.datetime.now(datetime.timezone.utc)
+        affinity: list[ColumnElement[Any]] = []
+        if filter.cached_files:
+            local_bytes = (
+                select(func.coalesce(func.sum(JobInput.size), 0))
+                .where(
+                    JobInput.job_id == QueuedJob.id,
+                    JobInput.path.in_(filter.cached_files),
+                )
+                .scalar_subquery()
+            )
+            cutoff = time_now - datetime.timedelta(seconds=settings.data_locality_wait)
+            affinity.append(
+                case(
+                    # as if all its inputs were local
+                    (QueuedJob.creation_timestamp < cutoff, 2**62),
+                    else_=local_bytes,
+                ).desc()
+            )
+        if filter.images:
+            cutoff = time_now - datetime.timedelta(seconds=settings.image_affinity_wait)
+            affinity.append(
+                case(
+                    (QueuedJob.image.in_(filter.images), 0),
+                    (QueuedJob.creation_timestamp < cutoff, 0),
+                    else_=1,
+                ).asc()
+            )
+        return affinity
+
+    def dequeue_packed(
+        self, hostname: str, filter: JobFilter, limit: int
+    ) -> list[tuple[int, JobSpecs]]:
+        """Dequeue up to `limit` jobs whose summed requirements fit in the capacity of `filter`.
+
+        Greedy packing in queue order: the first job fitting the remaining capacity is taken each time.
+        Jobs not specifying their cpu cores are counted as needing one.
+        """
+        jobs: list[tuple[int, JobSpecs]] = []
+        while len(jobs) < limit and filter.cpu_cores >= 1:
+            res = self.dequeue(hostname=hostname, filter=filter)
+            if res is None:
+                break
+            jobs.append(res)
+            hardware = res[1].hardware
+            filter = filter.model_copy(
+                update={
+                    "cpu_cores": filter.cpu_cores - (hardware.cpu_cores or 1),
+                    "memory": filter.memory - (hardware.memory or 0),
+                    "gpu_mem": filter.gpu_mem - (hardware.gpu_mem or 0),
+                }
+            )
+        return jobs
+
     def pop(self, environment: EnvironmentTypes, receipt_handle: str) -> bool:
         with self.update_lock:
-            job_id, hostname = json.loads(receipt_handle)
+            job_id, hostname, lease_token = json.loads(receipt_handle)
             with Session(self.engine) as session:
                 try:
                     job = self.get_job(job_id, session, lock=True)
@@ -456,6 +614,8 @@ class RDSJobQueue(JobQueue):
                 if job.status != JobStates.queued.value:
                     return False
                 job.workers = ";".join(job.workers.split(";") + [hostname])
+                job.lease_token = lease_token
+                self.ordering.on_claim(session, job)
                 try:
                     self._update_job_status(session, job, status=JobStates.pulled)
                 except JobDeletedException:
@@ -469,11 +629,12 @@ class RDSJobQueue(JobQueue):
         session: Session | None = None,
         lock: bool = False,
         hostname: str | None = None,
+        lease_token: str | None = None,
     ) -> QueuedJob:
         """Get job information, not necessarily in queue."""
         if not session:
             with Session(self.engine) as session:
-                return self.get_job(job_id, session, lock, hostname)
+                return self.get_job(job_id, session, lock, hostname, lease_token)
         res = session.query(QueuedJob).filter(QueuedJob.id == job_id)
         if lock:
             res = res.with_for_update(of=QueuedJob, nowait=True)
@@ -488,6 +649,10 @@ class RDSJobQueue(JobQueue):
                 raise JobNotAssignedException(
                     f"Job with id {job_id} is not assigned to worker {hostname}"
                 )
+        if lease_token and lease_token != job.lease_token:
+            raise JobNotAssignedException(
+                f"Job with id {job_id} is not leased with this token (lease might have expired)"
+            )
         return job
 
     def _update_job_status(
@@ -497,17 +662,31 @@ class RDSJobQueue(JobQueue):
         status: JobStates,
         runtime_details: str | None = None,
     ) -> None:
-        """Internal job status update handler."""
+        """Internal job status update handler, renewing or releasing the lease."""
+        time_now = datetime.datetime.now(datetime.timezone.utc)
         job.status = status.value
-        job.last_updated = datetime.datetime.now(datetime.timezone.utc)
+        job.last_updated = time_now
+        if status in IN_FLIGHT_STATES:
+            job.lease_expires_at = time_now + datetime.timedelta(
+                seconds=self._lease_duration(job)
+            )
+        else:
+            job.lease_token = None
+            job.lease_expires_at = None
         session.add(job)
         session.commit()
+        if job.lease_expires_at is not None:
+            self.deadlines.set(job.id, _timestamp(job.lease_expires_at))
+        else:
+            self.deadlines.discard(job.id)
         try:
             job_id = job.job["meta"]["job_id"]
             assert isinstance(job_id, int)
             job_tracking.update_job(job_id, status, runtime_details)
         except JobDeletedException as e:
             # job probably deleted by user
+            self.deadlines.discard(job.id)
+            session.query(JobInput).filter(JobInput.job_id == job.id).delete()
             session.delete(job)
             session.commit()
             raise e from e
@@ -518,55 +697,238 @@ class RDSJobQueue(JobQueue):
         status: JobStates,
         runtime_details: str | None = None,
         hostname: str | None = None,
+        lease_token: str | None = None,
     ) -> None:
         """External entrypoint for job status updates by workers."""
         with Session(self.engine) as session:
-            job = self.get_job(job_id, session, lock=True, hostname=hostname)
+            job = self.get_job(
+                job_id, session, lock=True, hostname=hostname, lease_token=lease_token
+            )
             self._update_job_status(session, job, status, runtime_details)
 
-    def handle_timeouts(
-        self, max_retries: int, timeout_failure: int
-    ) -> tuple[int, int]:
-        """Handle a timeout (keepalive signal not received for a long time)."""
+    def decay_usage(self, now: float | None = None) -> None:
+        """Decay the recent consumption tracked by the ordering policy."""
+        with Session(self.engine) as session:
+            self.ordering.decay(session, time.time() if now is None else now)
+
+    def load_deadlines(self, job_ids: Collection[int] | None = None) -> None:
+        """Load the lease expiries of the jobs in flight (or only of `job_ids`) into `deadlines`,
+        e.g. on startup, or for leases renewed by other processes.
+        """
+        query = select(QueuedJob.id, QueuedJob.lease_expires_at).where(
+            QueuedJob.lease_expires_at.is_not(None)
+        )
+        if job_ids is not None:
+            query = query.where(QueuedJob.id.in_(job_ids))
+        with Session(self.engine) as session:
+            deadlines = {
+                job_id: _timestamp(expires_at)
+                for job_id, expires_at in session.execute(query)
+            }
+        if job_ids is None:
+            self.deadlines.reset(deadlines)
+            return
+        for job_id in job_ids:
+            if job_id in deadlines:
+                self.deadlines.set(job_id, deadlines[job_id])
+            else:
+                self.deadlines.discard(job_id)
+
+    def get_stats(self, max_age: float = 0) -> QueueStats:
+        """Job counts, from a snapshot refreshed if older than `max_age` seconds."""
+        stats = self._stats
+        if (
+            stats is None
+            or (
+                datetime.datetime.now(datetime.timezone.utc) - stats.refreshed_at
+            ).total_seconds()
+            > max_age
+        ):
+            stats = self._stats = self._count_jobs()
+        return stats
+
+    def _count_jobs(self) -> QueueStats:
+        hardware = case(
+            (
+                QueuedJob.gpu_model.is_not(None)
+                | QueuedJob.gpu_archi.is_not(None)
+                | (QueuedJob.gpu_mem > 0),
+                "gpu",
+            ),
+            else_="cpu",
+        )
+        columns = (QueuedJob.status, QueuedJob.environment, QueuedJob.group, hardware)
+        refreshed_at = datetime.datetime.now(datetime.timezone.utc)
+        with Session(self.engine) as session:
+            rows = session.execute(
+                select(*columns, func.count()).group_by(*columns)
+            ).all()
+            oldest_queued_at = session.scalar(
+                select(func.min(QueuedJob.creation_timestamp)).where(
+                    QueuedJob.status == JobStates.queued.value
+                )
+            )
+        by_status: dict[str, QueueCounts] = {}
+        for status, environment, group, hardware_class, count in rows:
+            counts = by_status.setdefault(status, QueueCounts())
+            counts.total += count
+            for breakdown, key in (
+                (counts.by_environment, environment or EnvironmentTypes.any.name),
+                (counts.by_group, group or ""),
+                (counts.by_hardware, hardware_class),
+            ):
+                breakdown[key] = breakdown.get(key, 0) + count
+        return QueueStats(
+            by_status=by_status,
+            oldest_queued_at=(
+                None
+                if oldest_queued_at is None
+                else datetime.datetime.fromtimestamp(
+                    _timestamp(oldest_queued_at), datetime.timezone.utc
+                )
+            ),
+            refreshed_at=refreshed_at,
+        )
+
+    def flush_workers(self) -> int:
+        """Write the buffered worker sightings to the registry."""
+        with Session(self.engine) as session:
+            return self.worker_registry.flush(session)
+
+    def get_workers(self, active_within: int) -> list[WorkerInfo]:
+        """Workers seen in the last `active_within` seconds."""
+        with Session(self.engine) as session:
+            workers = session.scalars(
+                select(RegisteredWorker)
+                .where(RegisteredWorker.last_seen >= self._seen_after(active_within))
+                .order_by(RegisteredWorker.hostname, RegisteredWorker.instance_id)
+            )
+            return [
+                WorkerInfo(
+                    hostname=worker.hostname,
+                    instance_id=worker.instance_id,
+                    environment=worker.environment,
+                    slots=worker.slots,
+                    hardware=HardwareSpecs(
+                        cpu_cores=worker.cpu_cores,
+                        memory=worker.memory,
+                        gpu_model=worker.gpu_model,
+                        gpu_archi=worker.gpu_archi,
+                        gpu_mem=worker.gpu_mem,
+                    ),
+                    last_seen=worker.last_seen,
+                )
+                for worker in workers
+            ]
+
+    def get_unschedulable_jobs(self, active_within: int) -> list[int]:
+        """Queued jobs that none of the workers seen in the last `active_within` seconds could pull
+        (requirements matched as in `peek`, with the largest resources reported by each worker).
+        """
+        worker = RegisteredWorker
+        schedulable = exists().where(
+            worker.last_seen >= self._seen_after(active_within),
+            QueuedJob.environment.is_(None)
+            | (QueuedJob.environment == worker.environment),
+            QueuedJob.cpu_cores.is_(None) | (QueuedJob.cpu_cores <= worker.cpu_cores),
+            QueuedJob.memory.is_(None) | (QueuedJob.memory <= worker.memory),
+            QueuedJob.gpu_model.is_(None) | (QueuedJob.gpu_model == worker.gpu_model),
+            QueuedJob.gpu_archi.is_(None) | (QueuedJob.gpu_archi == worker.gpu_archi),
+            QueuedJob.gpu_mem.is_(None) | (QueuedJob.gpu_mem <= worker.gpu_mem),
+        )
+        with Session(self.engine) as session:
+            return list(
+                session.scalars(
+                    select(QueuedJob.id)
+                    .where(QueuedJob.status == JobStates.queued.value, ~schedulable)
+                    .order_by(QueuedJob.id)
+                )
+            )
+
+    @staticmethod
+    def _seen_after(active_within: int) -> datetime.datetime:
+        return datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(
+            seconds=active_within
+        )
+
+    @TIMEOUT_SWEEP_DURATION.time()
+    def handle_timeouts(self, max_retries: int) -> tuple[int, int]:
+        """Handle a timeout (lease expired, i.e. keepalive signal not received for a long time).
+
+        Safe to run concurrently, e.g. by all processes woken by the same expiry:
+        each expired lease is released by a single conditional update, by one of them.
+        """
         n_retry, n_failed = 0, 0
         time_now = datetime.datetime.now(datetime.timezone.utc)
         with Session(self.engine) as session:
-            jobs_timeout = session.query(QueuedJob).filter(
-                (QueuedJob.status == JobStates.pulled.value)
-                | (QueuedJob.status == JobStates.preprocessing.value)
-                | (QueuedJob.status == JobStates.running.value)
-                | (QueuedJob.status == JobStates.postprocessing.value),
-                (
-                    QueuedJob.last_updated
-                    < time_now - datetime.timedelta(seconds=timeout_failure)
-                ),
+            # only jobs in flight hold a lease
+            expired = session.execute(
+                select(QueuedJob.id, QueuedJob.lease_token).where(
+                    QueuedJob.lease_expires_at < time_now
+                )
+            ).all()
+        errors = []
+        for job_id, lease_token in expired:
+            try:
+                status = self._expire_lease(job_id, lease_token, time_now, max_retries)
+            except JobDeletedException:
+                # job probably deleted by user, skip updating status
+                continue
+            except Exception as e:
+                # e.g. the user-facing API failing, after the job was updated
+                errors.append(e)
+                continue
+            if status == JobStates.queued:
+                n_retry += 1
+            elif status == JobStates.error:
+                n_failed += 1
+        JOBS_TIMED_OUT.labels(outcome="requeued").inc(n_retry)
+        JOBS_TIMED_OUT.labels(outcome="failed").inc(n_failed)
+        if errors:
+            raise errors[0]
+        return n_retry, n_failed
+
+    def _expire_lease(
+        self,
+        job_id: int,
+        lease_token: str | None,
+        time_now: datetime.datetime,
+        max_retries: int,
+    ) -> JobStates | None:
+        """Re-queue or fail a job if its lease is still the expired one, else return None."""
+        with Session(self.engine) as session:
+            # releases the lease unless renewed, re-pulled or already released since,
+            # waiting for (then re-checking against) concurrent updates of the job
+            released = session.execute(
+                update(QueuedJob)
+                .where(
+                    QueuedJob.id == job_id,
+                    QueuedJob.lease_token.is_not_distinct_from(lease_token),
+                    QueuedJob.lease_expires_at < time_now,
+                )
+                .values(lease_token=None, lease_expires_at=None)
+                .execution_options(synchronize_session=False)
             )
-            jobs_retry = jobs_timeout.filter(QueuedJob.num_retries < max_retries)
-            for job in jobs_retry:
+            if released.rowcount != 1:
+                session.rollback()
+                return None
+            job = session.get(QueuedJob, job_id)
+            assert job is not None
+            if job.num_retries < max_retries:
                 # TODO: increase priority?
                 job.num_retries += 1
-                session.add(job)
-                try:
-                    self.update_job_status(
-                        job.id,
-                        JobStates.queued,
-                        f"timeout {job.num_retries} (workers tried: {job.workers})",
-                    )
-                    n_retry += 1
-                except JobDeletedException:
-                    # job probably deleted by user, skip updating status
-                    pass
-            jobs_failed = jobs_timeout.filter(QueuedJob.num_retries >= max_retries)
-            for job in jobs_failed:
-                try:
-                    self.update_job_status(
-                        job.id,
-                        JobStates.error,
-                        "max retries reached",
-                    )
-                    n_failed += 1
-                except JobDeletedException:
-                    # job probably deleted by user, skip updating status
-                    pass
-            session.commit()
-        return n_retry, n_failed
+                status, details = (
+                    JobStates.queued,
+                    f"timeout {job.num_retries} (workers tried: {job.workers})",
+                )
+            else:
+                status, details = JobStates.error, "max retries reached"
+            self._update_job_status(session, job, status, details)
+        return status
+
+
+def _timestamp(value: datetime.datetime) -> float:
+    # naive datetimes from the database are in UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.timestamp()
@@ -0,0 +1,177 @@
+import time
+from typing import Any, Sequence
+
+from sqlalchemy import func, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Query, Session
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.types import Float
+
+from workerfacing_api.schemas.rds_models import (
+    BEST_FIT_REQUIREMENTS,
+    GroupUsage,
+    QueuedJob,
+)
+
+
+class epoch(FunctionElement[float]):
+    """Seconds since the Unix epoch of a (naive UTC) timestamp column."""
+
+    type = Float()
+    inherit_cache = True
+
+
+@compiles(epoch, "sqlite")
+def _epoch_sqlite(element: epoch, compiler: Any, **kw: Any) -> str:
+    return f"((julianday({compiler.process(element.clauses, **kw)}) - 2440587.5) * 86400.0)"
+
+
+@compiles(epoch)
+def _epoch_default(element: epoch, compiler: Any, **kw: Any) -> str:
+    return f"EXTRACT(EPOCH FROM {compiler.process(element.clauses, **kw)})"
+
+
+class OrderingPolicy:
+    """
+    Order in which the queued jobs matching a worker are pulled, applied inside the claim query.
+    Default: highest priority first, then oldest first.
+    With `aging` > 0, jobs gain one priority point per `aging` seconds waited,
+    so that long-waiting jobs are not starved by newer jobs of higher priority.
+    With `best_fit`, jobs of the same priority (band of one point with aging) are ordered
+    by decreasing requirements (GPU, gpu memory, memory, cpu cores): since all matching jobs fit,
+    the ones closest to the worker's capacity come first, keeping small jobs for small workers.
+    Worker-specific `affinity` terms (e.g. cached images) order the jobs of a same priority
+    (band), before best fit.
+    """
+
+    def __init__(self, aging: float = 0, best_fit: bool = False):
+        self.aging = aging
+        self.best_fit = best_fit
+
+    def _priority(self) -> ColumnElement[Any]:
+        """Priority of the jobs, highest first."""
+        if self.aging > 0:
+            # priority + age / aging, up to a term that is constant within the query
+            return QueuedJob.priority - epoch(QueuedJob.creation_timestamp) / self.aging
+        return QueuedJob.priority.expression
+
+    @property
+    def _integer_priority(self) -> bool:
+        return self.aging == 0
+
+    def _priority_order(
+        self, affinity: Sequence[ColumnElement[Any]] = ()
+    ) -> list[ColumnElement[Any]]:
+        priority = self._priority()
+        if not self.best_fit and not affinity:
+            return [priority.desc(), QueuedJob.creation_timestamp.asc()]
+        if not self._integer_priority:
+            # bands [k, k + 1), floor agrees across backends (CAST truncates or rounds)
+            priority = func.floor(priority)
+        order = [priority.desc(), *affinity]
+        if self.best_fit:
+            order += [requirement.desc() for requirement in BEST_FIT_REQUIREMENTS]
+        return order + [QueuedJob.creation_timestamp.asc()]
+
+    def order(
+        self, query: Query[QueuedJob], affinity: Sequence[ColumnElement[Any]] = ()
+    ) -> Query[QueuedJob]:
+        """Sort the claim query, with the worker-specific `affinity` terms within a priority."""
+        return query.order_by(*self._priority_order(affinity))
+
+    def on_claim(self, session: Session, job: QueuedJob) -> None:
+        """Called in the transaction pulling the job."""
+        pass
+
+    def decay(self, session: Session, now: float) -> None:
+        """Called periodically, possibly by several processes, `now` being the current Unix time."""
+        pass
+
+
+class FairSharePolicy(OrderingPolicy):
+    """
+    Jobs lose `usage_weight` priority points per unit of recent consumption of their group,
+    then are ordered as in `OrderingPolicy` by this priority:
+    a higher priority outweighs a heavier consumption of the group, up to the weight.
+    Consumption is the number of jobs pulled per group (jobs without group form a group),
+    maintained incrementally in a usage table and halved every `half_life` seconds.
+    The time of the last decay is stored per group, so that each decay applies the time elapsed since,
+    whichever process runs it and however often.
+    """
+
+    def __init__(
+        self,
+        aging: float = 0,
+        best_fit: bool = False,
+        half_life: float = 60 * 60,
+        usage_weight: float = 1,
+    ):
+        super().__init__(aging, best_fit)
+        self.half_life = half_life
+        self.usage_weight = usage_weight
+
+    def _priority(self) -> ColumnElement[Any]:
+        return super()._priority() - self.usage_weight * func.coalesce(
+            GroupUsage.usage, 0.0
+        )
+
+    @property
+    def _integer_priority(self) -> bool:
+        return False
+
+    def order(
+        self, query: Query[QueuedJob], affinity: Sequence[ColumnElement[Any]] = ()
+    ) -> Query[QueuedJob]:
+        query = query.outerjoin(
+            GroupUsage, GroupUsage.group == func.coalesce(QueuedJob.group, "")
+        )
+        return query.order_by(*self._priority_order(affinity))
+
+    def on_claim(self, session: Session, job: QueuedJob) -> None:
+        insert = (
+            postgresql.insert
+            if session.get_bind().dialect.name == "postgresql"
+            else sqlite.insert
+        )
+        stmt = insert(GroupUsage).values(
+            group=job.group or "", usage=1.0, decayed_at=time.time()
+        )
+        session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[GroupUsage.group],
+                set_={"usage": GroupUsage.usage + 1.0},
+            )
+        )
+
+    def decay(self, session: Session, now: float) -> None:
+        session.execute(
+            update(GroupUsage)
+            .where(GroupUsage.decayed_at < now)
+            .values(
+                usage=GroupUsage.usage
+                * func.pow(0.5, (now - GroupUsage.decayed_at) / self.half_life),
+                decayed_at=now,
+            )
+        )
+        session.commit()
+
+
+def get_ordering_policy(
+    name: str,
+    aging: float = 0,
+    best_fit: bool = False,
+    half_life: float = 60 * 60,
+    usage_weight: float = 1,
+) -> OrderingPolicy:
+    if name == "priority":
+        return OrderingPolicy(aging=aging, best_fit=best_fit)
+    elif name == "fair_share":
+        return FairSharePolicy(
+            aging=aging,
+            best_fit=best_fit,
+            half_life=half_life,
+            usage_weight=usage_weight,
+        )
+    raise ValueError(f"Invalid queue ordering {name}")
@@ -0,0 +1,115 @@
+import threading
+from typing import Any, TypeVar
+
+from sqlalchemy import case, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import ColumnElement
+
+from workerfacing_api.schemas.queue_jobs import HardwareSpecs
+from workerfacing_api.schemas.rds_models import RegisteredWorker
+from workerfacing_api.schemas.workers import WorkerInfo
+
+T = TypeVar("T")
+
+_RESOURCES = ("cpu_cores", "memory", "gpu_mem")
+
+
+class WorkerRegistry:
+    """
+    Registry of the workers, from their pulls and keepalive signals.
+    Sightings are buffered in process and written to the database in batches by `flush`,
+    instead of once per request.
+    Resources only grow per worker, since pulls report the free capacity when packing:
+    the registry converges to the capacity of each worker.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.pending: dict[tuple[str, str], WorkerInfo] = {}
+
+    def seen(self, worker: WorkerInfo) -> None:
+        key = (worker.hostname, worker.instance_id)
+        with self.lock:
+            previous = self.pending.get(key)
+            self.pending[key] = worker if previous is None else _merge(previous, worker)
+
+    def flush(self, session: Session) -> int:
+        """Upsert the buffered sightings, returning their number."""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return 0
+        insert = (
+            postgresql.insert
+            if session.get_bind().dialect.name == "postgresql"
+            else sqlite.insert
+        )
+        stmt = insert(RegisteredWorker).values(
+            [
+                {
+                    "hostname": worker.hostname,
+                    "instance_id": worker.instance_id,
+                    "environment": worker.environment,
+                    "slots": worker.slots,
+                    **worker.hardware.model_dump(),
+                    "last_seen": worker.last_seen,
+                }
+                for worker in pending.values()
+            ]
+        )
+        excluded = stmt.excluded
+        session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[
+                    RegisteredWorker.hostname,
+                    RegisteredWorker.instance_id,
+                ],
+                set_={
+                    **{
+                        name: func.coalesce(
+                            excluded[name], RegisteredWorker.__table__.c[name]
+                        )
+                        for name in ("environment", "slots", "gpu_model", "gpu_archi")
+                    },
+                    **{
+                        name: _greatest(
+                            excluded[name], RegisteredWorker.__table__.c[name]
+                        )
+                        for name in (*_RESOURCES, "last_seen")
+                    },
+                },
+            )
+        )
+        session.commit()
+        return len(pending)
+
+
+def _merge(previous: WorkerInfo, worker: WorkerInfo) -> WorkerInfo:
+    def latest(old: T | None, new: T | None) -> T | None:
+        return old if new is None else new
+
+    hardware: dict[str, Any] = {
+        name: latest(getattr(previous.hardware, name), getattr(worker.hardware, name))
+        for name in ("gpu_model", "gpu_archi")
+    }
+    for name in _RESOURCES:
+        values = [
+            v
+            for v in (getattr(previous.hardware, name), getattr(worker.hardware, name))
+            if v is not None
+        ]
+        hardware[name] = max(values, default=None)
+    return WorkerInfo(
+        hostname=worker.hostname,
+        instance_id=worker.instance_id,
+        environment=latest(previous.environment, worker.environment),
+        slots=latest(previous.slots, worker.slots),
+        hardware=HardwareSpecs(**hardware),
+        last_seen=max(previous.last_seen, worker.last_seen),
+    )
+
+
+def _greatest(new: ColumnElement[Any], old: ColumnElement[Any]) -> ColumnElement[Any]:
+    # NULL if both are
+    return case((old.is_(None), new), (new > old, new), else_=old)
@@ -1,8 +1,12 @@
+import time
+
 import requests
 from fastapi.encoders import jsonable_encoder
 
 import workerfacing_api.settings as settings
+from workerfacing_api import tracing
 from workerfacing_api.exceptions import JobDeletedException
+from workerfacing_api.metrics import JOB_TRACKING_DURATION
 from workerfacing_api.schemas.rds_models import JobStates
 
 
@@ -14,11 +18,25 @@ def update_job(
         "status": job_status.value,
         "runtime_details": runtime_details or "",
     }
-    resp = requests.put(
-        url=f"{settings.get_userfacing_api_url()}/_job_status",
-        json=jsonable_encoder(body),
-        headers={"x-api-key": settings.internal_api_key_secret},
-    )
+    headers = {"x-api-key": settings.internal_api_key_secret}
+    start = time.perf_counter()
+    status_code = "error"
+    with tracing.span("userfacing_api.update_job", kind="client") as span:
+        if span is not None:
+            headers["traceparent"] = span.traceparent
+        try:
+            resp = requests.put(
+                url=f"{settings.get_userfacing_api_url()}/_job_status",
+                json=jsonable_encoder(body),
+                headers=headers,
+            )
+            status_code = str(resp.status_code)
+        finally:
+            JOB_TRACKING_DURATION.labels(status_code=status_code).observe(
+                time.perf_counter() - start
+            )
+            if span is not None:
+                span.attributes["http.status_code"] = status_code
     if resp.status_code == 404:
         raise JobDeletedException(
             f"Job {job_id} not found; it was probably deleted by the user."
@@ -1,24 +1,74 @@
-from typing import Any
+"""Dependencies of the endpoints.
+
+Importing this module does no I/O and does not import the slow AWS and authentication libraries:
+the queue (connecting to the database, which can be retried for minutes, and creating the tables),
+the S3 client and the worker authentication (fetching the keys of the user pool) are set up
+on first use, or concurrently on startup (see `setup_steps` and `workerfacing_api.startup`).
+The checksum index of the local filesystem (a SQLite file) is created on first use too.
+"""
+
+import asyncio
+import functools
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Generic, TypeVar
 
-import boto3
-from botocore.config import Config
-from botocore.utils import fix_s3_host
 from fastapi import Depends, Header, HTTPException, Request
-from fastapi.security import HTTPAuthorizationCredentials
-from fastapi_cloudauth.cognito import CognitoClaims, CognitoCurrentUser  # type: ignore
-from pydantic import Field
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
 from workerfacing_api import settings
-from workerfacing_api.core import filesystem, queue
+from workerfacing_api.core import checksums, file_cache, filesystem, queue, scheduling
+from workerfacing_api.schemas.auth import GroupClaims
+
+if TYPE_CHECKING:
+    from mypy_boto3_s3 import S3Client
+
+    from workerfacing_api.cognito import WorkerGroupCognitoCurrentUser
+
+T = TypeVar("T")
+
+
+class LazyResource(Generic[T]):
+    """Resource created on first use, once, even if first used by several threads at once."""
+
+    def __init__(self, create: Callable[[], T]):
+        self.create = create
+        self.lock = threading.Lock()
+        self._value: T | None = None
+
+    @property
+    def ready(self) -> bool:
+        return self._value is not None
+
+    def get(self) -> T:
+        if self._value is None:
+            with self.lock:
+                if self._value is None:  # not created while waiting for the lock
+                    self._value = self.create()
+        return self._value
+
 
 # Queue
-queue_db_url = settings.queue_db_url
-queue_ = queue.RDSJobQueue(queue_db_url)
-queue_.create(err_on_exists=False)
+def _create_queue() -> queue.RDSJobQueue:
+    job_queue = queue.RDSJobQueue(
+        settings.queue_db_url,
+        ordering=scheduling.get_ordering_policy(
+            settings.queue_ordering,
+            aging=settings.priority_aging,
+            best_fit=settings.queue_best_fit,
+            half_life=settings.fair_share_half_life,
+            usage_weight=settings.fair_share_usage_weight,
+        ),
+        lease_duration=settings.timeout_failure,
+    )
+    job_queue.create(err_on_exists=False)
+    return job_queue
+
+
+queue_ = LazyResource(_create_queue)
 
 
 def queue_dep() -> queue.RDSJobQueue:
-    return queue_
+    return queue_.get()
 
 
 # App-internal authentication (i.e. user-facing API <-> worker-facing API)
@@ -37,54 +87,133 @@ authorizer = APIKeyDependency(key=settings.internal_api_key_secret)
 
 
 # Worker authentication
-class GroupClaims(CognitoClaims):  # type: ignore
-    cognito_groups: list[str] | None = Field(alias="cognito:groups")
-
+class WorkerAuthDependency:
+    """Cognito ID tokens of members of the "workers" group, verified with the keys of the user pool."""
+
+    def __init__(
+        self,
+        region: str,
+        user_pool_id: str | None,
+        client_id: str | None,
+    ):
+        self.verifier: LazyResource["WorkerGroupCognitoCurrentUser"] = LazyResource(
+            functools.partial(self._create_verifier, region, user_pool_id, client_id)
+        )
 
-class WorkerGroupCognitoCurrentUser(CognitoCurrentUser):  # type: ignore
-    user_info = GroupClaims
+    @staticmethod
+    def _create_verifier(
+        region: str,
+        user_pool_id: str | None,
+        client_id: str | None,
+    ) -> "WorkerGroupCognitoCurrentUser":
+        from workerfacing_api.cognito import WorkerGroupCognitoCurrentUser
+
+        return WorkerGroupCognitoCurrentUser(
+            region=region,
+            userPoolId=user_pool_id,
+            client_id=client_id,
+        )
 
-    async def call(self, http_auth: HTTPAuthorizationCredentials) -> Any:
-        user_info = await super().call(http_auth)
-        if "workers" not in (getattr(user_info, "cognito_groups") or []):
-            raise HTTPException(
-                status_code=403, detail="Not a member of the 'workers' group"
-            )
+    def setup(self) -> None:
+        self.verifier.get()
+
+    async def __call__(
+        self,
+        http_auth: HTTPAuthorizationCredentials | None = Depends(
+            HTTPBearer(auto_error=False)
+        ),
+    ) -> GroupClaims:
+        if http_auth is None:
+            raise HTTPException(status_code=401, detail="Not authenticated")
+        if not self.verifier.ready:
+            await asyncio.to_thread(self.setup)
+        user_info: GroupClaims = await self.verifier.get()(http_auth)
         return user_info
 
 
-current_user_dep = WorkerGroupCognitoCurrentUser(
+current_user_dep = WorkerAuthDependency(
     region=settings.cognito_region,
-    userPoolId=settings.cognito_user_pool_id,
+    user_pool_id=settings.cognito_user_pool_id,
     client_id=settings.cognito_client_id,
 )
 
 
 async def current_user_global_dep(
-    request: Request, current_user: CognitoClaims = Depends(current_user_dep)
-) -> CognitoClaims:
+    request: Request, current_user: GroupClaims = Depends(current_user_dep)
+) -> GroupClaims:
     request.state.current_user = current_user
     return current_user
 
 
 # Files
+file_cache_ = (
+    file_cache.FileCache(
+        settings.file_cache_size,
+        settings.file_cache_max_file_size,
+        use_mmap=settings.file_cache_mmap,
+    )
+    if settings.file_cache_size > 0
+    else None
+)
+
+
+def file_cache_dep() -> file_cache.FileCache | None:
+    return file_cache_
+
+
+def _create_s3_client() -> "S3Client":
+    # clients are thread-safe and slow to create (as boto3 to import), shared by the requests
+    import boto3
+    from botocore.config import Config
+    from botocore.utils import fix_s3_host
+
+    s3_client = boto3.client(
+        "s3",
+        region_name=settings.s3_region,
+        config=Config(signature_version="v4", s3={"addressing_style": "path"}),
+    )
+    # this and config=... required to avoid DNS problems with new buckets
+    s3_client.meta.events.unregister("before-sign.s3", fix_s3_host)
+    return s3_client
+
+
+s3_client_ = LazyResource(_create_s3_client)
+
+
+def _create_checksum_index() -> checksums.ChecksumIndex:
+    return checksums.ChecksumIndex(settings.checksum_index_path)
+
+
+# only used (and created) by the local filesystem
+checksum_index_ = LazyResource(_create_checksum_index)
+
+
 async def filesystem_dep() -> filesystem.FileSystem:
     if settings.filesystem == "s3":
-        s3_client = boto3.client(
-            "s3",
-            region_name=settings.s3_region,
-            config=Config(signature_version="v4", s3={"addressing_style": "path"}),
-        )
-        # this and config=... required to avoid DNS problems with new buckets
-        s3_client.meta.events.unregister("before-sign.s3", fix_s3_host)
         if settings.s3_bucket is None:
             raise ValueError("S3 bucket not configured")
-        return filesystem.S3Filesystem(s3_client, settings.s3_bucket)
+        if not s3_client_.ready:
+            await asyncio.to_thread(s3_client_.get)
+        return filesystem.S3Filesystem(s3_client_.get(), settings.s3_bucket)
     elif settings.filesystem == "local":
         if settings.user_data_root_path is None:
             raise ValueError("Local filesystem requires user_data_root_path")
         return filesystem.LocalFilesystem(
-            settings.user_data_root_path, settings.user_data_root_path
+            settings.user_data_root_path,
+            settings.user_data_root_path,
+            checksum_index=checksum_index_.get(),
+            file_cache=file_cache_,
         )
     else:
         raise ValueError("Invalid filesystem setting")
+
+
+def setup_steps() -> dict[str, Callable[[], Any]]:
+    """The slow steps of setting up the dependencies, to run concurrently on startup."""
+    steps: dict[str, Callable[[], Any]] = {
+        "queue": queue_.get,
+        "auth": current_user_dep.setup,
+    }
+    if settings.filesystem == "s3":
+        steps["s3"] = s3_client_.get
+    return steps
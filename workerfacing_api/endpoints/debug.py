@@ -0,0 +1,68 @@
+import os
+
+from fastapi import APIRouter, HTTPException, Path, Query, status
+from fastapi.responses import FileResponse, PlainTextResponse
+
+from workerfacing_api import profiling, settings
+from workerfacing_api.query_log import query_log
+from workerfacing_api.schemas.debug import QueryLogConfig
+
+router = APIRouter()
+
+
+@router.get(
+    "/_debug/queries",
+    response_model=QueryLogConfig,
+    description="Get the configuration of the database statement log of the process handling the request "
+    "(private internal endpoint).",
+)
+async def get_query_log_config() -> QueryLogConfig:
+    return query_log.config
+
+
+@router.put(
+    "/_debug/queries",
+    response_model=QueryLogConfig,
+    description="Configure the database statement log (counting and timing of the statements per request, "
+    "slow statements log with their plan, warning above a statement budget per request) "
+    "of the process handling the request (private internal endpoint).",
+)
+async def put_query_log_config(config: QueryLogConfig) -> QueryLogConfig:
+    query_log.configure(config)
+    return query_log.config
+
+
+@router.get(
+    "/_debug/profile",
+    response_class=PlainTextResponse,
+    description="Sample the stacks of the threads of the process handling the request for `seconds` seconds, "
+    "every `interval` seconds, and get them as collapsed stacks (flamegraph input format, "
+    "one `frame;...;frame count` line per stack) (private internal endpoint). "
+    "Threads waiting for work are excluded unless `include_idle`.",
+)
+async def get_profile(
+    seconds: float = Query(10, gt=0, le=300),
+    interval: float = Query(0.01, ge=0.001, le=1),
+    include_idle: bool = False,
+) -> PlainTextResponse:
+    return PlainTextResponse(
+        await profiling.profile(seconds, interval, include_idle=include_idle)
+    )
+
+
+@router.get(
+    "/_debug/profiles/{profile_id}",
+    response_class=FileResponse,
+    description="Get the collapsed stacks of a request profiled with the `X-Profile` header "
+    "(set to the internal API key), whose id was returned in the `X-Profile-Id` response header "
+    "(private internal endpoint).",
+)
+async def get_request_profile(
+    profile_id: str = Path(pattern="^[0-9a-f]{16}$"),
+) -> FileResponse:
+    path = profiling.profile_path(settings.profile_dir, profile_id)
+    if not os.path.exists(path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found"
+        )
+    return FileResponse(path, media_type="text/plain")
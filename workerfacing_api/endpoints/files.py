@@ -1,25 +1,76 @@
 import re
 
-from fastapi import APIRouter, Depends, HTTPException, Request, status
-from fastapi.responses import FileResponse
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
 
 from workerfacing_api.core.filesystem import FileSystem
 from workerfacing_api.dependencies import filesystem_dep
-from workerfacing_api.schemas.files import FileHTTPRequest
+from workerfacing_api.schemas.files import ArchiveCompression, FileHTTPRequest
 
 router = APIRouter()
 
 
+def _etag_matches(if_none_match: str | None, etag: str | None) -> bool:
+    if if_none_match is None or etag is None:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
 @router.get(
     "/files/{file_id:path}/download",
     response_class=FileResponse,
-    description="Download a file from the filesystem.",
+    responses={304: {"description": "File matches the `If-None-Match` ETag."}},
+    description="Download a file from the filesystem. "
+    "The response has a content-based ETag; send it as `If-None-Match` to get a 304 if unchanged.",
 )
 async def download_file(
-    file_id: str, filesystem: FileSystem = Depends(filesystem_dep)
-) -> FileResponse:
+    file_id: str,
+    if_none_match: str | None = Header(None),
+    filesystem: FileSystem = Depends(filesystem_dep),
+) -> Response:
     try:
-        return filesystem.get_file(path=file_id)
+        # hashing (ETag) and caching read the file, not on the event loop
+        response = await run_in_threadpool(filesystem.get_file, path=file_id)
+        etag = response.headers.get("etag")
+        if _etag_matches(if_none_match, etag):
+            return Response(
+                status_code=status.HTTP_304_NOT_MODIFIED, headers={"etag": str(etag)}
+            )
+        return response
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    except PermissionError as e:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
+
+
+@router.get(
+    "/files/{file_id:path}/archive",
+    response_class=StreamingResponse,
+    description="Download a directory from the filesystem as a tar archive (optionally zstd-compressed), "
+    "filtered with include/exclude glob patterns on the paths relative to the directory.",
+)
+async def download_archive(
+    file_id: str,
+    include: list[str] | None = Query(None),
+    exclude: list[str] | None = Query(None),
+    compression: ArchiveCompression = ArchiveCompression.none,
+    filesystem: FileSystem = Depends(filesystem_dep),
+) -> StreamingResponse:
+    try:
+        return filesystem.get_archive(
+            path=file_id, include=include, exclude=exclude, compression=compression
+        )
     except FileNotFoundError:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
     except PermissionError as e:
@@ -29,18 +80,27 @@ async def download_file(
 @router.get(
     "/files/{file_id:path}/url",
     response_model=FileHTTPRequest,
-    description="Get request parameters to download a file from the filesystem.",
+    response_model_exclude_none=True,
+    description="Get request parameters to download a file from the filesystem. "
+    "The file's ETag is returned in `etag` and in the ETag header, to skip downloads of files already cached.",
 )
 async def get_download_presigned_url(
-    file_id: str, request: Request, filesystem: FileSystem = Depends(filesystem_dep)
+    file_id: str,
+    request: Request,
+    response: Response,
+    filesystem: FileSystem = Depends(filesystem_dep),
 ) -> FileHTTPRequest:
     try:
-        return filesystem.get_file_url(
+        file_request = await run_in_threadpool(
+            filesystem.get_file_url,
             path=file_id,
             request=request,
             url_endpoint=re.escape("/url") + "$",
             files_endpoint="/download",
         )
+        if file_request.etag is not None:
+            response.headers["etag"] = file_request.etag
+        return file_request
     except FileNotFoundError:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
     except PermissionError as e:
@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Request, Response, status
+
+from workerfacing_api.schemas.startup import Readiness
+
+router = APIRouter()
+
+
+@router.get(
+    "/ready",
+    response_model=Readiness,
+    responses={status.HTTP_503_SERVICE_UNAVAILABLE: {"model": Readiness}},
+    description="Whether the database, the file storage and the worker authentication are set up.",
+)
+async def get_readiness(request: Request, response: Response) -> Readiness:
+    startup = getattr(request.app.state, "startup", None)
+    if startup is None:
+        # served without the lifespan: the dependencies are set up on first use
+        return Readiness(ready=True, steps=[])
+    readiness: Readiness = startup.readiness()
+    if not readiness.ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return readiness
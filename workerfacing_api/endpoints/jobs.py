@@ -1,8 +1,14 @@
+import asyncio
+import datetime
 import enum
 import os
+import re
+from typing import cast
+from urllib.parse import quote
 
 from fastapi import (
     APIRouter,
+    Body,
     Depends,
     File,
     HTTPException,
@@ -13,27 +19,130 @@ from fastapi import (
 from fastapi import (
     status as httpstatus,
 )
+from fastapi.concurrency import run_in_threadpool
 
 from workerfacing_api.core.filesystem import FileSystem
 from workerfacing_api.core.queue import RDSJobQueue
 from workerfacing_api.dependencies import filesystem_dep, queue_dep
 from workerfacing_api.exceptions import JobDeletedException, JobNotAssignedException
-from workerfacing_api.schemas.files import FileHTTPRequest
+from workerfacing_api.schemas.files import (
+    FileHTTPRequest,
+    MultipartUpload,
+    MultipartUploadPart,
+)
 from workerfacing_api.schemas.queue_jobs import (
     EnvironmentTypes,
+    HardwareSpecs,
     JobFilter,
     JobSpecs,
+    PulledJobSpecs,
 )
-from workerfacing_api.schemas.rds_models import JobStates, QueuedJob
+from workerfacing_api.schemas.rds_models import JobStates
+from workerfacing_api.schemas.workers import WorkerInfo
 
 router = APIRouter()
 
 
+def _environment(request: Request) -> EnvironmentTypes:
+    return (
+        EnvironmentTypes.cloud
+        if "cloud" in request.state.current_user.cognito_groups
+        else EnvironmentTypes.local
+    )
+
+
+def _endpoint_request(request: Request, path: str, query: str = "") -> Request:
+    """The request as if made to another endpoint, for the filesystem to build its urls."""
+    return Request(
+        {
+            **request.scope,
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+        }
+    )
+
+
+async def _with_urls(
+    request: Request,
+    job_id: int,
+    job: PulledJobSpecs,
+    filesystem: FileSystem,
+) -> PulledJobSpecs:
+    """Add the requests to download the job's inputs and upload its outputs,
+    as returned by `GET /files/{path}/url` and `POST /jobs/{job_id}/files/url`.
+    Inputs/outputs not accessible are left out (the worker can still request them separately).
+    """
+
+    async def file_url(path: str) -> FileHTTPRequest | None:
+        try:
+            return await run_in_threadpool(
+                filesystem.get_file_url,
+                path,
+                _endpoint_request(request, f"/files/{quote(path)}/url"),
+                re.escape("/url") + "$",
+                "/download",
+            )
+        except (FileNotFoundError, PermissionError):
+            return None
+
+    async def upload_url(type: UploadType, path: str) -> FileHTTPRequest | None:
+        try:
+            return await run_in_threadpool(
+                filesystem.post_file_url,
+                path,
+                _endpoint_request(
+                    request,
+                    f"/jobs/{job_id}/files/url",
+                    f"type={type.value}&base_path=",
+                ),
+                "/url",
+                "/upload",
+            )
+        except PermissionError:
+            return None
+
+    files_down = job.handler.files_down or {}
+    results = await asyncio.gather(
+        *[file_url(path) for path in files_down.values()],
+        *[
+            upload_url(type, _upload_path(job._paths_upload, type, ""))
+            for type in UploadType
+        ],
+    )
+    files_down_urls = dict(zip(files_down, results[: len(files_down)]))
+    upload_urls = dict(
+        zip([type.value for type in UploadType], results[len(files_down) :])
+    )
+    return PulledJobSpecs(
+        **{
+            **job.model_dump(exclude_unset=True),
+            "files_down_urls": {
+                k: v for k, v in files_down_urls.items() if v is not None
+            },
+            "upload_urls": {k: v for k, v in upload_urls.items() if v is not None},
+        }
+    )
+
+
 @router.get(
     "/jobs",
-    response_model=dict[int, JobSpecs],
+    response_model=dict[int, PulledJobSpecs],
+    response_model_exclude_unset=True,
     tags=["Jobs"],
-    description="Pull jobs from the queue",
+    description="Pull jobs from the queue. "
+    "Each job is leased to the worker until `lease.expires_at`, and every status update renews the lease: "
+    "if it expires, the job is considered failed and retried. "
+    "With `pack`, `memory`, `cpu_cores` and `gpu_mem` are the worker's free capacity, "
+    "and the summed requirements of the pulled jobs fit in it. "
+    "`images` are the images cached by the worker (`image_url`, or `image_url:image_version` if the job specifies a version): "
+    "within a priority, jobs using them are pulled first. "
+    "`cached_files` are the `files_down` paths cached by the worker: "
+    "within a priority, the jobs with the most bytes of cached inputs are pulled first. "
+    "With `urls`, the requests to download the `files_down` and to upload to the output, log and artifact directories "
+    "are returned with the jobs, saving the round trips to the `url` endpoints. "
+    "`instance_id` distinguishes workers sharing a username in the worker registry, "
+    "and `slots` is the number of jobs the worker runs concurrently.",
 )
 async def get_jobs(
     request: Request,
@@ -43,41 +152,73 @@ async def get_jobs(
     gpu_model: str | None = None,
     gpu_archi: str | None = None,
     groups: list[str] | None = Query(None),
+    images: list[str] | None = Query(None),
+    cached_files: list[str] | None = Query(None),
     limit: int = 1,
     older_than: int = 0,
+    pack: bool = False,
+    urls: bool = False,
+    instance_id: str = "",
+    slots: int | None = None,
     queue: RDSJobQueue = Depends(queue_dep),
+    filesystem: FileSystem = Depends(filesystem_dep),
 ) -> dict[int, JobSpecs]:
     hostname = request.state.current_user.username
-    environment = (
-        EnvironmentTypes.cloud
-        if "cloud" in request.state.current_user.cognito_groups
-        else EnvironmentTypes.local
+    environment = _environment(request)
+    queue.worker_registry.seen(
+        WorkerInfo(
+            hostname=hostname,
+            instance_id=instance_id,
+            environment=environment.value,
+            slots=slots,
+            hardware=HardwareSpecs(
+                cpu_cores=cpu_cores,
+                memory=memory,
+                gpu_model=gpu_model,
+                gpu_archi=gpu_archi,
+                gpu_mem=gpu_mem,
+            ),
+            last_seen=datetime.datetime.now(datetime.timezone.utc),
+        )
+    )
+    filter = JobFilter(
+        cpu_cores=cpu_cores,
+        memory=memory,
+        environment=environment,
+        gpu_model=gpu_model,
+        gpu_archi=gpu_archi,
+        gpu_mem=gpu_mem,
+        groups=groups,
+        images=images,
+        cached_files=cached_files,
+        older_than=older_than,
     )
 
-    jobs = {}
-    for _ in range(limit):
-        try:
-            res = queue.dequeue(
-                hostname=hostname,
-                filter=JobFilter(
-                    cpu_cores=cpu_cores,
-                    memory=memory,
-                    environment=environment,
-                    gpu_model=gpu_model,
-                    gpu_archi=gpu_archi,
-                    gpu_mem=gpu_mem,
-                    groups=groups,
-                    older_than=older_than,
-                ),
-            )
-        except ValueError as e:
-            raise HTTPException(
-                status_code=httpstatus.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e)
+    jobs: dict[int, JobSpecs] = {}
+    try:
+        if pack:
+            jobs = dict(
+                queue.dequeue_packed(hostname=hostname, filter=filter, limit=limit)
             )
-        if res:
-            jobs.update({res[0]: res[1]})
         else:
-            break
+            for _ in range(limit):
+                res = queue.dequeue(hostname=hostname, filter=filter)
+                if res:
+                    jobs.update({res[0]: res[1]})
+                else:
+                    break
+    except ValueError as e:
+        raise HTTPException(
+            status_code=httpstatus.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e)
+        )
+    if urls:
+        pulled = await asyncio.gather(
+            *[
+                _with_urls(request, job_id, cast(PulledJobSpecs, job), filesystem)
+                for job_id, job in jobs.items()
+            ]
+        )
+        return dict(zip(jobs, pulled))
     return jobs
 
 
@@ -100,18 +241,34 @@ async def get_job_status(
     "/jobs/{job_id}/status",
     tags=["Jobs"],
     status_code=httpstatus.HTTP_204_NO_CONTENT,
-    description="Update the status of a job (or ping for keep-alive)",
+    description="Update the status of a job (or ping for keep-alive), renewing its lease. "
+    "With `lease_token`, the update is rejected if the lease it was returned with expired in the meantime. "
+    "Large runtime details can be sent in the (optionally compressed) JSON body instead of the query.",
 )
 async def put_job_status(
     request: Request,
     job_id: int,
     status: JobStates,
     runtime_details: str | None = None,
+    lease_token: str | None = None,
+    instance_id: str = "",
+    runtime_details_body: str | None = Body(None, embed=True, alias="runtime_details"),
     queue: RDSJobQueue = Depends(queue_dep),
 ) -> None:
     hostname = request.state.current_user.username
+    queue.worker_registry.seen(
+        WorkerInfo(
+            hostname=hostname,
+            instance_id=instance_id,
+            environment=_environment(request).value,
+            last_seen=datetime.datetime.now(datetime.timezone.utc),
+        )
+    )
+    runtime_details = runtime_details_body or runtime_details
     try:
-        queue.update_job_status(job_id, status, runtime_details, hostname=hostname)
+        queue.update_job_status(
+            job_id, status, runtime_details, hostname=hostname, lease_token=lease_token
+        )
     except (JobDeletedException, JobNotAssignedException):
         # acts as a "cancel job" signal to worker
         raise HTTPException(status_code=httpstatus.HTTP_404_NOT_FOUND)
@@ -123,9 +280,9 @@ class UploadType(enum.Enum):
     artifact = "artifact"
 
 
-def _upload_path(job: QueuedJob, type: UploadType, path: str) -> str:
+def _upload_path(paths_upload: dict[str, str], type: UploadType, path: str) -> str:
     return os.path.join(
-        job.paths_upload[type.value], path
+        paths_upload[type.value], path
     )  # not pathlib.Path since it does s3://x => s3:/x
 
 
@@ -133,14 +290,14 @@ def _upload_path(job: QueuedJob, type: UploadType, path: str) -> str:
     "/jobs/{job_id}/files/upload",
     status_code=httpstatus.HTTP_201_CREATED,
     tags=["Files"],
-    description="Upload a file to the job's output, log or artifact directory",
+    description="Upload one or several files to the job's output, log or artifact directory",
 )
 async def upload_file(
     request: Request,
     job_id: int,
     type: UploadType,
     base_path: str,
-    file: UploadFile = File(...),
+    file: list[UploadFile] = File(...),
     filesystem: FileSystem = Depends(filesystem_dep),
     queue: RDSJobQueue = Depends(queue_dep),
 ) -> None:
@@ -148,17 +305,47 @@ async def upload_file(
         job = queue.get_job(job_id, hostname=request.state.current_user.username)
     except ValueError:
         raise HTTPException(status_code=httpstatus.HTTP_404_NOT_FOUND)
-    path = _upload_path(job, type, base_path)
+    path = _upload_path(job.paths_upload, type, base_path)
     try:
-        return filesystem.post_file(file, path)
+        for file_ in file:
+            filesystem.post_file(file_, path)
     except PermissionError as e:
         raise HTTPException(status_code=httpstatus.HTTP_403_FORBIDDEN, detail=str(e))
 
 
+@router.post(
+    "/jobs/{job_id}/files/upload/archive",
+    status_code=httpstatus.HTTP_201_CREATED,
+    tags=["Files"],
+    description="Upload a tar archive (optionally gzip/bz2/xz-compressed), extracted into the job's output, log or artifact directory",
+)
+async def upload_archive(
+    request: Request,
+    job_id: int,
+    type: UploadType,
+    base_path: str = "",
+    archive: UploadFile = File(...),
+    filesystem: FileSystem = Depends(filesystem_dep),
+    queue: RDSJobQueue = Depends(queue_dep),
+) -> int:
+    try:
+        job = queue.get_job(job_id, hostname=request.state.current_user.username)
+    except (RuntimeError, JobNotAssignedException):
+        raise HTTPException(status_code=httpstatus.HTTP_404_NOT_FOUND)
+    path = _upload_path(job.paths_upload, type, base_path)
+    try:
+        return filesystem.post_archive(archive, path)
+    except PermissionError as e:
+        raise HTTPException(status_code=httpstatus.HTTP_403_FORBIDDEN, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=httpstatus.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
 @router.post(
     "/jobs/{job_id}/files/url",
     status_code=httpstatus.HTTP_201_CREATED,
     response_model=FileHTTPRequest,
+    response_model_exclude_none=True,
     tags=["Files"],
     description="Get a presigned URL to upload a file to the job's output, log or artifact directory",
 )
@@ -174,8 +361,95 @@ async def get_upload_presigned_url(
         job = queue.get_job(job_id, hostname=request.state.current_user.username)
     except ValueError:
         raise HTTPException(status_code=httpstatus.HTTP_404_NOT_FOUND)
-    path = _upload_path(job, type, base_path)
+    path = _upload_path(job.paths_upload, type, base_path)
     try:
         return filesystem.post_file_url(path, request, "/url", "/upload")
     except PermissionError as e:
         raise HTTPException(status_code=httpstatus.HTTP_403_FORBIDDEN, detail=str(e))
+
+
+@router.post(
+    "/jobs/{job_id}/files/multipart",
+    status_code=httpstatus.HTTP_201_CREATED,
+    response_model=MultipartUpload,
+    response_model_exclude_none=True,
+    tags=["Files"],
+    description="Start a multipart upload of a large file to the job's output, log or artifact directory, and get presigned URLs to upload its parts in parallel",
+)
+async def create_multipart_upload(
+    request: Request,
+    job_id: int,
+    type: UploadType,
+    base_path: str,
+    n_parts: int = Query(ge=1, le=10_000),
+    filesystem: FileSystem = Depends(filesystem_dep),
+    queue: RDSJobQueue = Depends(queue_dep),
+) -> MultipartUpload:
+    try:
+        job = queue.get_job(job_id, hostname=request.state.current_user.username)
+    except (RuntimeError, JobNotAssignedException):
+        raise HTTPException(status_code=httpstatus.HTTP_404_NOT_FOUND)
+    path = _upload_path(job.paths_upload, type, base_path)
+    try:
+        return filesystem.create_multipart_upload(path, n_parts)
+    except PermissionError as e:
+        raise HTTPException(status_code=httpstatus.HTTP_403_FORBIDDEN, detail=str(e))
+
+
+@router.post(
+    "/jobs/{job_id}/files/multipart/{upload_id}/complete",
+    status_code=httpstatus.HTTP_204_NO_CONTENT,
+    tags=["Files"],
+    description="Complete a multipart upload once all its parts are uploaded",
+)
+async def complete_multipart_upload(
+    request: Request,
+    job_id: int,
+    upload_id: str,
+    type: UploadType,
+    base_path: str,
+    parts: list[MultipartUploadPart],
+    filesystem: FileSystem = Depends(filesystem_dep),
+    queue: RDSJobQueue = Depends(queue_dep),
+) -> None:
+    try:
+        job = queue.get_job(job_id, hostname=request.state.current_user.username)
+    except (RuntimeError, JobNotAssignedException):
+        raise HTTPException(status_code=httpstatus.HTTP_404_NOT_FOUND)
+    path = _upload_path(job.paths_upload, type, base_path)
+    try:
+        filesystem.complete_multipart_upload(path, upload_id, parts)
+    except FileNotFoundError:
+        raise HTTPException(status_code=httpstatus.HTTP_404_NOT_FOUND)
+    except PermissionError as e:
+        raise HTTPException(status_code=httpstatus.HTTP_403_FORBIDDEN, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=httpstatus.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.delete(
+    "/jobs/{job_id}/files/multipart/{upload_id}",
+    status_code=httpstatus.HTTP_204_NO_CONTENT,
+    tags=["Files"],
+    description="Abort a multipart upload and delete its uploaded parts",
+)
+async def abort_multipart_upload(
+    request: Request,
+    job_id: int,
+    upload_id: str,
+    type: UploadType,
+    base_path: str,
+    filesystem: FileSystem = Depends(filesystem_dep),
+    queue: RDSJobQueue = Depends(queue_dep),
+) -> None:
+    try:
+        job = queue.get_job(job_id, hostname=request.state.current_user.username)
+    except (RuntimeError, JobNotAssignedException):
+        raise HTTPException(status_code=httpstatus.HTTP_404_NOT_FOUND)
+    path = _upload_path(job.paths_upload, type, base_path)
+    try:
+        filesystem.abort_multipart_upload(path, upload_id)
+    except FileNotFoundError:
+        raise HTTPException(status_code=httpstatus.HTTP_404_NOT_FOUND)
+    except PermissionError as e:
+        raise HTTPException(status_code=httpstatus.HTTP_403_FORBIDDEN, detail=str(e))
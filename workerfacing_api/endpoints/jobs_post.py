@@ -1,12 +1,25 @@
 from fastapi import APIRouter, Depends, status
+from fastapi.concurrency import run_in_threadpool
 
+from workerfacing_api.core.filesystem import FileSystem
 from workerfacing_api.core.queue import RDSJobQueue
-from workerfacing_api.dependencies import queue_dep
+from workerfacing_api.dependencies import filesystem_dep, queue_dep
 from workerfacing_api.schemas.queue_jobs import SubmittedJob
 
 router = APIRouter()
 
 
+def _input_sizes(job: SubmittedJob, filesystem: FileSystem) -> dict[str, int]:
+    """Sizes of the job's input files, for data-locality scheduling (0 if unknown)."""
+    sizes = {}
+    for path in set((job.job.handler.files_down or {}).values()):
+        try:
+            sizes[path] = filesystem.get_size(path)
+        except (FileNotFoundError, PermissionError):
+            sizes[path] = 0
+    return sizes
+
+
 @router.post(
     "/_jobs",
     status_code=status.HTTP_201_CREATED,
@@ -14,7 +27,10 @@ router = APIRouter()
     description="Submit a job to the queue (private internal endpoint).",
 )
 async def post_job(
-    job: SubmittedJob, queue: RDSJobQueue = Depends(queue_dep)
+    job: SubmittedJob,
+    queue: RDSJobQueue = Depends(queue_dep),
+    filesystem: FileSystem = Depends(filesystem_dep),
 ) -> SubmittedJob:
-    queue.enqueue(job)
+    input_sizes = await run_in_threadpool(_input_sizes, job, filesystem)
+    queue.enqueue(job, input_sizes)
     return job
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from workerfacing_api import settings
+from workerfacing_api.core.file_cache import FileCache
+from workerfacing_api.core.queue import RDSJobQueue
+from workerfacing_api.dependencies import file_cache_dep, queue_dep
+from workerfacing_api.schemas.files import FileCacheStats
+from workerfacing_api.schemas.queue_jobs import QueueStats
+
+router = APIRouter()
+
+
+@router.get(
+    "/_stats/files/cache",
+    response_model=FileCacheStats,
+    description="Get the hit-rate metrics of the in-memory cache of hot files (private internal endpoint).",
+)
+async def get_file_cache_stats(
+    file_cache: FileCache | None = Depends(file_cache_dep),
+) -> FileCacheStats:
+    if file_cache is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="File cache is disabled"
+        )
+    return file_cache.stats()
+
+
+@router.get(
+    "/_stats/queue",
+    response_model=QueueStats,
+    description="Get the number of jobs per status, broken down by environment, group and hardware class, "
+    "and the age of the oldest queued job (private internal endpoint). "
+    "The counts are refreshed at most every `QUEUE_STATS_INTERVAL` seconds.",
+)
+async def get_queue_stats(queue: RDSJobQueue = Depends(queue_dep)) -> QueueStats:
+    return queue.get_stats(max_age=settings.queue_stats_interval)
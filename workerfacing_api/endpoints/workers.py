@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Depends, Query
+
+from workerfacing_api import settings
+from workerfacing_api.core.queue import RDSJobQueue
+from workerfacing_api.dependencies import queue_dep
+from workerfacing_api.schemas.workers import WorkerInfo
+
+router = APIRouter()
+
+
+@router.get(
+    "/_workers",
+    response_model=list[WorkerInfo],
+    description="Get the workers seen pulling jobs or sending keepalive signals in the last `active_within` seconds, "
+    "with the largest resources they reported (private internal endpoint).",
+)
+async def get_workers(
+    active_within: int = Query(settings.timeout_failure, ge=0),
+    queue: RDSJobQueue = Depends(queue_dep),
+) -> list[WorkerInfo]:
+    queue.flush_workers()
+    return queue.get_workers(active_within)
+
+
+@router.get(
+    "/_workers/unschedulable",
+    response_model=list[int],
+    description="Get the ids of the queued jobs that none of the workers seen in the last `active_within` seconds "
+    "can run (private internal endpoint).",
+)
+async def get_unschedulable_jobs(
+    active_within: int = Query(settings.timeout_failure, ge=0),
+    queue: RDSJobQueue = Depends(queue_dep),
+) -> list[int]:
+    queue.flush_workers()
+    return queue.get_unschedulable_jobs(active_within)
@@ -1,13 +1,74 @@
+import asyncio
+import contextlib
+from typing import AsyncIterator
+
 import dotenv
 from fastapi import Depends, FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi_utils.tasks import repeat_every
 
 dotenv.load_dotenv()
 
-from workerfacing_api import dependencies, settings, tags
-from workerfacing_api.endpoints import access, files, jobs, jobs_post
+from workerfacing_api import (
+    dependencies,
+    metrics,
+    profiling,
+    query_log,
+    settings,
+    tags,
+    tracing,
+)
+from workerfacing_api.endpoints import (
+    access,
+    debug,
+    files,
+    health,
+    jobs,
+    jobs_post,
+    stats,
+    workers,
+)
+from workerfacing_api.middleware import CompressionMiddleware
+from workerfacing_api.startup import Startup
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # the dependencies are set up concurrently while serving (see `/ready`)
+    startup = Startup(dependencies.setup_steps())
+    app.state.startup = startup
+    startup.start()
+    background = asyncio.create_task(start_background_tasks(startup))
+    yield
+    background.cancel()
+    startup.stop()
+    lease_watcher = getattr(app.state, "lease_watcher", None)
+    if lease_watcher is not None:
+        lease_watcher.cancel()
 
-workerfacing_app = FastAPI(openapi_tags=tags.tags_metadata)
+
+workerfacing_app = FastAPI(openapi_tags=tags.tags_metadata, lifespan=lifespan)
+workerfacing_app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.compression_min_size,
+    max_body_size=settings.decompressed_body_max_size,
+)
+workerfacing_app.add_middleware(metrics.MetricsMiddleware)
+workerfacing_app.add_middleware(query_log.QueryLogMiddleware)
+workerfacing_app.add_middleware(
+    profiling.ProfilingMiddleware,
+    key=settings.internal_api_key_secret,
+    directory=settings.profile_dir,
+)
+workerfacing_app.add_middleware(
+    tracing.TracingMiddleware,
+    exporter=tracing.get_exporter(
+        settings.tracing_exporter,
+        settings.tracing_file_path,
+        settings.tracing_otlp_endpoint,
+    ),
+    server_timing=settings.server_timing,
+)
 
 workerfacing_app.include_router(
     jobs.router,
@@ -19,25 +80,78 @@ workerfacing_app.include_router(
     tags=["Files"],
 )
 workerfacing_app.include_router(access.router, tags=["Authentication"])
+workerfacing_app.include_router(health.router, tags=["Health"])
 # private endpoint for user-facing API to call
 workerfacing_app.include_router(
     jobs_post.router,
     dependencies=[Depends(dependencies.authorizer)],
     tags=["_Internal"],
 )
+workerfacing_app.include_router(
+    stats.router,
+    dependencies=[Depends(dependencies.authorizer)],
+    tags=["_Internal"],
+)
+workerfacing_app.include_router(
+    workers.router,
+    dependencies=[Depends(dependencies.authorizer)],
+    tags=["_Internal"],
+)
+workerfacing_app.include_router(
+    debug.router,
+    dependencies=[Depends(dependencies.authorizer)],
+    tags=["_Internal"],
+)
+workerfacing_app.include_router(
+    metrics.router,
+    dependencies=[Depends(dependencies.authorizer)],
+    tags=["_Internal"],
+)
 
 
-queue = dependencies.queue_dep()
+async def start_background_tasks(startup: Startup) -> None:
+    # once their dependencies are set up (not to block the event loop setting them up)
+    if await startup.wait("queue"):
+        workerfacing_app.state.lease_watcher = asyncio.create_task(
+            watch_lease_deadlines()
+        )
+        await find_failed_jobs()
+        await decay_usage()
+        await flush_worker_registry()
+    else:
+        print("Background tasks: queue not set up, jobs and leases not checked.")
+    if await startup.wait("s3"):
+        await abort_stale_multipart_uploads()
 
 
-@workerfacing_app.on_event("startup")  # type: ignore
-@repeat_every(seconds=60, raise_exceptions=True)
+async def watch_lease_deadlines() -> None:
+    # the database and user-facing API calls run in threads, not to block the requests
+    queue = dependencies.queue_dep()
+    while True:
+        try:
+            expired = await queue.deadlines.wait_expired()
+            try:
+                n_retry, n_fail = await run_in_threadpool(
+                    queue.handle_timeouts, settings.max_retries
+                )
+                print(f"Lease expiry check: {n_retry} re-queued, {n_fail} failed.")
+            finally:
+                # leases might have been renewed through other processes
+                await run_in_threadpool(queue.load_deadlines, expired)
+        except Exception as e:
+            print(f"Lease expiry check: failed with {e}")
+
+
+@repeat_every(seconds=settings.lease_reconcile_interval, raise_exceptions=True)
 async def find_failed_jobs() -> dict[str, int]:
+    # safety net for the lease watcher, also loading the leases on startup
     print("Silent fails check: starting...")
     try:
-        max_retries = settings.max_retries
-        timeout_failure = settings.timeout_failure
-        n_retry, n_fail = queue.handle_timeouts(max_retries, timeout_failure)
+        queue = dependencies.queue_dep()
+        n_retry, n_fail = await run_in_threadpool(
+            queue.handle_timeouts, settings.max_retries
+        )
+        await run_in_threadpool(queue.load_deadlines)
         print(f"Silent fails check: {n_retry} re-queued, {n_fail} failed.")
         return {"n_retry": n_retry, "n_fail": n_fail}
     except Exception as e:
@@ -45,6 +159,35 @@ async def find_failed_jobs() -> dict[str, int]:
         return {"n_retry": 0, "n_fail": 0}
 
 
+@repeat_every(seconds=60, raise_exceptions=True)
+async def decay_usage() -> None:
+    try:
+        dependencies.queue_dep().decay_usage()
+    except Exception as e:
+        print(f"Usage decay: failed with {e}")
+
+
+@repeat_every(seconds=settings.worker_registry_flush_interval, raise_exceptions=True)
+async def flush_worker_registry() -> None:
+    try:
+        dependencies.queue_dep().flush_workers()
+    except Exception as e:
+        print(f"Worker registry flush: failed with {e}")
+
+
+@repeat_every(seconds=60 * 60, raise_exceptions=True)
+async def abort_stale_multipart_uploads() -> None:
+    print("Stale multipart uploads check: starting...")
+    try:
+        filesystem = await dependencies.filesystem_dep()
+        n_aborted = filesystem.abort_stale_multipart_uploads(
+            settings.multipart_upload_timeout
+        )
+        print(f"Stale multipart uploads check: {n_aborted} aborted.")
+    except Exception as e:
+        print(f"Stale multipart uploads check: failed with {e}")
+
+
 @workerfacing_app.get("/")
 async def root() -> dict[str, str]:
     return {"message": "Welcome to the DECODE OpenCloud Worker-facing API"}
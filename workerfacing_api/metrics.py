@@ -0,0 +1,141 @@
+"""Prometheus metrics, exposed at `/metrics`.
+
+Under gunicorn, `PROMETHEUS_MULTIPROC_DIR` must be set to an empty directory before the workers start
+(see `scripts/serve.py`), for the metrics of all worker processes to be aggregated.
+"""
+
+import os
+import time
+
+from fastapi import APIRouter, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Duration of the HTTP requests, until the end of the response body.",
+    ["method", "route", "status_code"],
+)
+QUEUE_CLAIM_DURATION = Histogram(
+    "queue_claim_duration_seconds",
+    "Duration of the steps of a job claim: "
+    "peek (outcome found or empty) and pop (outcome won, or lost to another worker).",
+    ["operation", "outcome"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+TIMEOUT_SWEEP_DURATION = Histogram(
+    "timeout_sweep_duration_seconds",
+    "Duration of the handling of the expired leases.",
+)
+JOBS_TIMED_OUT = Counter(
+    "jobs_timed_out_total",
+    "Jobs whose lease expired, by outcome (requeued or failed).",
+    ["outcome"],
+)
+DB_CONNECTIONS = Gauge(
+    "queue_db_connections",
+    "Connections of the queue database pools, by state (open or checked_out).",
+    ["state"],
+    multiprocess_mode="livesum",
+)
+S3_DURATION = Histogram(
+    "s3_operation_duration_seconds",
+    "Duration of the S3 requests and pre-signings.",
+    ["operation"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+JOB_TRACKING_DURATION = Histogram(
+    "job_tracking_update_duration_seconds",
+    "Duration of the job status updates sent to the user-facing API, "
+    'by response status code ("error" if no response).',
+    ["status_code"],
+)
+DB_STATEMENTS = Histogram(
+    "db_statements_per_request",
+    "Number of database statements issued per request (only while the query log is enabled).",
+    ["route"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+DB_TIME = Histogram(
+    "db_time_per_request_seconds",
+    "Time spent executing database statements per request (only while the query log is enabled).",
+    ["route"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+router = APIRouter()
+
+
+@router.get(
+    "/metrics",
+    response_class=Response,
+    description="Get the Prometheus metrics of all processes of the API (private internal endpoint).",
+)
+def get_metrics() -> Response:
+    registry = REGISTRY
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)  # type: ignore[no-untyped-call]
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Track the connections of the pool of `engine`."""
+
+    @event.listens_for(engine, "connect")
+    def connect(*args: object) -> None:
+        DB_CONNECTIONS.labels(state="open").inc()
+
+    @event.listens_for(engine, "close")
+    def close(*args: object) -> None:
+        DB_CONNECTIONS.labels(state="open").dec()
+
+    @event.listens_for(engine, "checkout")
+    def checkout(*args: object) -> None:
+        DB_CONNECTIONS.labels(state="checked_out").inc()
+
+    @event.listens_for(engine, "checkin")
+    def checkin(*args: object) -> None:
+        DB_CONNECTIONS.labels(state="checked_out").dec()
+
+
+class MetricsMiddleware:
+    """Measures the duration of the requests, labelled by route template (not path, to bound the cardinality)."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # set by the router in the (shared) scope
+            route = scope.get("route")
+            REQUEST_DURATION.labels(
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status_code=status_code,
+            ).observe(time.perf_counter() - start)
@@ -0,0 +1,228 @@
+import zlib
+from typing import Protocol
+
+import zstandard
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.exceptions import HTTPException
+from starlette.responses import PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# preferred first when accepted with the same quality
+ENCODINGS = ["zstd", "gzip"]
+# zstd input is decompressed in slices of this many bytes to bound the output of each step
+ZSTD_INPUT_SLICE = 1024
+
+
+class _Codec(Protocol):
+    def compress(self, data: bytes) -> bytes: ...
+
+    def flush(self) -> bytes: ...
+
+
+class _Decompressor(Protocol):
+    @property
+    def eof(self) -> bool: ...
+
+    def decompress(self, data: bytes, max_length: int) -> bytes: ...
+
+
+class _ZstdDecompressor:
+    """Stops decompressing once `max_length` bytes were output (possibly a few more)."""
+
+    def __init__(self) -> None:
+        self.decompressobj = zstandard.ZstdDecompressor().decompressobj()
+
+    @property
+    def eof(self) -> bool:
+        return bool(self.decompressobj.eof)
+
+    def decompress(self, data: bytes, max_length: int) -> bytes:
+        chunks = []
+        size = 0
+        for i in range(0, len(data), ZSTD_INPUT_SLICE):
+            chunk = self.decompressobj.decompress(data[i : i + ZSTD_INPUT_SLICE])
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= max_length:
+                break
+        return b"".join(chunks)
+
+
+class DecompressionError(HTTPException):
+    # HTTPException: re-raised as is when reading the body in FastAPI endpoints
+    def __init__(self, detail: str, status_code: int = 400):
+        super().__init__(status_code, detail)
+
+
+class BodyTooLargeError(DecompressionError):
+    def __init__(self, detail: str):
+        super().__init__(detail, 413)
+
+
+def _compressor(encoding: str) -> _Codec:
+    if encoding == "gzip":
+        return zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return zstandard.ZstdCompressor(level=3).compressobj()
+
+
+def _decompressor(encoding: str) -> _Decompressor | None:
+    if encoding in ("gzip", "x-gzip"):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if encoding == "zstd":
+        return _ZstdDecompressor()
+    return None
+
+
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    """Pick the response encoding from an `Accept-Encoding` header."""
+    qualities = {}
+    for item in accept_encoding.split(","):
+        encoding, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                continue
+        qualities[encoding.strip().lower()] = quality
+    candidates = [
+        (qualities.get(encoding, qualities.get("*", 0.0)), -i, encoding)
+        for i, encoding in enumerate(ENCODINGS)
+    ]
+    quality, _, encoding = max(candidates)
+    return encoding if quality > 0 else None
+
+
+class CompressionMiddleware:
+    """
+    Negotiates gzip/zstd compression in both directions:
+     - request bodies with a `Content-Encoding` are decompressed before reaching the endpoints
+       (uploaded files are stored in their original form), up to `max_body_size` decompressed bytes;
+     - JSON responses of at least `minimum_size` bytes are compressed according to `Accept-Encoding`.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        max_body_size: int = 1024 * 1024 * 1024,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = Headers(scope=scope)
+        content_encoding = headers.get("content-encoding", "identity").lower()
+        if content_encoding != "identity":
+            decompressor = _decompressor(content_encoding)
+            if decompressor is None:
+                response = PlainTextResponse(
+                    f"Unsupported content encoding {content_encoding}", 415
+                )
+                return await response(scope, receive, send)
+            receive = _DecompressingReceive(receive, decompressor, self.max_body_size)
+            request_headers = MutableHeaders(scope=scope)
+            del request_headers["content-encoding"]
+            del request_headers["content-length"]
+        encoding = negotiate_encoding(headers.get("accept-encoding", ""))
+        responder = _CompressingSend(send, encoding, self.minimum_size)
+        try:
+            await self.app(scope, receive, responder)
+        except DecompressionError as e:
+            if responder.started:
+                raise
+            response = PlainTextResponse(e.detail, e.status_code)
+            await response(scope, receive, send)
+
+
+class _DecompressingReceive:
+    def __init__(self, receive: Receive, decompressor: _Decompressor, max_size: int):
+        self.receive = receive
+        self.decompressor = decompressor
+        self.max_size = max_size
+        self.size = self.compressed_size = 0
+
+    async def __call__(self) -> Message:
+        message = await self.receive()
+        if message["type"] == "http.request":
+            data = message.get("body", b"")
+            self.compressed_size += len(data)
+            try:
+                # one byte more than allowed to detect too large bodies
+                body = self.decompressor.decompress(data, self.max_size - self.size + 1)
+            except (zlib.error, zstandard.ZstdError) as e:
+                raise DecompressionError(f"Invalid request body: {e}")
+            self.size += len(body)
+            if self.size > self.max_size:
+                raise BodyTooLargeError(
+                    f"Request body too large: more than {self.max_size} bytes decompressed"
+                )
+            if (
+                not message.get("more_body", False)
+                and self.compressed_size > 0
+                and not self.decompressor.eof
+            ):
+                raise DecompressionError("Invalid request body: truncated stream")
+            message["body"] = body
+        return message
+
+
+class _CompressingSend:
+    def __init__(self, send: Send, encoding: str | None, minimum_size: int):
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start_message: Message | None = None
+        self.compressor: _Codec | None = None
+        self.started = False
+
+    async def __call__(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            if (
+                self.encoding is not None
+                and headers.get("content-type", "").startswith("application/json")
+                and "content-encoding" not in headers
+            ):
+                self.start_message = message  # wait for the body to decide
+                return
+        elif message["type"] == "http.response.body" and self.start_message:
+            await self._send_body(message, self.start_message)
+            return
+        self.started = True
+        await self.send(message)
+
+    async def _send_body(self, message: Message, start_message: Message) -> None:
+        assert self.encoding is not None
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressor is None:
+            headers = MutableHeaders(raw=start_message["headers"])
+            if not more_body and len(body) < self.minimum_size:
+                self.start_message = None
+                self.started = True
+                await self.send(start_message)
+                await self.send(message)
+                return
+            self.compressor = _compressor(self.encoding)
+            headers["content-encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            del headers["content-length"]
+            if not more_body:
+                body = self.compressor.compress(body) + self.compressor.flush()
+                headers["content-length"] = str(len(body))
+                self.started = True
+                await self.send(start_message)
+                await self.send({"type": "http.response.body", "body": body})
+                return
+            self.started = True
+            await self.send(start_message)
+        body = self.compressor.compress(body)
+        if not more_body:
+            body += self.compressor.flush()
+        await self.send(
+            {"type": "http.response.body", "body": body, "more_body": more_body}
+        )
@@ -0,0 +1,146 @@
+"""Statistical profiling of the live worker processes.
+
+`StackSampler` samples the Python stacks of all threads of the process from a background thread,
+and aggregates them as collapsed stacks (one `frame;frame;...;frame count` line per distinct stack),
+the input format of flamegraph tools (e.g. `flamegraph.pl`, speedscope).
+Sampling does not hook into the profiled code, so the overhead is only the sampling thread's.
+"""
+
+import asyncio
+import os
+import secrets
+import sys
+import threading
+from collections import Counter
+from types import FrameType
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# leaf frames of threads waiting for work, excluded unless `include_idle`
+_IDLE_FRAMES = {
+    "threading:Condition.wait",
+    "threading:Event.wait",
+    "selectors:EpollSelector.select",
+    "selectors:KqueueSelector.select",
+    "selectors:PollSelector.select",
+    "selectors:SelectSelector.select",
+    "queue:Queue.get",
+    "concurrent.futures.thread:_worker",
+}
+
+
+def _frame_name(frame: FrameType) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_qualname}"
+
+
+class StackSampler:
+    """Samples the stacks of the threads of the process every `interval` seconds."""
+
+    def __init__(self, interval: float = 0.01, include_idle: bool = False) -> None:
+        self.interval = interval
+        self.include_idle = include_idle
+        self.counts: Counter[str] = Counter()
+        self.n_samples = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> str:
+        """Stop sampling and return the collapsed stacks."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.collapsed()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.items())
+
+    def sample(self) -> None:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        own = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            stack = []
+            f: FrameType | None = frame
+            while f is not None:
+                stack.append(_frame_name(f))
+                f = f.f_back
+            if not self.include_idle and stack[0] in _IDLE_FRAMES:
+                continue
+            stack.append(names.get(thread_id, str(thread_id)))
+            self.counts[";".join(reversed(stack))] += 1
+        self.n_samples += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+
+async def profile(seconds: float, interval: float, include_idle: bool = False) -> str:
+    """Sample the process for `seconds` seconds, returning the collapsed stacks."""
+    sampler = StackSampler(interval, include_idle=include_idle)
+    sampler.start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        collapsed = sampler.stop()
+    return collapsed
+
+
+def profile_path(directory: str, profile_id: str) -> str:
+    return os.path.join(directory, f"{profile_id}.collapsed")
+
+
+class ProfilingMiddleware:
+    """
+    Profiles the requests sent with an `X-Profile` header set to `key` (the internal API key).
+    The process is sampled while the request is handled (including the concurrent requests, if any),
+    and the collapsed stacks are written to `directory` once the response is sent,
+    under the id returned in the `X-Profile-Id` response header.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        key: str | None,
+        directory: str,
+        interval: float = 0.001,
+    ) -> None:
+        self.app = app
+        self.key = key
+        self.directory = directory
+        self.interval = interval
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._requested(scope):
+            await self.app(scope, receive, send)
+            return
+        profile_id = secrets.token_hex(8)
+
+        async def send_with_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Profile-Id", profile_id)
+            await send(message)
+
+        sampler = StackSampler(self.interval)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            collapsed = sampler.stop()
+            os.makedirs(self.directory, exist_ok=True)
+            with open(profile_path(self.directory, profile_id), "w") as f:
+                f.write(collapsed)
+
+    def _requested(self, scope: Scope) -> bool:
+        value = Headers(scope=scope).get("x-profile")
+        return (
+            self.key is not None
+            and value is not None
+            and secrets.compare_digest(value, self.key)
+        )
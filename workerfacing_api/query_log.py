@@ -0,0 +1,193 @@
+"""Database statement log, via SQLAlchemy engine events.
+
+While enabled, the statements are counted and timed per request (in the `Server-Timing` header
+and the Prometheus metrics), requests issuing more statements than the budget are logged,
+and slow statements are logged with their plan.
+The configuration can be changed at runtime (per process), at `/_debug/queries`:
+when disabled, the event listeners are removed from the engines, so that statements have no overhead.
+"""
+
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from workerfacing_api import settings
+from workerfacing_api.metrics import DB_STATEMENTS, DB_TIME
+from workerfacing_api.schemas.debug import QueryLogConfig
+
+# seconds during which a slow statement is not explained again
+EXPLAIN_INTERVAL = 60
+_MAX_LOGGED_LENGTH = 2000
+
+
+@dataclass
+class RequestQueries:
+    count: int = 0
+    duration: float = 0  # seconds
+
+
+_request_queries: ContextVar[RequestQueries | None] = ContextVar(
+    "request_queries", default=None
+)
+
+
+class QueryLog:
+    def __init__(self, config: QueryLogConfig | None = None) -> None:
+        self.config = config or QueryLogConfig()
+        self.lock = threading.Lock()
+        self.engines: weakref.WeakSet[Engine] = weakref.WeakSet()
+        self._explained: dict[str, float] = {}  # statement -> time of last EXPLAIN
+        self._explainer = ThreadPoolExecutor(max_workers=1)
+        # same objects for adding and removing the listeners
+        self._before = self._before_cursor_execute
+        self._after = self._after_cursor_execute
+
+    def instrument(self, engine: Engine) -> None:
+        with self.lock:
+            self.engines.add(engine)
+            if self.config.enabled:
+                self._listen(engine)
+
+    def configure(self, config: QueryLogConfig) -> None:
+        with self.lock:
+            self.config = config
+            for engine in self.engines:
+                if config.enabled:
+                    self._listen(engine)
+                else:
+                    self._unlisten(engine)
+
+    def _listen(self, engine: Engine) -> None:
+        if not event.contains(engine, "before_cursor_execute", self._before):
+            event.listen(engine, "before_cursor_execute", self._before)
+            event.listen(engine, "after_cursor_execute", self._after)
+
+    def _unlisten(self, engine: Engine) -> None:
+        if event.contains(engine, "before_cursor_execute", self._before):
+            event.remove(engine, "before_cursor_execute", self._before)
+            event.remove(engine, "after_cursor_execute", self._after)
+
+    def _before_cursor_execute(self, conn: Connection, *args: Any) -> None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    def _after_cursor_execute(
+        self,
+        conn: Connection,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: Any,
+        executemany: bool,
+    ) -> None:
+        starts = conn.info.get("query_start")
+        if not starts:  # enabled during the execution
+            return
+        duration = time.perf_counter() - starts.pop()
+        if context.execution_options.get("explain"):
+            return
+        queries = _request_queries.get()
+        if queries is not None:
+            queries.count += 1
+            queries.duration += duration
+        if duration >= self.config.slow_threshold:
+            print(
+                f"Slow query: {duration * 1000:.1f} ms: "
+                f"{statement[:_MAX_LOGGED_LENGTH]} with {str(parameters)[:_MAX_LOGGED_LENGTH]}"
+            )
+            if (
+                self.config.explain
+                and not executemany
+                and self._should_explain(statement)
+            ):
+                self._explainer.submit(
+                    self._explain, conn.engine, statement, parameters
+                )
+
+    def _should_explain(self, statement: str) -> bool:
+        now = time.monotonic()
+        with self.lock:
+            if (
+                now - self._explained.get(statement, -EXPLAIN_INTERVAL)
+                < EXPLAIN_INTERVAL
+            ):
+                return False
+            self._explained[statement] = now
+            if len(self._explained) > 1000:
+                self._explained = {
+                    s: t
+                    for s, t in self._explained.items()
+                    if now - t < EXPLAIN_INTERVAL
+                }
+            return True
+
+    def _explain(self, engine: Engine, statement: str, parameters: Any) -> None:
+        # on a separate connection, out of the request and its transaction
+        explain = "EXPLAIN QUERY PLAN" if engine.dialect.name == "sqlite" else "EXPLAIN"
+        try:
+            with engine.connect().execution_options(explain=True) as conn:
+                rows = conn.exec_driver_sql(f"{explain} {statement}", parameters).all()
+            plan = "\n".join(" | ".join(str(v) for v in row) for row in rows)
+            print(f"Slow query plan: {statement[:_MAX_LOGGED_LENGTH]}\n{plan}")
+        except Exception as e:
+            print(f"Slow query plan: failed with {e}")
+
+
+query_log = QueryLog(
+    QueryLogConfig(
+        enabled=settings.query_log,
+        slow_threshold=settings.slow_query_threshold,
+        explain=settings.slow_query_explain,
+        statement_budget=settings.query_budget,
+    )
+)
+
+
+class QueryLogMiddleware:
+    """
+    Counts and times the database statements of each request while the query log is enabled,
+    adding them to the `Server-Timing` header as `db`.
+    """
+
+    def __init__(self, app: ASGIApp, query_log: QueryLog = query_log) -> None:
+        self.app = app
+        self.query_log = query_log
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.query_log.config.enabled:
+            await self.app(scope, receive, send)
+            return
+        queries = RequestQueries()
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    f'db;dur={queries.duration * 1000:.2f};desc="{queries.count} statements"',
+                )
+            await send(message)
+
+        token = _request_queries.set(queries)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_queries.reset(token)
+            # set by the router in the (shared) scope
+            route = getattr(scope.get("route"), "path", "unmatched")
+            DB_STATEMENTS.labels(route=route).observe(queries.count)
+            DB_TIME.labels(route=route).observe(queries.duration)
+            budget = self.query_log.config.statement_budget
+            if budget and queries.count > budget:
+                print(
+                    f"Query budget: {scope['method']} {route} issued {queries.count} statements "
+                    f"in {queries.duration * 1000:.1f} ms (budget {budget})."
+                )
@@ -0,0 +1,8 @@
+from pydantic import BaseModel, Field
+
+
+class GroupClaims(BaseModel):
+    # claims of the Cognito ID tokens, as `fastapi_cloudauth.cognito.CognitoClaims`
+    username: str = Field(alias="cognito:username")
+    email: str | None = Field(None, alias="email")
+    cognito_groups: list[str] | None = Field(alias="cognito:groups")
@@ -0,0 +1,10 @@
+from pydantic import BaseModel, Field
+
+
+class QueryLogConfig(BaseModel):
+    enabled: bool = False
+    # statements taking longer than this number of seconds are logged with their plan
+    slow_threshold: float = Field(default=0.1, ge=0)
+    explain: bool = True
+    # requests issuing more than this number of statements are logged (0 to disable)
+    statement_budget: int = Field(default=25, ge=0)
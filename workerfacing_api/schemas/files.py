@@ -1,3 +1,5 @@
+import enum
+
 from pydantic import BaseModel
 
 
@@ -6,3 +8,32 @@ class FileHTTPRequest(BaseModel):
     url: str
     headers: dict[str, str | dict[str, str]] = {}
     data: dict[str, str] = {}
+    # entity tag of the file (also returned as response header), to validate cached copies
+    etag: str | None = None
+
+
+class MultipartUpload(BaseModel):
+    upload_id: str
+    parts: list[FileHTTPRequest]  # part i+1 is uploaded with parts[i]
+
+
+class MultipartUploadPart(BaseModel):
+    part_number: int
+    etag: str  # ETag header returned when uploading the part
+
+
+class ArchiveCompression(enum.Enum):
+    none = "none"
+    zstd = "zstd"
+
+
+class FileCacheStats(BaseModel):
+    hits: int
+    misses: int
+    bypassed: int  # files larger than the per-file threshold
+    evictions: int
+    invalidations: int  # cached copies dropped because the file changed
+    n_files: int
+    size: int
+    max_size: int
+    hit_rate: float
@@ -1,7 +1,10 @@
+import datetime
 import enum
 from typing import Literal
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, PrivateAttr, computed_field
+
+from workerfacing_api.schemas.files import FileHTTPRequest
 
 
 class EnvironmentTypes(enum.Enum):
@@ -39,6 +42,13 @@ class HandlerSpecs(BaseModel):
     files_down: dict[str, str] | None = None
     files_up: dict[Literal["output", "log", "artifact"], str] | None = None
 
+    @property
+    def image(self) -> str:
+        """Identifier of the image, as reported by workers caching it."""
+        if self.image_version:
+            return f"{self.image_url}:{self.image_version}"
+        return self.image_url
+
 
 class JobSpecs(BaseModel):
     app: AppSpecs
@@ -47,6 +57,20 @@ class JobSpecs(BaseModel):
     hardware: HardwareSpecs
 
 
+class Lease(BaseModel):
+    token: str  # to send with the keepalive signals
+    expires_at: datetime.datetime  # if no keepalive signal is received until then
+
+
+class PulledJobSpecs(JobSpecs):
+    lease: Lease | None = None
+    # only set if requested when pulling
+    files_down_urls: dict[str, FileHTTPRequest] | None = None  # keys of `files_down`
+    upload_urls: dict[str, FileHTTPRequest] | None = None  # output, log, artifact
+    # directories of the job's uploads (not sent to the worker), to build `upload_urls`
+    _paths_upload: dict[str, str] = PrivateAttr(default_factory=dict)
+
+
 class PathsUploadSpecs(BaseModel):
     output: str
     log: str
@@ -59,6 +83,8 @@ class SubmittedJob(BaseModel):
     group: str | None = None
     priority: int = 5
     paths_upload: PathsUploadSpecs
+    # seconds without keepalive signal before the job is considered failed (e.g. from its expected runtime)
+    lease_duration: int | None = Field(default=None, gt=0)
 
 
 class JobFilter(BaseModel):
@@ -72,3 +98,28 @@ class JobFilter(BaseModel):
     gpu_model: str | None = None
     gpu_archi: str | None = None
     groups: list[str] | None = None
+    images: list[str] | None = None  # cached by the worker (see HandlerSpecs.image)
+    cached_files: list[str] | None = None  # `files_down` paths cached by the worker
+
+
+class QueueCounts(BaseModel):
+    total: int = 0
+    by_environment: dict[str, int] = {}  # "any" for jobs without environment
+    by_group: dict[str, int] = {}  # "" for jobs without group
+    by_hardware: dict[str, int] = {}  # "gpu" for jobs with GPU requirements, else "cpu"
+
+
+class QueueStats(BaseModel):
+    by_status: dict[str, QueueCounts]
+    oldest_queued_at: datetime.datetime | None
+    refreshed_at: datetime.datetime  # the counts can be this old
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def oldest_queued_age(self) -> float | None:
+        """Seconds waited by the oldest queued job."""
+        if self.oldest_queued_at is None:
+            return None
+        return (
+            datetime.datetime.now(datetime.timezone.utc) - self.oldest_queued_at
+        ).total_seconds()
@@ -1,8 +1,23 @@
 import datetime
 import enum
+from typing import Any
 
-from sqlalchemy import JSON, DateTime, Enum, Integer, String
+from sqlalchemy import (
+    JSON,
+    BigInteger,
+    DateTime,
+    Enum,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    case,
+    func,
+    literal_column,
+)
 from sqlalchemy.orm import DeclarativeBase, mapped_column
+from sqlalchemy.sql.elements import ColumnElement
 
 
 class JobStates(enum.Enum):
@@ -36,6 +51,11 @@ class QueuedJob(Base):
     )
     num_retries = mapped_column(Integer, default=0)
 
+    # lease of the worker running the job, renewed by its keepalive signals
+    lease_token = mapped_column(String, default=None)
+    lease_expires_at = mapped_column(DateTime, default=None, index=True)
+    lease_duration = mapped_column(Integer, default=None)  # seconds, None for default
+
     job = mapped_column(JSON, nullable=False)
     paths_upload = mapped_column(JSON, nullable=False)
 
@@ -50,7 +70,76 @@ class QueuedJob(Base):
 
     # prioritization attributes
     group = mapped_column(String, default=None)  # worker pulls its own groups first
+    image = mapped_column(String, default=None, index=True)  # image affinity
     priority = mapped_column(Integer, default=0)  # set by user/userfacing API
 
     # logging which workers tried running/run the job
     workers = mapped_column(String, default="")
+
+
+# requirements by which best-fit ordering (see OrderingPolicy) sorts the jobs, largest first:
+# jobs requiring a GPU (even of unspecified memory) first, unspecified requirements as 0
+# (literal constants, for the claims to match the expressions of the index)
+BEST_FIT_REQUIREMENTS: list[ColumnElement[Any]] = [
+    case(
+        (
+            QueuedJob.gpu_model.is_not(None)
+            | QueuedJob.gpu_archi.is_not(None)
+            | (QueuedJob.gpu_mem > literal_column("0")),
+            literal_column("1"),
+        ),
+        else_=literal_column("0"),
+    ),
+    func.coalesce(QueuedJob.gpu_mem, literal_column("0")),
+    func.coalesce(QueuedJob.memory, literal_column("0")),
+    func.coalesce(QueuedJob.cpu_cores, literal_column("0")),
+]
+# in the order of the best-fit ORDER BY, so that claims read the jobs in order instead of sorting
+# them (not with aging, fair share or affinity, whose terms come first in the ORDER BY)
+Index(
+    "ix_queued_jobs_best_fit",
+    QueuedJob.status,
+    QueuedJob.priority.desc(),
+    *(requirement.desc() for requirement in BEST_FIT_REQUIREMENTS),
+    QueuedJob.creation_timestamp,
+)
+
+
+class JobInput(Base):
+    """Input files (`files_down`) of the queued jobs, for data-locality scheduling."""
+
+    __tablename__ = "job_inputs"
+
+    job_id = mapped_column(
+        Integer, ForeignKey("queued_jobs.id", ondelete="CASCADE"), primary_key=True
+    )
+    path = mapped_column(String, primary_key=True)
+    size = mapped_column(BigInteger, nullable=False, default=0)  # bytes
+
+
+class RegisteredWorker(Base):
+    """Workers seen pulling jobs or sending keepalive signals (see WorkerRegistry)."""
+
+    __tablename__ = "workers"
+
+    hostname = mapped_column(String, primary_key=True)  # Cognito username
+    instance_id = mapped_column(String, primary_key=True)  # "" if not reported
+    environment = mapped_column(String, default=None)
+    slots = mapped_column(Integer, default=None)  # jobs it runs concurrently
+    # largest resources reported (see HardwareSpecs)
+    cpu_cores = mapped_column(Integer, default=None)
+    memory = mapped_column(Integer, default=None)
+    gpu_model = mapped_column(String, default=None)
+    gpu_archi = mapped_column(String, default=None)
+    gpu_mem = mapped_column(Integer, default=None)
+    last_seen = mapped_column(DateTime, nullable=False, index=True)
+
+
+class GroupUsage(Base):
+    """Recent consumption per group, for fair-share scheduling."""
+
+    __tablename__ = "group_usage"
+
+    group = mapped_column(String, primary_key=True)  # "" for jobs without group
+    usage = mapped_column(Float, nullable=False, default=0.0)  # decays over time
+    decayed_at = mapped_column(Float, nullable=False, default=0.0)  # Unix time
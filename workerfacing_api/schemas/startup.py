@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+
+
+class StartupStep(BaseModel):
+    name: str
+    done: bool = False
+    seconds: float | None = None  # duration, once done or failed
+    error: str | None = None
+
+
+class Readiness(BaseModel):
+    ready: bool
+    steps: list[StartupStep]
@@ -0,0 +1,14 @@
+import datetime
+
+from pydantic import BaseModel
+
+from workerfacing_api.schemas.queue_jobs import HardwareSpecs
+
+
+class WorkerInfo(BaseModel):
+    hostname: str  # Cognito username
+    instance_id: str = ""  # to distinguish several workers with the same username
+    environment: str | None = None
+    slots: int | None = None
+    hardware: HardwareSpecs = HardwareSpecs()
+    last_seen: datetime.datetime
@@ -1,5 +1,6 @@
 import json
 import os
+import tempfile
 
 
 def get_secret_from_env(secret_name: str) -> str | None:
@@ -17,12 +18,77 @@ filesystem = os.environ.get("FILESYSTEM")  # filesystem
 s3_bucket = os.environ.get("S3_BUCKET")
 s3_region = os.environ.get("S3_REGION")
 user_data_root_path = os.environ.get("USER_DATA_ROOT_PATH")
+# sidecar index of content hashes of local files (ETags)
+checksum_index_path = os.environ.get("CHECKSUM_INDEX_PATH", "./checksum_index.db")
+# in-memory LRU cache of small, frequently downloaded local files (size 0 disables it)
+file_cache_size = int(os.environ.get("FILE_CACHE_SIZE", 0))
+file_cache_max_file_size = int(
+    os.environ.get("FILE_CACHE_MAX_FILE_SIZE", 16 * 1024 * 1024)
+)
+file_cache_mmap = bool(int(os.environ.get("FILE_CACHE_MMAP", 0)))
+# seconds after which unfinished multipart uploads are aborted
+multipart_upload_timeout = int(os.environ.get("MULTIPART_UPLOAD_TIMEOUT", 24 * 60 * 60))
+
+
+# Compression
+# JSON responses smaller than this number of bytes are not compressed
+compression_min_size = int(os.environ.get("COMPRESSION_MIN_SIZE", 1024))
+# compressed request bodies decompressing to more than this number of bytes are rejected
+decompressed_body_max_size = int(
+    os.environ.get("DECOMPRESSED_BODY_MAX_SIZE", 1024 * 1024 * 1024)
+)
+
+
+# Tracing
+# exporter of the request traces: "" (disabled), "file" or "otlp"
+tracing_exporter = os.environ.get("TRACING_EXPORTER", "")
+tracing_file_path = os.environ.get("TRACING_FILE_PATH", "./traces.jsonl")
+tracing_otlp_endpoint = os.environ.get(
+    "TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces"
+)
+# whether to return the durations of the steps of the requests in a Server-Timing header
+server_timing = bool(int(os.environ.get("SERVER_TIMING", 1)))
+
+# whether to count the database statements per request and log the slow ones (changeable at runtime)
+query_log = bool(int(os.environ.get("QUERY_LOG", 0)))
+# statements taking longer than this number of seconds are logged (with their plan)
+slow_query_threshold = float(os.environ.get("SLOW_QUERY_THRESHOLD", 0.1))
+slow_query_explain = bool(int(os.environ.get("SLOW_QUERY_EXPLAIN", 1)))
+# requests issuing more than this number of statements are logged (0 disables it)
+query_budget = int(os.environ.get("QUERY_BUDGET", 25))
+
+# where the profiles of the requests sent with an `X-Profile` header are written
+profile_dir = os.environ.get(
+    "PROFILE_DIR", os.path.join(tempfile.gettempdir(), "workerfacing_api_profiles")
+)
 
 
 # Queue
 max_retries = int(os.environ.get("MAX_RETRIES", 2))
 timeout_failure = int(os.environ.get("TIMEOUT_FAILURE", 300))
+# seconds between full checks of the leases, besides waking when the next one expires
+lease_reconcile_interval = int(os.environ.get("LEASE_RECONCILE_INTERVAL", 10 * 60))
 retry_different = bool(int(os.environ.get("RETRY_DIFFERENT", 1)))
+# order of pulled jobs: "priority" or "fair_share" (priority minus recent consumption of the group)
+queue_ordering = os.environ.get("QUEUE_ORDERING", "priority")
+# seconds of waiting for a job to gain one priority point (0 disables aging)
+priority_aging = float(os.environ.get("PRIORITY_AGING", 0))
+# within a priority, pull the jobs with the largest requirements matching the worker first
+queue_best_fit = bool(int(os.environ.get("QUEUE_BEST_FIT", 0)))
+# seconds a job can be passed over for jobs whose image is cached by the puller
+image_affinity_wait = int(os.environ.get("IMAGE_AFFINITY_WAIT", 60))
+# seconds a job can be passed over for jobs whose inputs are cached by the puller
+data_locality_wait = int(os.environ.get("DATA_LOCALITY_WAIT", 300))
+# seconds after which the recent consumption of a group is halved (fair share)
+fair_share_half_life = float(os.environ.get("FAIR_SHARE_HALF_LIFE", 60 * 60))
+# priority points a job loses per job recently pulled from its group (fair share)
+fair_share_usage_weight = float(os.environ.get("FAIR_SHARE_USAGE_WEIGHT", 1))
+# seconds between the batched writes of the workers seen to the worker registry
+worker_registry_flush_interval = int(
+    os.environ.get("WORKER_REGISTRY_FLUSH_INTERVAL", 10)
+)
+# seconds for which the job counts of the queue statistics are cached
+queue_stats_interval = float(os.environ.get("QUEUE_STATS_INTERVAL", 30))
 queue_db_url = os.environ.get("QUEUE_DB_URL", "sqlite:///./sql_queue.db")  # RDB queue
 
 queue_db_secret = get_secret_from_env("QUEUE_DB_SECRET")
@@ -41,7 +107,7 @@ internal_api_key_secret = os.environ.get("INTERNAL_API_KEY_SECRET")
 
 # Authentication
 cognito_user_pool_id = os.environ.get("COGNITO_USER_POOL_ID")
-# default to avoid ConnectionError in tests when initializing `current_user_dep`
+# default to avoid ConnectionError in tests when setting up `current_user_dep`
 cognito_region = os.environ.get("COGNITO_REGION", "eu-central-1")
 cognito_client_id = os.environ.get("COGNITO_CLIENT_ID")
 cognito_secret = get_secret_from_env("COGNITO_SECRET")
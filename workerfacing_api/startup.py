@@ -0,0 +1,60 @@
+import asyncio
+import time
+from typing import Any, Callable
+
+from workerfacing_api.schemas.startup import Readiness, StartupStep
+
+
+class Startup:
+    """Slow steps of setting up the app (e.g. connecting to the database), run concurrently in threads.
+
+    Started by the lifespan of the app, which serves requests meanwhile:
+    the readiness endpoint reports the steps, and the dependencies still being set up
+    are waited for by the requests needing them.
+    """
+
+    def __init__(self, steps: dict[str, Callable[[], Any]]):
+        self.steps = steps
+        self.status = {name: StartupStep(name=name) for name in steps}
+        self.tasks: dict[str, asyncio.Task[bool]] = {}
+
+    def start(self) -> None:
+        for name, step in self.steps.items():
+            self.tasks[name] = asyncio.create_task(self._run(name, step))
+
+    async def _run(self, name: str, step: Callable[[], Any]) -> bool:
+        print(f"Startup: setting up {name}...")
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(step)
+        except Exception as e:
+            self.status[name].error = str(e)
+            print(f"Startup: {name} failed with {e}")
+        else:
+            self.status[name].done = True
+            print(f"Startup: {name} set up.")
+        self.status[name].seconds = time.perf_counter() - start
+        if self.ready:
+            print("Startup: ready.")
+        return self.status[name].done
+
+    @property
+    def ready(self) -> bool:
+        return all(step.done for step in self.status.values())
+
+    async def wait(self, name: str) -> bool:
+        """Wait for a step (not waiting for steps not run), returning whether it succeeded."""
+        if name not in self.steps:
+            return True
+        return await asyncio.shield(self.tasks[name])
+
+    def stop(self) -> None:
+        # the threads of the running steps finish in the background
+        for task in self.tasks.values():
+            task.cancel()
+
+    def readiness(self) -> Readiness:
+        return Readiness(
+            ready=self.ready,
+            steps=[step.model_copy() for step in self.status.values()],
+        )
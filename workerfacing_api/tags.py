@@ -5,6 +5,7 @@ tags_metadata = [
     },
     {"name": "Jobs", "description": "Jobs pulling and status tracking"},
     {"name": "Authentication", "description": "Authentication and authorization"},
+    {"name": "Health", "description": "Readiness of the API to serve requests"},
     {
         "name": "_Internal",
         "description": "Internal endpoints for communication with user-facing API",
@@ -0,0 +1,348 @@
+"""Request tracing.
+
+Each HTTP request is traced by `TracingMiddleware`, with child spans for the authentication,
+the queue and filesystem operations and the requests to the user-facing API.
+Traces are exported as OTLP/JSON, to an OTLP/HTTP collector or to a local file (one batch per line),
+and the durations of the top-level steps are returned in a `Server-Timing` header.
+Outside of a traced request, spans are no-ops.
+"""
+
+import abc
+import atexit
+import contextlib
+import functools
+import inspect
+import json
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator, ParamSpec, TypeVar
+
+import requests
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+P = ParamSpec("P")
+R = TypeVar("R")
+C = TypeVar("C", bound=type)
+
+SERVICE_NAME = "workerfacing-api"
+# https://opentelemetry.io/docs/specs/otel/trace/api/#spankind
+_SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str = field(default_factory=lambda: secrets.token_hex(8))
+    parent_id: str | None = None
+    kind: str = "internal"
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: int | None = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: bool = False
+    # spans of the trace, shared with the root span
+    finished: list["Span"] = field(default_factory=list, repr=False)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def child(self, name: str, kind: str = "internal", **attributes: Any) -> "Span":
+        return Span(
+            name=name,
+            trace_id=self.trace_id,
+            parent_id=self.span_id,
+            kind=kind,
+            attributes=attributes,
+            finished=self.finished,
+        )
+
+    def end(self) -> None:
+        self.end_ns = time.time_ns()
+        self.finished.append(self)
+
+    @property
+    def traceparent(self) -> str:
+        """W3C trace context header value, to propagate the trace downstream."""
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Span | None:
+    return _current_span.get()
+
+
+@contextlib.contextmanager
+def span(name: str, kind: str = "internal", **attributes: Any) -> Iterator[Span | None]:
+    """Trace the enclosed block as a child of the current span (if any)."""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = parent.child(name, kind=kind, **attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException:
+        child.error = True
+        raise
+    finally:
+        _current_span.reset(token)
+        child.end()
+
+
+def traced(name: str) -> Callable[[Callable[P, R]], Callable[P, R]]:
+    """Trace the calls to a (synchronous) function."""
+
+    def decorator(func: Callable[P, R]) -> Callable[P, R]:
+        @functools.wraps(func)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def traced_methods(prefix: str) -> Callable[[C], C]:
+    """Trace the calls to the public (synchronous) methods of a class, including inherited ones."""
+
+    def decorator(cls: C) -> C:
+        for name, method in inspect.getmembers(cls, inspect.isfunction):
+            if name.startswith("_") or inspect.iscoroutinefunction(method):
+                continue
+            if isinstance(inspect.getattr_static(cls, name), staticmethod):
+                continue
+            setattr(cls, name, traced(f"{prefix}.{name}")(method))
+        return cls
+
+    return decorator
+
+
+def server_timing(root: Span) -> str:
+    """`Server-Timing` header value, with the total duration of the children of `root` by name."""
+    durations: dict[str, float] = {}
+    for s in list(root.finished):
+        if s.parent_id == root.span_id:
+            durations[s.name] = durations.get(s.name, 0) + s.duration_ms
+    metrics = [f"{name};dur={dur:.2f}" for name, dur in durations.items()]
+    return ", ".join([*metrics, f"total;dur={root.duration_ms:.2f}"])
+
+
+def otlp_json(spans: list[Span]) -> dict[str, Any]:
+    """Spans in the OTLP/JSON format."""
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": _otlp_attributes({"service.name": SERVICE_NAME})
+                },
+                "scopeSpans": [
+                    {
+                        "scope": {"name": __name__},
+                        "spans": [_otlp_span(s) for s in spans],
+                    }
+                ],
+            }
+        ]
+    }
+
+
+def _otlp_span(s: Span) -> dict[str, Any]:
+    otlp_span: dict[str, Any] = {
+        "traceId": s.trace_id,
+        "spanId": s.span_id,
+        "name": s.name,
+        "kind": _SPAN_KINDS[s.kind],
+        "startTimeUnixNano": str(s.start_ns),
+        "endTimeUnixNano": str(s.end_ns),
+        "attributes": _otlp_attributes(s.attributes),
+        "status": {"code": 2 if s.error else 0},
+    }
+    if s.parent_id is not None:
+        otlp_span["parentSpanId"] = s.parent_id
+    return otlp_span
+
+
+def _otlp_attributes(attributes: dict[str, Any]) -> list[dict[str, Any]]:
+    def value(v: Any) -> dict[str, Any]:
+        if isinstance(v, bool):
+            return {"boolValue": v}
+        if isinstance(v, int):
+            return {"intValue": str(v)}
+        if isinstance(v, float):
+            return {"doubleValue": v}
+        return {"stringValue": str(v)}
+
+    return [{"key": k, "value": value(v)} for k, v in attributes.items()]
+
+
+class SpanExporter(abc.ABC):
+    """
+    Exports the finished traces in batches, from a background thread
+    (started lazily, so that it is started in each forked worker process).
+    Traces are dropped if the exporter cannot keep up.
+    """
+
+    def __init__(self, max_batch_size: int = 512, interval: float = 5) -> None:
+        self.max_batch_size = max_batch_size
+        self.interval = interval
+        self.queue: queue.Queue[list[Span] | None] = queue.Queue(maxsize=10_000)
+        self.lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._pid: int | None = None
+        atexit.register(self.shutdown)
+
+    def export(self, spans: list[Span]) -> None:
+        self._ensure_thread()
+        try:
+            self.queue.put_nowait(spans)
+        except queue.Full:
+            pass
+
+    def shutdown(self, timeout: float = 5) -> None:
+        """Export the remaining spans and stop the background thread."""
+        if self._thread is not None and self._pid == os.getpid():
+            self.queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+    @abc.abstractmethod
+    def write(self, spans: list[Span]) -> None:
+        raise NotImplementedError()
+
+    def _ensure_thread(self) -> None:
+        with self.lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        batch: list[Span] = []
+        deadline = time.monotonic() + self.interval
+        stop = False
+        while not stop:
+            try:
+                spans = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                if spans is None:
+                    stop = True
+                else:
+                    batch.extend(spans)
+            except queue.Empty:
+                pass
+            if batch and (
+                stop
+                or len(batch) >= self.max_batch_size
+                or time.monotonic() >= deadline
+            ):
+                try:
+                    self.write(batch)
+                except Exception as e:
+                    print(f"Tracing export: failed with {e}")
+                batch = []
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.interval
+
+
+class FileSpanExporter(SpanExporter):
+    """Appends the batches of spans as OTLP/JSON lines to a local file."""
+
+    def __init__(self, path: str, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.path = path
+
+    def write(self, spans: list[Span]) -> None:
+        with open(self.path, "a") as f:
+            f.write(json.dumps(otlp_json(spans)) + "\n")
+
+
+class OTLPSpanExporter(SpanExporter):
+    """Sends the batches of spans to an OTLP/HTTP collector (JSON encoding)."""
+
+    def __init__(self, endpoint: str, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.endpoint = endpoint
+        self.session = requests.Session()
+
+    def write(self, spans: list[Span]) -> None:
+        resp = self.session.post(self.endpoint, json=otlp_json(spans), timeout=10)
+        resp.raise_for_status()
+
+
+def get_exporter(kind: str, file_path: str, otlp_endpoint: str) -> SpanExporter | None:
+    if not kind:
+        return None
+    if kind == "file":
+        return FileSpanExporter(file_path)
+    if kind == "otlp":
+        return OTLPSpanExporter(otlp_endpoint)
+    raise ValueError(f"Invalid tracing exporter {kind}")
+
+
+class TracingMiddleware:
+    """
+    Traces the requests, continuing the trace of the caller if a `traceparent` header is sent.
+    The root spans are named after the route template (not path, to bound the cardinality).
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        exporter: SpanExporter | None = None,
+        server_timing: bool = True,
+    ) -> None:
+        self.app = app
+        self.exporter = exporter
+        self.server_timing = server_timing
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        match = _TRACEPARENT.match(Headers(scope=scope).get("traceparent", ""))
+        root = Span(
+            name=scope["method"],
+            trace_id=match.group(1) if match else secrets.token_hex(16),
+            parent_id=match.group(2) if match else None,
+            kind="server",
+            attributes={"http.method": scope["method"]},
+        )
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                root.attributes["http.status_code"] = message["status"]
+                if self.server_timing:
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Server-Timing", server_timing(root))
+            await send(message)
+
+        token = _current_span.set(root)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        except BaseException:
+            root.error = True
+            raise
+        finally:
+            _current_span.reset(token)
+            # set by the router in the (shared) scope
+            route = getattr(scope.get("route"), "path", None)
+            if route is not None:
+                root.name = f"{scope['method']} {route}"
+                root.attributes["http.route"] = route
+            root.end()
+            if self.exporter is not None:
+                self.exporter.export(root.finished)